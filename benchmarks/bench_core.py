@@ -0,0 +1,269 @@
+"""Benchmark suite for the core Struct operations: construction,
+_replace(), equality, hashing, pickling, _asdict(), and TypedField
+validation, with namedtuple, dataclasses, and attrs (if installed)
+for comparison.
+
+Run from the project root with:
+    
+    python benchmarks/bench_core.py [-o results.json] [-c baseline.json]
+
+Results are written as JSON, so that runs from different releases can
+be compared with -c. Use -k to select benchmarks whose name contains
+a substring, and -q for a quicker, noisier run.
+"""
+
+
+import os
+import sys
+import argparse
+import io
+import json
+import pickle
+import platform
+import time
+import timeit
+from collections import namedtuple
+from dataclasses import make_dataclass, replace, asdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import simplestruct
+from simplestruct import Struct, Field, MetaStruct, TypedField
+from simplestruct import serial
+
+try:
+    import attr
+except ImportError:
+    attr = None
+
+
+FIELD_COUNTS = [1, 4, 16]
+NESTING_DEPTHS = [1, 4]
+INHERITANCE_DEPTHS = [1, 4]
+SEQ_LENGTHS = [10, 1000]
+
+
+def register(cls):
+    """Make cls a global of this module, so that its instances can
+    be pickled.
+    """
+    cls.__module__ = __name__
+    cls.__qualname__ = cls.__name__
+    globals()[cls.__name__] = cls
+    return cls
+
+
+def make_struct(name, fnames, field=Field, base=Struct, **attrs):
+    """Create a Struct class with fields named fnames, each made by
+    calling field().
+    """
+    namespace = dict(attrs)
+    for fn in fnames:
+        namespace[fn] = field()
+    return register(MetaStruct(name, (base,), namespace))
+
+
+def make_attrs(name, fnames):
+    return register(attr.make_class(name, list(fnames), frozen=True))
+
+
+def flavors(k):
+    """Return a list of (flavor name, class) pairs for classes with
+    k fields, for each kind of record type being compared.
+    """
+    fnames = ['f{}'.format(i) for i in range(k)]
+    result = [
+        ('struct', make_struct('Plain{}'.format(k), fnames)),
+        ('struct_slots', make_struct('Slotted{}'.format(k), fnames,
+                                     _slots=True)),
+        ('struct_typed', make_struct('Typed{}'.format(k), fnames,
+                                     field=lambda: TypedField(int))),
+        ('namedtuple', register(namedtuple('NT{}'.format(k), fnames))),
+        ('dataclass', register(make_dataclass('DC{}'.format(k), fnames,
+                                              frozen=True))),
+    ]
+    if attr is not None:
+        result.append(('attrs', make_attrs('AT{}'.format(k), fnames)))
+    return result
+
+
+def ops(cls, args):
+    """Return a dict mapping operation names to zero-argument
+    functions that perform them on instances of cls, in a way that
+    works for all the compared flavors.
+    """
+    a = cls(*args)
+    b = cls(*args)
+    c = cls(*args[:-1], args[-1] + 1)
+    first = 'f0'
+    
+    if issubclass(cls, Struct) or hasattr(cls, '_fields'):
+        do_replace = lambda: a._replace(**{first: 1})
+        do_asdict = a._asdict
+    elif attr is not None and attr.has(cls):
+        do_replace = lambda: attr.evolve(a, **{first: 1})
+        do_asdict = lambda: attr.asdict(a)
+    else:
+        do_replace = lambda: replace(a, **{first: 1})
+        do_asdict = lambda: asdict(a)
+    
+    return {
+        'construct': lambda: cls(*args),
+        'replace': do_replace,
+        'eq_equal': lambda: a == b,
+        'eq_unequal': lambda: a == c,
+        # Hashing a fresh instance each time, so that caching doesn't
+        # hide the cost; subtract the construct timing to isolate it.
+        'construct_hash': lambda: hash(cls(*args)),
+        'hash_repeat': lambda: hash(a),
+        'pickle_roundtrip': lambda: pickle.loads(pickle.dumps(a)),
+        'asdict': do_asdict,
+    }
+
+
+def cases():
+    """Yield (name, function) pairs for all benchmarks."""
+    for k in FIELD_COUNTS:
+        args = tuple(range(k))
+        for flavor, cls in flavors(k):
+            for op, func in ops(cls, args).items():
+                yield '{}/{}/fields={}'.format(op, flavor, k), func
+    
+    # Nested Structs, constructed from tuples through TypedField
+    # coercion, and compared/hashed recursively.
+    for depth in NESTING_DEPTHS:
+        cls = make_struct('Leaf', ['x', 'y'], field=lambda: TypedField(int))
+        value = (1, 2)
+        for i in range(depth):
+            inner = cls
+            cls = make_struct('Node{}'.format(i), ['left', 'right'],
+                              field=lambda: TypedField(inner))
+            value = (value, value)
+        a = cls(*value)
+        b = cls(*value)
+        yield ('construct_nested/depth={}'.format(depth),
+               lambda cls=cls, value=value: cls(*value))
+        yield ('eq_nested/depth={}'.format(depth),
+               lambda a=a, b=b: a == b)
+        yield ('hash_nested_fresh/depth={}'.format(depth),
+               lambda cls=cls, value=value: hash(cls(*value)))
+    
+    # Inheritance chains, each level adding two fields.
+    for depth in INHERITANCE_DEPTHS:
+        cls = Struct
+        n = 0
+        for i in range(depth):
+            cls = make_struct('Level{}'.format(i),
+                              ['f{}'.format(n), 'f{}'.format(n + 1)],
+                              base=cls, _inherit_fields=True)
+            n += 2
+        args = tuple(range(n))
+        yield ('construct_inherited/depth={}'.format(depth),
+               lambda cls=cls, args=args: cls(*args))
+    
+    # Sequence-typed fields.
+    for length in SEQ_LENGTHS:
+        vals = list(range(length))
+        for unique in [False, True]:
+            cls = make_struct('Seq', ['vals'], field=lambda: TypedField(
+                              int, seq=True, unique=unique))
+            yield ('construct_seq/unique={}/len={}'.format(unique, length),
+                   lambda cls=cls, vals=vals: cls(vals))
+    
+    # Bulk construction.
+    cls = make_struct('Row', ['a', 'b', 'c'], field=lambda: TypedField(int))
+    rows = [(i, i, i) for i in range(1000)]
+    yield 'from_rows/rows=1000', lambda: cls._from_rows(rows)
+    yield 'construct_loop/rows=1000', lambda: [cls(*r) for r in rows]
+    text_rows = [(str(i), str(i), str(i)) for i in range(1000)]
+    yield 'stream_parse/rows=1000', lambda: list(cls._stream(text_rows))
+    yield ('parse_loop/rows=1000',
+           lambda: [cls(int(a), int(b), int(c)) for a, b, c in text_rows])
+    
+    # Serialization of many records.
+    fields = {'a': TypedField(int), 'b': TypedField(float),
+              'c': TypedField(str)}
+    cls = register(MetaStruct('Record', (Struct,), fields))
+    records = [cls(i, i / 2, str(i)) for i in range(1000)]
+    buf = io.BytesIO()
+    serial.dump_many(cls, records, buf)
+    pickled = pickle.dumps(records)
+    yield ('serial_dump_many/rows=1000',
+           lambda: serial.dump_many(cls, records, io.BytesIO()))
+    yield ('serial_iter_load/rows=1000',
+           lambda: list(serial.iter_load(cls, io.BytesIO(buf.getvalue()))))
+    yield ('serial_iter_load_trusted/rows=1000',
+           lambda: list(serial.iter_load(cls, io.BytesIO(buf.getvalue()),
+                                         validate=False)))
+    yield 'pickle_dumps_list/rows=1000', lambda: pickle.dumps(records)
+    yield 'pickle_loads_list/rows=1000', lambda: pickle.loads(pickled)
+
+
+def measure(func, quick):
+    """Return the best observed time per call of func, in seconds."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    if quick:
+        repeat = 1
+    else:
+        repeat = 5
+    return min(timer.repeat(repeat, number)) / number
+
+
+def run(pattern, quick):
+    results = []
+    for name, func in cases():
+        if pattern is not None and pattern not in name:
+            continue
+        t = measure(func, quick)
+        results.append({'name': name, 'seconds': t})
+        print('{:<55} {:>12.1f} ns'.format(name, t * 1e9))
+    return results
+
+
+def compare(results, baseline):
+    """Print the ratio of each result to its baseline counterpart.
+    Ratios above 1 are slowdowns.
+    """
+    base = {r['name']: r['seconds'] for r in baseline['results']}
+    print()
+    print('Compared with baseline (simplestruct {}):'.format(
+          baseline['simplestruct']))
+    for r in results:
+        if r['name'] in base:
+            ratio = r['seconds'] / base[r['name']]
+            flag = '  <-- slower' if ratio > 1.1 else ''
+            print('{:<55} {:>8.2f}x{}'.format(r['name'], ratio, flag))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-o', '--output', help='write results as JSON')
+    parser.add_argument('-c', '--compare', help='baseline JSON results')
+    parser.add_argument('-k', dest='pattern',
+                        help='only run benchmarks containing this string')
+    parser.add_argument('-q', '--quick', action='store_true',
+                        help='fewer repetitions')
+    args = parser.parse_args()
+    
+    results = run(args.pattern, args.quick)
+    
+    if args.output is not None:
+        data = {
+            'simplestruct': simplestruct.__version__,
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(data, f, indent=2)
+    
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
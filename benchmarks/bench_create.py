@@ -0,0 +1,118 @@
+"""Benchmark of the start-up costs of simplestruct: the time to import
+the package, and to create many Struct classes, as a program that
+generates classes from large schemas would.
+
+Run from the project root with:
+    
+    python benchmarks/bench_create.py [-n CLASSES] [-f FIELDS]
+
+Class creation is timed through a class statement (which goes through
+MetaStruct.__prepare__()), through make_struct(), and for creating a
+class and then instantiating it once, which is when its constructor
+is generated. namedtuple and dataclasses are shown for comparison.
+"""
+
+
+import os
+import sys
+import argparse
+import re
+import subprocess
+import time
+import types
+from collections import namedtuple
+from dataclasses import make_dataclass
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, ROOT)
+
+from simplestruct import Struct, TypedField, make_struct
+
+
+def import_time(module, repeat=5):
+    """Return the best time in seconds to import module in a fresh
+    interpreter, as reported by -X importtime.
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+            env=env, stderr=subprocess.PIPE, universal_newlines=True,
+            check=True)
+        m = re.search(r'\|\s*(\d+) \| {}$'.format(re.escape(module)),
+                      proc.stderr, re.MULTILINE)
+        t = int(m.group(1)) / 1e6
+        best = t if best is None else min(best, t)
+    return best
+
+
+def best_time(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        t = time.perf_counter() - start
+        best = t if best is None else min(best, t)
+    return best
+
+
+def field_spec(nfields):
+    return [('f{}'.format(j), TypedField(int)) for j in range(nfields)]
+
+def with_statement(nclasses, nfields):
+    for i in range(nclasses):
+        spec = field_spec(nfields)
+        types.new_class('S{}'.format(i), (Struct,),
+                        exec_body=lambda ns: ns.update(spec))
+
+def with_make_struct(nclasses, nfields):
+    for i in range(nclasses):
+        make_struct('S{}'.format(i), field_spec(nfields))
+
+def with_first_instance(nclasses, nfields):
+    values = list(range(nfields))
+    for i in range(nclasses):
+        make_struct('S{}'.format(i), field_spec(nfields))(*values)
+
+def with_namedtuple(nclasses, nfields):
+    names = ['f{}'.format(j) for j in range(nfields)]
+    for i in range(nclasses):
+        namedtuple('S{}'.format(i), names)
+
+def with_dataclass(nclasses, nfields):
+    spec = [('f{}'.format(j), int) for j in range(nfields)]
+    for i in range(nclasses):
+        make_dataclass('S{}'.format(i), spec)
+
+
+CASES = [
+    ('class statement', with_statement),
+    ('make_struct()', with_make_struct),
+    ('make_struct() + first instance', with_first_instance),
+    ('namedtuple', with_namedtuple),
+    ('make_dataclass()', with_dataclass),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', dest='nclasses', type=int, default=1000)
+    parser.add_argument('-f', dest='nfields', type=int, default=10)
+    args = parser.parse_args()
+    
+    print('Import time')
+    for module in ['simplestruct', 'simplestruct.serial']:
+        print('{:<35} {:>10.1f} ms'.format(module,
+                                            import_time(module) * 1e3))
+    print()
+    print('Creating {} classes of {} fields'.format(args.nclasses,
+                                                     args.nfields))
+    for name, func in CASES:
+        t = best_time(lambda: func(args.nclasses, args.nfields))
+        print('{:<35} {:>10.1f} ms {:>10.1f} us/class'.format(
+              name, t * 1e3, t / args.nclasses * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Measure memory use per instance of dict-backed and slot-backed
+Structs, with namedtuple and plain tuple for comparison.
+
+Run from the project root with: python benchmarks/bench_memory.py
+"""
+
+
+import os
+import sys
+import tracemalloc
+from collections import namedtuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from simplestruct import Struct, Field, TypedField
+
+
+class DictPoint(Struct):
+    x = Field
+    y = Field
+    z = Field
+
+class SlotPoint(Struct):
+    _slots = True
+    x = Field
+    y = Field
+    z = Field
+
+class SlotTypedPoint(Struct):
+    _slots = True
+    x = TypedField(int)
+    y = TypedField(int)
+    z = TypedField(int)
+
+TuplePoint = namedtuple('TuplePoint', 'x y z')
+
+
+def bytes_per_instance(factory, n):
+    """Return the average number of bytes allocated per object when
+    creating n objects with factory(i). The field values are small
+    ints, which are cached by CPython and so aren't counted.
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objs = [factory(i % 256) for i in range(n)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Don't count the list holding the objects.
+    size = after - before - sys.getsizeof(objs)
+    del objs
+    return size / n
+
+
+def main(n=100000):
+    cases = [
+        ('Struct (__dict__)', lambda i: DictPoint(i, i, i)),
+        ('Struct (_slots)', lambda i: SlotPoint(i, i, i)),
+        ('Struct (_slots, TypedField)', lambda i: SlotTypedPoint(i, i, i)),
+        ('namedtuple', lambda i: TuplePoint(i, i, i)),
+        ('tuple', lambda i: (i, i, i)),
+    ]
+    print('{:<30} {:>10}'.format('3-field record', 'bytes'))
+    for name, factory in cases:
+        print('{:<30} {:>10.1f}'.format(name, bytes_per_instance(factory, n)))
+
+
+if __name__ == '__main__':
+    main()
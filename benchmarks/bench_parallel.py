@@ -0,0 +1,104 @@
+"""Benchmark of simplestruct.parallel.construct_parallel() against
+_from_rows(), for increasing batch sizes, to find the number of rows
+at which validating in worker processes starts to pay off.
+
+Run from the project root with:
+    
+    python benchmarks/bench_parallel.py [-w WORKERS] [-n SIZES...]
+
+The crossover depends on the number of cores and on how expensive the
+validation of each row is, so two Struct classes are measured: one
+with nested sequence fields, and one whose field has a custom check.
+"""
+
+
+import os
+import sys
+import argparse
+import re
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from simplestruct import Struct, TypedField
+from simplestruct.parallel import construct_parallel
+
+
+SIZES = [1000, 5000, 20000, 80000]
+
+
+class Point(Struct):
+    x = TypedField(int)
+    y = TypedField(int)
+
+class Polygon(Struct):
+    name = TypedField(str)
+    points = TypedField(Point, seq=True)
+    tags = TypedField(str, seq=True, unique=True)
+
+
+class EmailField(TypedField):
+    
+    pattern = re.compile(r'^[\w.+-]+@[\w-]+(\.[\w-]+)+$')
+    
+    def check(self, inst, value):
+        super().check(inst, value)
+        for v in value:
+            if not self.pattern.match(v):
+                raise TypeError('Invalid address {!r}'.format(v))
+
+class Mailing(Struct):
+    id = TypedField(int)
+    recipients = EmailField(str, seq=True, unique=True)
+
+
+def polygon_row(i):
+    return ('p{}'.format(i), [Point(j, i) for j in range(20)],
+            ['t{}'.format(j) for j in range(20)])
+
+def mailing_row(i):
+    return (i, ['user{}.{}@example.com'.format(i, j) for j in range(20)])
+
+
+def best_time(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        t = time.perf_counter() - start
+        best = t if best is None else min(best, t)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-w', '--workers', type=int,
+                        default=os.cpu_count() or 1)
+    parser.add_argument('-n', dest='sizes', type=int, nargs='+',
+                        default=SIZES)
+    args = parser.parse_args()
+    
+    print('{} workers'.format(args.workers))
+    for cls, make_row in [(Polygon, polygon_row), (Mailing, mailing_row)]:
+        print()
+        print('{:<10} {:>12} {:>12} {:>8}'.format(
+              cls.__name__, 'serial (s)', 'parallel (s)', 'speedup'))
+        crossover = None
+        for n in args.sizes:
+            rows = [make_row(i) for i in range(n)]
+            serial = best_time(lambda: cls._from_rows(rows))
+            parallel = best_time(lambda: construct_parallel(
+                cls, rows, workers=args.workers, min_rows=0))
+            speedup = serial / parallel
+            if crossover is None and speedup > 1:
+                crossover = n
+            print('{:<10} {:>12.4f} {:>12.4f} {:>7.2f}x'.format(
+                  n, serial, parallel, speedup))
+        if crossover is None:
+            print('No crossover in the sizes measured')
+        else:
+            print('Crossover at about {} rows'.format(crossover))
+
+
+if __name__ == '__main__':
+    main()
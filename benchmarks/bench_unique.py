@@ -0,0 +1,44 @@
+"""Measure how the cost of type-checking a sequence with uniqueness
+scales with the length of the sequence.
+
+Run from the project root with: python benchmarks/bench_unique.py
+"""
+
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from simplestruct import Struct, TypedField
+from simplestruct.type import checktype_seq
+
+
+class Ids(Struct):
+    vals = TypedField(int, seq=True, unique=True)
+
+
+def best_time(func, repeat=3):
+    """Return the best time in seconds of calling func, repeating
+    enough times to take at least 0.2 seconds per trial.
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def main(max_exp=6):
+    print('{:>10} {:>14} {:>14} {:>10}'.format(
+          'n', 'checktype_seq', 'Ids(vals)', 'ns/elem'))
+    for exp in range(1, max_exp + 1):
+        n = 10 ** exp
+        vals = list(range(n))
+        t_check = best_time(lambda: checktype_seq(vals, int, unique=True))
+        t_struct = best_time(lambda: Ids(vals))
+        print('{:>10} {:>12.6f}s {:>12.6f}s {:>10.1f}'.format(
+              n, t_check, t_struct, t_struct / n * 1e9))
+
+
+if __name__ == '__main__':
+    main()
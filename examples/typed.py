@@ -55,8 +55,8 @@ except TypeError as e:
     print(e)
 
 
-# Sequences may be checked for uniqueness.
-# (This is implemented naively in O(n^2) time.)
+# Sequences may be checked for uniqueness. (This takes linear time
+# if the elements are hashable, and quadratic time otherwise.)
 
 class Ids(Struct):
     vals = TypedField(int, seq=True, unique=True)
@@ -15,10 +15,12 @@ setup(
         'Intended Audience :: Developers',
         'License :: OSI Approved :: MIT License',
         'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
         'Topic :: Software Development :: Libraries :: Python Modules',
     ],
     
     packages =      ['simplestruct'],
+    python_requires = '>=3.8',
     
     test_suite =    'tests',
 )
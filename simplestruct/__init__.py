@@ -7,3 +7,6 @@ __version__ = '0.2.2'
 
 from .struct import *
 from .fields import *
+from .columnar import *
+from .instrument import *
+from .codecache import *
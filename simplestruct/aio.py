@@ -0,0 +1,173 @@
+"""Streaming Structs over asyncio streams.
+
+Records are sent in the binary format of the serial module, as
+written by serial.dump_many(): a header identifying the schema,
+followed by each record prefixed with its length. So a stream may be
+read by iter_structs() from a socket, or from a file written by
+dump_many().
+
+iter_structs() reads from an asyncio.StreamReader a chunk at a time
+into a single buffer, and decodes each complete record in it, so it
+doesn't wait on the stream per record. Records of at least
+offload_size bytes are decoded (and so validated) in an executor, to
+keep the event loop responsive.
+
+StructWriter encodes records into a batch, and writes the batch once
+it has batch_size records or buffer_size bytes, waiting for the
+stream to drain so that a slow reader holds back the writer.
+"""
+
+
+__all__ = [
+    'iter_structs',
+    'StructWriter',
+]
+
+
+import asyncio
+import struct
+
+from .serial import (MAGIC, HEADER, LENGTH, get_schema, check_type,
+                     check_header, decode_record)
+
+
+async def iter_structs(reader, cls, *, validate=True, trusted=False,
+                       chunk_size=1 << 16, offload_size=1 << 20,
+                       executor=None):
+    """Asynchronously yield the instances of cls read from
+    asyncio.StreamReader reader until it reaches EOF.
+    
+    The stream is read chunk_size bytes at a time. Records of at least
+    offload_size bytes are decoded in executor (the event loop's
+    default executor if None). validate and trusted are as for
+    serial.iter_load().
+    """
+    schema = get_schema(cls)
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as exc:
+        if len(exc.partial) == 0:
+            return
+        raise ValueError('Missing header') from None
+    check_header(schema, header)
+    
+    loop = asyncio.get_running_loop()
+    unpack_length = LENGTH.unpack_from
+    size = LENGTH.size
+    # Holds the unconsumed input; decoded records are deleted from
+    # the front after each chunk.
+    buf = bytearray()
+    while True:
+        chunk = await reader.read(chunk_size)
+        if len(chunk) == 0:
+            if len(buf) > 0:
+                raise ValueError('Truncated record')
+            return
+        buf += chunk
+        end = len(buf)
+        pos = 0
+        while end - pos >= size:
+            (n,) = unpack_length(buf, pos)
+            stop = pos + size + n
+            if n >= offload_size:
+                # Read the rest of the record directly, rather than
+                # growing the buffer a chunk at a time.
+                if stop > end:
+                    try:
+                        buf += await reader.readexactly(stop - end)
+                    except asyncio.IncompleteReadError:
+                        raise ValueError('Truncated record') from None
+                    end = stop
+                data = bytes(buf[pos + size:stop])
+                yield await loop.run_in_executor(
+                    executor, decode_record, schema, data, 0, n, validate,
+                    trusted)
+            elif stop > end:
+                break
+            else:
+                yield decode_record(schema, buf, pos + size, stop,
+                                    validate, trusted)
+            pos = stop
+        del buf[:pos]
+
+
+class StructWriter:
+    
+    """Writes instances of Struct class cls to asyncio.StreamWriter
+    writer, for iter_structs() to read. Records are written in
+    batches of up to batch_size records or about buffer_size bytes.
+    
+    StructWriter can be used as an async context manager, which
+    closes it.
+    """
+    
+    def __init__(self, writer, cls, *, batch_size=64, buffer_size=1 << 16):
+        self.writer = writer
+        self.struct_type = cls
+        self.schema = get_schema(cls)
+        self.batch_size = batch_size
+        self.buffer_size = buffer_size
+        # The header is sent with the first batch.
+        self.pending = bytearray(HEADER.pack(MAGIC, self.schema.fingerprint))
+        self.count = 0
+        self.written = 0
+    
+    async def write(self, obj):
+        """Add obj to the batch, writing the batch if it is full."""
+        check_type(self.struct_type, obj)
+        out = self.pending
+        start = len(out)
+        out += bytes(LENGTH.size)
+        try:
+            self.schema.encode(obj, out)
+        except struct.error as exc:
+            del out[start:]
+            raise ValueError('Cannot serialize {}: {}'.format(
+                             type(obj).__name__, exc)) from None
+        except BaseException:
+            del out[start:]
+            raise
+        LENGTH.pack_into(out, start, len(out) - start - LENGTH.size)
+        self.count += 1
+        if self.count >= self.batch_size or len(out) >= self.buffer_size:
+            await self.flush()
+    
+    async def write_many(self, objs):
+        """Write the instances from objs, which may be an iterable or
+        an asynchronous iterable. Return the number written.
+        """
+        n = 0
+        if hasattr(objs, '__aiter__'):
+            async for obj in objs:
+                await self.write(obj)
+                n += 1
+        else:
+            for obj in objs:
+                await self.write(obj)
+                n += 1
+        return n
+    
+    async def flush(self):
+        """Write the current batch, and wait until the stream can take
+        more.
+        """
+        if len(self.pending) > 0:
+            # The transport may hold on to the batch, so start anew
+            # rather than reusing it.
+            self.writer.write(self.pending)
+            self.pending = bytearray()
+            self.written += self.count
+            self.count = 0
+        await self.writer.drain()
+    
+    async def close(self):
+        """Flush, then close the stream."""
+        await self.flush()
+        self.writer.close()
+        await self.writer.wait_closed()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.close()
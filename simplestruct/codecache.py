@@ -0,0 +1,164 @@
+"""Persistent cache of the code generated for Struct classes.
+
+Struct classes get functions generated for them: constructors,
+__eq__(), TypedField setters, and serializers. Compiling their source
+is most of the cost of first using a class, which a program that
+defines many classes pays on every start. With a cache directory set
+by set_code_cache() or the SIMPLESTRUCT_CODE_CACHE environment
+variable, the compiled code is saved there, and later processes load
+it instead of compiling it again.
+
+Each class's code is kept in its own file, named after a fingerprint
+of the class's layout: its name, its flags, and the layout of each of
+its fields (see Field.layout()). Changing the class's schema gives it
+a new file. Within the file, code is looked up by its full source
+text, so code is never used for source it wasn't compiled from, even
+after upgrading simplestruct. Files for old layouts are left behind
+until clear_code_cache() is called.
+
+Newly compiled code is saved when the process exits, or when the
+cache directory is changed. Saving is best effort: if the directory
+can't be written, code is compiled as usual.
+"""
+
+
+__all__ = [
+    'set_code_cache',
+    'get_code_cache',
+    'clear_code_cache',
+]
+
+
+import atexit
+import marshal
+import os
+import re
+import sys
+from threading import Lock
+from weakref import WeakKeyDictionary
+
+
+# Code objects can only be loaded by the interpreter version that
+# made them.
+SUFFIX = '.{}.code'.format(sys.implementation.cache_tag)
+
+# Class attributes that affect the code generated for a class.
+FLAGS = ['_immutable', '_slots', '_intern', '_atomic']
+
+cache_dir = None
+
+# For each class, the path of its cache file and the dict from source
+# to code object that it holds.
+tables = WeakKeyDictionary()
+# Tables with code that hasn't been saved, by path.
+unsaved = {}
+lock = Lock()
+
+
+def set_code_cache(path):
+    """Save and load the code generated for Struct classes in the
+    directory path, which is created if needed. Pass None to stop
+    using a cache. As with __pycache__ directories, code loaded from
+    it is run, so it must not be writable by untrusted users.
+    """
+    global cache_dir
+    if path is not None:
+        path = os.path.abspath(path)
+        os.makedirs(path, exist_ok=True)
+    save_pending()
+    with lock:
+        cache_dir = path
+        tables.clear()
+
+def get_code_cache():
+    """Return the cache directory, or None if there is none."""
+    return cache_dir
+
+def clear_code_cache():
+    """Remove all files from the cache directory."""
+    with lock:
+        tables.clear()
+        unsaved.clear()
+        if cache_dir is None:
+            return
+        for name in os.listdir(cache_dir):
+            if name.endswith('.code'):
+                try:
+                    os.remove(os.path.join(cache_dir, name))
+                except FileNotFoundError:
+                    pass
+
+
+def layout_fingerprint(cls):
+    """Return a str identifying the layout of Struct class cls, which
+    is the same in every process.
+    """
+    import hashlib
+    layout = (cls.__module__, cls.__qualname__,
+              tuple(bool(getattr(cls, flag, False)) for flag in FLAGS),
+              tuple(f.layout() for f in cls._struct))
+    return hashlib.sha256(repr(layout).encode('utf-8')).hexdigest()[:32]
+
+def cache_path(directory, cls):
+    name = re.sub(r'[^\w.]', '_', cls.__qualname__)
+    return os.path.join(directory, '{}.{}-{}{}'.format(
+                        cls.__module__, name, layout_fingerprint(cls),
+                        SUFFIX))
+
+def load_table(path):
+    try:
+        with open(path, 'rb') as fp:
+            table = marshal.load(fp)
+    except (OSError, EOFError, ValueError, TypeError):
+        return {}
+    return table if isinstance(table, dict) else {}
+
+def save_table(path, table):
+    # Write a new file and move it into place, so that other
+    # processes never read a partial one.
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp, 'wb') as fp:
+            marshal.dump(table, fp)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+@atexit.register
+def save_pending():
+    """Save the code compiled since the last save."""
+    with lock:
+        pending = list(unsaved.items())
+        unsaved.clear()
+        for path, table in pending:
+            save_table(path, table)
+
+
+def compile_cached(cls, src):
+    """Return the code object for the module-level source src, which
+    is generated for Struct class cls. It is loaded from the cache if
+    possible, and otherwise compiled and saved there later.
+    """
+    directory = cache_dir
+    if directory is None:
+        return compile(src, '<string>', 'exec')
+    entry = tables.get(cls)
+    if entry is None:
+        path = cache_path(directory, cls)
+        entry = tables.setdefault(cls, (path, load_table(path)))
+    path, table = entry
+    code = table.get(src)
+    if code is None:
+        code = compile(src, '<string>', 'exec')
+        with lock:
+            table[src] = code
+            unsaved[path] = table
+    return code
+
+
+# The initial directory is taken from the environment.
+if os.environ.get('SIMPLESTRUCT_CODE_CACHE'):
+    set_code_cache(os.environ['SIMPLESTRUCT_CODE_CACHE'])
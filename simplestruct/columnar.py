@@ -0,0 +1,314 @@
+"""Columnar storage for many instances of the same Struct."""
+
+
+__all__ = [
+    'StructArray',
+    'columns',
+]
+
+
+from array import array
+from operator import attrgetter, index as to_index
+
+from .struct import Field
+from .fields import TypedField
+
+
+# NumPy is imported by import_numpy() when a backend is first chosen,
+# since importing it is slow and simplestruct imports this module.
+numpy = None
+numpy_missing = False
+
+
+# Maps the kinds of TypedFields that can be stored unboxed to the
+# array.array typecode and NumPy dtype of their columns.
+NUMERIC_KINDS = {
+    (bool,): ('b', 'bool'),
+    (int,): ('q', 'int64'),
+    (float,): ('d', 'float64'),
+}
+
+
+def numeric_kind(f):
+    """If field f always holds a single bool, int, or float, return
+    its kind. Otherwise return None.
+    """
+    if (isinstance(f, TypedField) and not f.seq and not f.or_none and
+        f.kind in NUMERIC_KINDS):
+        return f.kind
+    return None
+
+
+def maskable_kind(f):
+    """If field f holds a single bool, int, or float, or None if it
+    has or_none, return its kind. Otherwise return None.
+    """
+    if (isinstance(f, TypedField) and not f.seq and
+        f.kind in NUMERIC_KINDS):
+        return f.kind
+    return None
+
+
+def import_numpy():
+    """Return the numpy module, importing it if needed, or None if it
+    isn't available.
+    """
+    global numpy, numpy_missing
+    if numpy is None and not numpy_missing:
+        try:
+            import numpy
+        except ImportError:
+            numpy_missing = True
+    return numpy
+
+
+def choose_backend(backend):
+    """Validate a backend name, or pick one if it is None."""
+    if backend is None:
+        return 'numpy' if import_numpy() is not None else 'array'
+    if backend not in ['numpy', 'array']:
+        raise ValueError('Unknown StructArray backend {!r}'.format(backend))
+    if backend == 'numpy' and import_numpy() is None:
+        raise ImportError('NumPy is required for the numpy backend')
+    return backend
+
+
+class StructArray:
+    
+    """A fixed-length sequence of records of a Struct class, stored as
+    one column per field rather than as one object per record.
+    
+    Fields that are TypedFields of kind bool, int, or float (without
+    seq or or_none) get unboxed columns: NumPy arrays if the backend
+    is 'numpy', and array.array objects if it is 'array'. Other fields
+    get object columns (NumPy object arrays or lists, respectively).
+    The default backend is 'numpy' if NumPy can be imported. Note that
+    int columns are 64-bit, so storing larger ints fails.
+    
+    StructArray(cls, n) makes an array of n records, with each field
+    set to its default value if it has one, and to zero or None
+    otherwise. Use from_iterable() to build an array from existing
+    records or tuples of field values.
+    
+    Indexing with an int returns a new Struct instance with the
+    record's values. (Since the instance is constructed as usual,
+    any user-defined __init__() is run on it.) Indexing with a slice
+    returns a new StructArray with copies of the selected columns.
+    Assigning to an index accepts either an instance of cls or a
+    tuple of field values, which is validated by constructing an
+    instance from it.
+    
+    column(name) gives access to the column storage itself, for
+    vectorized operations.
+    """
+    
+    def __init__(self, cls, n=0, *, backend=None):
+        self.struct_type = cls
+        self.backend = choose_backend(backend)
+        self.columns = [self.make_column(f, self.fill_value(f), n)
+                        for f in cls._struct]
+        self.length = n
+    
+    @classmethod
+    def from_iterable(cls, struct_type, rows, *, backend=None):
+        """Construct a StructArray from an iterable of Struct instances
+        or tuples of field values.
+        """
+        fields = struct_type._struct
+        values = [[] for _ in fields]
+        n = 0
+        for row in rows:
+            if not isinstance(row, struct_type):
+                row = struct_type(*row)
+            for vals, v in zip(values, row):
+                vals.append(v)
+            n += 1
+        
+        arr = cls(struct_type, 0, backend=backend)
+        arr.columns = [arr.make_column_from(f, vals)
+                       for f, vals in zip(fields, values)]
+        arr.length = n
+        return arr
+    
+    def fill_value(self, f):
+        """Return the initial value for field f in a new array."""
+        if f.has_default:
+            return f.default
+        kind = numeric_kind(f)
+        return kind[0]() if kind is not None else None
+    
+    def make_column(self, f, value, n):
+        """Make a column for field f of length n, filled with value."""
+        kind = numeric_kind(f)
+        if self.backend == 'numpy':
+            dtype = NUMERIC_KINDS[kind][1] if kind is not None else object
+            col = numpy.empty(n, dtype=dtype)
+            col.fill(value)
+            return col
+        else:
+            if kind is not None:
+                return array(NUMERIC_KINDS[kind][0], [value]) * n
+            return [value] * n
+    
+    def make_column_from(self, f, values):
+        """Make a column for field f from a list of values."""
+        kind = numeric_kind(f)
+        if self.backend == 'numpy':
+            dtype = NUMERIC_KINDS[kind][1] if kind is not None else object
+            if dtype is object:
+                # Avoid having NumPy interpret sequence values as
+                # extra dimensions.
+                col = numpy.empty(len(values), dtype=object)
+                col[:] = values
+                return col
+            return numpy.array(values, dtype=dtype)
+        else:
+            if kind is not None:
+                return array(NUMERIC_KINDS[kind][0], values)
+            return values
+    
+    def column_values(self, i, index):
+        """Return the value(s) at index of column i, converted to the
+        types that the field expects. index may be an int or a slice.
+        """
+        f = self.struct_type._struct[i]
+        col = self.columns[i]
+        kind = numeric_kind(f)
+        if isinstance(index, slice):
+            vals = col[index]
+            vals = vals.tolist() if not isinstance(vals, list) else vals
+            if kind == (bool,):
+                vals = [bool(v) for v in vals]
+            return vals
+        else:
+            v = col[index]
+            if kind is not None:
+                v = kind[0](v)
+            return v
+    
+    def column(self, name):
+        """Return the storage for the column of the named field."""
+        try:
+            return self.columns[self.struct_type._fieldindex[name]]
+        except KeyError:
+            raise KeyError('{} has no field {!r}'.format(
+                           self.struct_type.__name__, name)) from None
+    
+    def __len__(self):
+        return self.length
+    
+    def check_index(self, index):
+        # Anything usable as a list index is accepted, including
+        # NumPy integers.
+        try:
+            index = to_index(index)
+        except TypeError:
+            raise TypeError('StructArray indices must be integers') from None
+        if not -self.length <= index < self.length:
+            raise IndexError('StructArray index out of range')
+        return index % self.length if index < 0 else index
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            arr = type(self)(self.struct_type, 0, backend=self.backend)
+            arr.columns = [col[index] for col in self.columns]
+            if self.backend == 'numpy':
+                # NumPy slices are views, but we want copies.
+                arr.columns = [col.copy() for col in arr.columns]
+            arr.length = len(range(*index.indices(self.length)))
+            return arr
+        
+        index = self.check_index(index)
+        return self.struct_type(*(self.column_values(i, index)
+                                  for i in range(len(self.columns))))
+    
+    def __setitem__(self, index, value):
+        index = self.check_index(index)
+        if not isinstance(value, self.struct_type):
+            value = self.struct_type(*value)
+        for col, v in zip(self.columns, value):
+            col[index] = v
+    
+    def __iter__(self):
+        # Convert whole columns at once rather than per element.
+        cols = [self.column_values(i, slice(None))
+                for i in range(len(self.columns))]
+        cls = self.struct_type
+        if len(cols) == 0:
+            return (cls() for _ in range(self.length))
+        return (cls(*vals) for vals in zip(*cols))
+    
+    def tolist(self):
+        """Return a list of Struct instances for the records."""
+        return list(self)
+    
+    def __repr__(self):
+        # Show only the first few records.
+        shown = min(self.length, 5)
+        items = ', '.join(repr(self[i]) for i in range(shown))
+        if self.length > shown:
+            items += ', ...'
+        return '{}({}, [{}])'.format(self.__class__.__name__,
+                                     self.struct_type.__name__, items)
+
+
+def field_getter(f):
+    """Return a function that reads the value of field f from an
+    instance, from its slot if possible.
+    """
+    if f.slot is not None and type(f).__get__ is Field.__get__:
+        return attrgetter(f.slot.__name__)
+    return attrgetter(f.name)
+
+
+def columns(structs, cls=None, *, backend=None):
+    """Return a dict from field names to columns of the field values
+    of a sequence of instances of Struct class cls (by default, the
+    class of the first instance). Struct._from_columns() does the
+    reverse, for vectorized operations like:
+        
+        Point._from_columns({name: col * 2 for name, col in
+                             columns(points).items()})
+    
+    Columns are as in StructArray. In addition, with NumPy, fields of
+    kind bool, int, or float that have or_none get masked arrays
+    (numpy.ma), with the None values masked. Each column is made in a
+    pass over the instances, without intermediate lists.
+    """
+    backend = choose_backend(backend)
+    if not hasattr(structs, '__len__'):
+        structs = list(structs)
+    n = len(structs)
+    if cls is None:
+        if n == 0:
+            raise ValueError('Struct class is required when there are no '
+                             'instances')
+        cls = type(structs[0])
+    for inst in structs:
+        if not isinstance(inst, cls):
+            raise TypeError('Expected {} instance; got {}'.format(
+                            cls.__name__, type(inst).__name__))
+    
+    result = {}
+    for f in cls._struct:
+        get = field_getter(f)
+        kind = maskable_kind(f)
+        if backend == 'numpy':
+            if kind is None:
+                col = numpy.fromiter(map(get, structs), object, n)
+            elif not f.or_none:
+                col = numpy.fromiter(map(get, structs),
+                                     NUMERIC_KINDS[kind][1], n)
+            else:
+                mask = numpy.fromiter((get(inst) is None
+                                       for inst in structs), bool, n)
+                data = numpy.fromiter((0 if v is None else v
+                                       for v in map(get, structs)),
+                                      NUMERIC_KINDS[kind][1], n)
+                col = numpy.ma.MaskedArray(data, mask=mask)
+        elif kind is not None and not f.or_none:
+            col = array(NUMERIC_KINDS[kind][0], map(get, structs))
+        else:
+            col = list(map(get, structs))
+        result[f.name] = col
+    return result
@@ -0,0 +1,84 @@
+"""Reading Structs from CSV files.
+
+iter_csv() yields an instance per row of a CSV file, lazily, using
+Struct._stream(). So values are parsed according to the field kinds
+(see Field.parser()), and the file is processed in chunks of rows,
+with memory use that doesn't depend on its size.
+"""
+
+
+__all__ = [
+    'iter_csv',
+]
+
+
+import csv
+
+from .struct import Struct, construct_error
+
+
+def header_order(cls, header):
+    """Return a list giving, for each field of cls in order, the
+    position of its column in header, or None if it isn't there and
+    has a default.
+    """
+    positions = {name.strip(): i for i, name in enumerate(header)}
+    order = []
+    for f in cls._struct:
+        pos = positions.get(f.name)
+        if pos is None and not f.has_default:
+            raise ValueError('CSV header is missing field {} of {}'.format(
+                             f.name, cls.__name__))
+        order.append(pos)
+    return order
+
+
+def reorder(cls, rows, order):
+    """Yield tuples of the values of rows in the order given by
+    header_order(). Fields whose column is missing, or is past the end
+    of a short row, get their defaults.
+    """
+    fields = cls._struct
+    for i, row in enumerate(rows):
+        n = len(row)
+        values = []
+        for f, pos in zip(fields, order):
+            if pos is not None and pos < n:
+                values.append(row[pos])
+            elif f.has_default:
+                values.append(f.default)
+            else:
+                raise construct_error(
+                    cls, None, 'missing a required argument: '
+                    '{!r}'.format(f.name), row=i)
+        yield tuple(values)
+
+
+def iter_csv(cls, fp, *, header=True, coerce=True, validate=True,
+             chunk_size=1000, workers=None, **fmtparams):
+    """Yield instances of Struct class cls from the CSV text file fp.
+    
+    If header is true, the first row names the columns, which are
+    matched to fields by name. Columns that aren't fields are ignored,
+    and fields with defaults may be missing. Otherwise, the columns
+    are the fields in order.
+    
+    coerce, validate, chunk_size, and workers are as for
+    Struct._stream(). Other keyword arguments are passed to
+    csv.reader().
+    """
+    if not (isinstance(cls, type) and issubclass(cls, Struct)):
+        raise TypeError('Expected Struct class; got {!r}'.format(cls))
+    rows = csv.reader(fp, **fmtparams)
+    if header:
+        try:
+            names = next(rows)
+        except StopIteration:
+            return
+        order = header_order(cls, names)
+        # Rows are used as they are only if they hold just the
+        # fields, in order.
+        if order != list(range(len(names))):
+            rows = reorder(cls, rows, order)
+    yield from cls._stream(rows, coerce=coerce, validate=validate,
+                           chunk_size=chunk_size, workers=workers)
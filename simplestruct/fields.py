@@ -6,10 +6,46 @@ __all__ = [
 ]
 
 
-from .struct import Field, Struct
+from .struct import Field, MetaStruct, Struct, make_function
 from .type import TypeChecker
 
 
+BOOL_STRINGS = {
+    'true': True, 't': True, 'yes': True, 'y': True, '1': True,
+    'false': False, 'f': False, 'no': False, 'n': False, '0': False,
+}
+
+def parse_bool(s):
+    try:
+        return BOOL_STRINGS[s.strip().lower()]
+    except KeyError:
+        raise ValueError('invalid literal for bool: {!r}'.format(s)) from None
+
+
+# Parsers of str values for TypedFields of each kind.
+PARSERS = {
+    (int,): int,
+    (float,): float,
+    (bool,): parse_bool,
+    (complex,): complex,
+}
+
+
+class OrNoneParser:
+    
+    """Parser that returns None for an empty (or whitespace) str, and
+    otherwise calls parse.
+    """
+    
+    def __init__(self, parse):
+        self.parse = parse
+    
+    def __call__(self, s):
+        if s.strip() == '':
+            return None
+        return self.parse(s)
+
+
 class TypedField(Field, TypeChecker):
     
     """A field with dynamically-checked type constraints.
@@ -25,6 +61,12 @@ class TypedField(Field, TypeChecker):
     
     If the kind is a Struct and seq is False, allow the value to
     be a tuple and coerce it to an instance of the Struct.
+    
+    When the field is bound to its Struct class, code specialized to
+    these options and the class's validation mode is generated for
+    setting the field's value (unless a subclass overrides check()
+    or normalize()). Changing the options afterwards is not supported.
+    Coercion and normalization happen even when validation is off.
     """
     
     def __init__(self, kind, *,
@@ -34,6 +76,12 @@ class TypedField(Field, TypeChecker):
         self.seq = seq
         self.unique = unique
         self.or_none = or_none
+        # Specialized version of __set__(), installed by bind().
+        self.setter = None
+        # Cache of generated setters; see get_setter().
+        self.setters = {}
+        # The Struct class declaring the field, set by bind().
+        self.owner = None
     
     def copy(self):
         return type(self)(self.kind, seq=self.seq, unique=self.unique,
@@ -66,16 +114,181 @@ class TypedField(Field, TypeChecker):
             value = tuple(value)
         return value
     
+    @property
+    def coerces_tuples(self):
+        """Whether tuple values are coerced to the Struct type that
+        is our kind.
+        """
+        return (not self.seq and len(self.kind) == 1 and
+                isinstance(self.kind[0], type) and
+                issubclass(self.kind[0], Struct))
+    
+    @property
+    def specializable(self):
+        """Whether setters for this field can be generated, which
+        requires that check() and normalize() aren't overridden.
+        """
+        t = type(self)
+        return (t.check is TypedField.check and
+                t.normalize is TypedField.normalize and
+                t.checktype is TypedField.checktype)
+    
+    def parser(self):
+        # Only plain values of a numeric or bool kind are parsed.
+        parse = None if self.seq else PARSERS.get(self.kind)
+        if parse is not None and self.or_none:
+            parse = OrNoneParser(parse)
+        return parse
+    
+    def layout(self):
+        kind = tuple('{}.{}'.format(k.__module__, k.__qualname__)
+                     for k in self.kind)
+        return super().layout() + (kind, self.seq, self.unique,
+                                   self.or_none)
+    
+    def bind(self, cls):
+        super().bind(cls)
+        self.owner = cls
+        if self.specializable:
+            # Generate the setter when first used.
+            mode = cls._validation
+            def setter(inst, value):
+                self.setter = self.get_setter(False, mode)
+                self.setter(inst, value)
+            self.setter = setter
+    
+    def get_init_setter(self, validate):
+        if self.specializable and type(self).__set__ is TypedField.__set__:
+            return self.get_setter(True, 'full' if validate else 'off')
+        return None
+    
+    def get_setter(self, initializing, mode):
+        """Return a setter made by make_setter(), reusing it if it was
+        made before.
+        """
+        key = (initializing, mode)
+        if key not in self.setters:
+            self.setters[key] = self.make_setter(initializing, mode)
+        return self.setters[key]
+    
+    def make_setter(self, initializing, mode):
+        """Generate a function taking an instance and value that does
+        the same as __set__(), specialized to this field's options
+        and the validation mode. If initializing is True, the function
+        may assume the instance is still being initialized, and so
+        skips the immutability check.
+        """
+        # For the error cases, defer to check(), so that messages
+        # are the same as usual.
+        namespace = {
+            '__field': self,
+            '__kind': self.kind[0] if len(self.kind) == 1 else self.kind,
+            '__struct': self.kind[0] if self.coerces_tuples else None,
+        }
+        body = []
+        if self.coerces_tuples:
+            body += ['if isinstance(value, tuple):',
+                     '    value = __struct(*value)']
+        
+        if self.seq:
+            check = ['__field.checktype_seq(value, __field.kind, '
+                     'unique={!r}, inst=inst)'.format(self.unique)]
+        else:
+            check = ['if not isinstance(value, __kind):',
+                     '    __field.check(inst, value)']
+        if mode == 'off':
+            check = []
+        elif mode == 'construct_only' and not initializing:
+            check = ['if not inst._initialized:'] + \
+                    ['    ' + line for line in check]
+        if self.seq:
+            check.append('value = tuple(value)')
+        if self.or_none and len(check) > 0:
+            body.append('if value is not None:')
+            body += ['    ' + line for line in check]
+        else:
+            body += check
+        
+        if not initializing:
+            body += ['if inst._immutable and inst._initialized:',
+                     "    raise AttributeError('Struct is immutable')"]
+        body.append('{} = value'.format(
+                    MetaStruct.storage_expr(self, 'inst')))
+        return make_function('__set', ['inst', 'value'], body, namespace,
+                             qualname='TypedField.setter', owner=self.owner)
+    
     def __set__(self, inst, value):
+        if self.setter is not None:
+            if type(inst) is self.owner:
+                self.setter(inst, value)
+            else:
+                # Subclasses that inherit the field may have another
+                # validation mode.
+                self.get_setter(False, inst._validation)(inst, value)
+            return
+        
         # Special case: If our type is a non-sequence Struct, allow
         # coercion of a tuple value to the Struct. This is done
         # prior to the type check and normalization.
-        if (not self.seq and len(self.kind) == 1 and
-                isinstance(self.kind[0], type) and
-                issubclass(self.kind[0], Struct) and
-                isinstance(value, tuple)):
+        if self.coerces_tuples and isinstance(value, tuple):
             value = self.kind[0](*value)
         
-        self.check(inst, value)
+        mode = getattr(inst, '_validation', 'full')
+        if (mode == 'full' or
+            (mode == 'construct_only' and not inst._initialized)):
+            self.check(inst, value)
         value = self.normalize(inst, value)
         super().__set__(inst, value)
+    
+    def convert_column(self, values, validate=True):
+        # If check(), normalize(), and checktype() aren't overridden,
+        # handle the common cases in bulk. Otherwise, call them on each
+        # value.
+        cls = type(self)
+        if (cls.check is not TypedField.check or
+            cls.normalize is not TypedField.normalize or
+            cls.checktype is not TypedField.checktype):
+            return self.convert_each(values, validate)
+        
+        if self.coerces_tuples or self.seq:
+            return self.convert_each(values, validate)
+        
+        # Plain values: no coercion or normalization, just the check.
+        if validate:
+            if self.or_none:
+                # Check all but the Nones.
+                if hasattr(values, 'tolist'):
+                    values = values.tolist()
+                positions = [i for i, v in enumerate(values)
+                             if v is not None]
+                try:
+                    self.checktype_column([values[i] for i in positions],
+                                          self.kind)
+                except TypeError as exc:
+                    exc.index = positions[exc.index]
+                    raise
+            else:
+                self.checktype_column(values, self.kind)
+        if hasattr(values, 'tolist'):
+            # Unbox NumPy arrays.
+            return values.tolist()
+        return list(values)
+    
+    def convert_each(self, values, validate):
+        """Implementation of convert_column() that processes values
+        one at a time, the same way as __set__().
+        """
+        if hasattr(values, 'tolist'):
+            values = values.tolist()
+        result = []
+        for i, value in enumerate(values):
+            try:
+                if self.coerces_tuples and isinstance(value, tuple):
+                    value = self.kind[0](*value)
+                if validate:
+                    self.check(None, value)
+                result.append(self.normalize(None, value))
+            except TypeError as exc:
+                exc.index = i
+                raise
+        return result
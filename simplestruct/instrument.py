@@ -0,0 +1,267 @@
+"""Optional instrumentation of Struct operations.
+
+While enabled with enable_stats(), every Struct class counts and
+times its instantiations (separately for bulk construction and
+_replace()), the validation of each field that checks or converts
+its values, __eq__(), __hash__(), and MetaStruct.get_boundargs().
+Exceptions raised by them are counted as failures, which for
+construction and fields means values that failed validation.
+
+stats() returns a snapshot of the numbers, and set_sampler() registers
+a callback that receives every so many timed events, for feeding a
+sampling profiler or metrics system.
+
+Instrumentation can be switched on and off at any time. It works by
+installing timed versions of each class's constructors and methods,
+and reinstalling the plain ones when disabled, so it costs nothing
+while off. Counts may be slightly low when instances are used from
+several threads at once, since counters are updated without locking.
+"""
+
+
+__all__ = [
+    'enable_stats',
+    'disable_stats',
+    'stats_enabled',
+    'reset_stats',
+    'stats',
+    'set_sampler',
+]
+
+
+from functools import wraps
+from threading import Lock
+from time import perf_counter
+from weakref import WeakKeyDictionary
+
+from .struct import MetaStruct, set_recorder
+
+
+MISSING = object()
+
+# Names of the operations timed by each of a Struct class's
+# constructors.
+CONSTRUCTOR_OPS = {
+    '_construct': 'construct',
+    '_construct_trusted': 'construct_bulk',
+    '_construct_rows': 'construct_bulk',
+    '_construct_rows_unchecked': 'construct_bulk',
+    '_construct_replace': 'replace',
+}
+
+
+class Recorder:
+    
+    """Collects the timings of instrumented operations. Each is kept
+    in a counter, a list of the number of calls, total seconds, and
+    number of failures, for a class, operation, and field name (None
+    for operations that aren't per field). Classes are identified by
+    their qualified name, so that the counters don't keep them alive.
+    """
+    
+    def __init__(self):
+        self.counters = {}
+        self.lock = Lock()
+        # Methods replaced on each attached class, by name.
+        self.originals = WeakKeyDictionary()
+        self.sampler = None
+        self.interval = 1000
+        self.events = 0
+    
+    def counter(self, cls, op, fname=None):
+        key = (qualified_name(cls), op, fname)
+        counter = self.counters.get(key)
+        if counter is None:
+            with self.lock:
+                counter = self.counters.setdefault(key, [0, 0.0, 0])
+        return counter
+    
+    def record(self, counter, cls, op, fname, elapsed, calls=1):
+        counter[0] += calls
+        counter[1] += elapsed
+        if self.sampler is not None:
+            self.events += 1
+            if self.events % self.interval == 0:
+                self.sampler(qualified_name(cls), op, fname, elapsed)
+    
+    def timed(self, cls, op, func, fname=None):
+        """Return a function that calls func, recording it under op
+        for class cls and field fname.
+        """
+        counter = self.counter(cls, op, fname)
+        record = self.record
+        
+        @wraps(func)
+        def wrapper(*args, **kargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kargs)
+            except Exception:
+                counter[2] += 1
+                raise
+            finally:
+                record(counter, cls, op, fname, perf_counter() - start)
+        wrapper._instrumented = True
+        return wrapper
+    
+    def timed_rows(self, cls, op, func):
+        """Like timed(), for a function that returns a list of new
+        instances, each of which is recorded as a call.
+        """
+        counter = self.counter(cls, op)
+        record = self.record
+        
+        @wraps(func)
+        def wrapper(*args):
+            start = perf_counter()
+            calls = 1
+            try:
+                result = func(*args)
+                calls = len(result)
+                return result
+            except Exception:
+                counter[2] += 1
+                raise
+            finally:
+                record(counter, cls, op, None, perf_counter() - start, calls)
+        wrapper._instrumented = True
+        return wrapper
+    
+    def wrap_constructor(self, cls, name, func):
+        """Return an instrumented version of a class's constructor
+        func, which is named name (see CONSTRUCTOR_OPS).
+        """
+        if name.startswith('_construct_rows'):
+            return self.timed_rows(cls, CONSTRUCTOR_OPS[name], func)
+        return self.timed(cls, CONSTRUCTOR_OPS[name], func)
+    
+    def wrap_setter(self, cls, f, setter):
+        """Return an instrumented version of a function that sets the
+        value of field f on a new instance of cls.
+        """
+        return self.timed(cls, 'validate', setter, f.name)
+    
+    def attach(self, cls):
+        """Install instrumented __eq__() and __hash__() methods on cls."""
+        if cls in self.originals:
+            return
+        originals = {}
+        for name, op in [('__eq__', 'eq'), ('__hash__', 'hash')]:
+            method = getattr(cls, name)
+            if method is None:
+                continue
+            # Don't nest the instrumentation of a base class.
+            while getattr(method, '_instrumented', False):
+                method = method.__wrapped__
+            originals[name] = cls.__dict__.get(name, MISSING)
+            setattr(cls, name, self.timed(cls, op, method))
+        self.originals[cls] = originals
+    
+    def detach(self, cls):
+        """Restore the methods replaced by attach()."""
+        for name, method in self.originals.pop(cls, {}).items():
+            if method is MISSING:
+                delattr(cls, name)
+            else:
+                setattr(cls, name, method)
+    
+    def reset(self):
+        # Counters are shared with the installed wrappers, so they
+        # are zeroed in place.
+        with self.lock:
+            for counter in self.counters.values():
+                counter[:] = [0, 0.0, 0]
+            self.events = 0
+
+
+recorder = Recorder()
+enabled = False
+plain_get_boundargs = MetaStruct.__dict__['get_boundargs']
+
+
+def qualified_name(cls):
+    return '{}.{}'.format(cls.__module__, cls.__qualname__)
+
+
+def timed_get_boundargs(cls, *args, **kargs):
+    counter = recorder.counter(cls, 'boundargs')
+    start = perf_counter()
+    try:
+        return plain_get_boundargs(cls, *args, **kargs)
+    except Exception:
+        counter[2] += 1
+        raise
+    finally:
+        recorder.record(counter, cls, 'boundargs', None,
+                        perf_counter() - start)
+
+
+def enable_stats():
+    """Start collecting statistics for all Struct classes, existing
+    and future. Statistics collected before are kept.
+    """
+    global enabled
+    if not enabled:
+        enabled = True
+        MetaStruct.get_boundargs = timed_get_boundargs
+        set_recorder(recorder)
+
+def disable_stats():
+    """Stop collecting statistics, restoring the uninstrumented
+    constructors and methods. The statistics remain available.
+    """
+    global enabled
+    if enabled:
+        enabled = False
+        MetaStruct.get_boundargs = plain_get_boundargs
+        set_recorder(None)
+
+def stats_enabled():
+    return enabled
+
+def reset_stats():
+    """Discard the statistics collected so far."""
+    recorder.reset()
+
+def set_sampler(callback, interval=1000):
+    """Call callback(class_name, op, field_name, seconds) for every
+    interval'th timed operation while statistics are enabled, where
+    op names the operation as in stats(), and field_name is None
+    except for 'validate'. Pass None to stop.
+    """
+    if interval < 1:
+        raise ValueError('Sampling interval must be positive')
+    recorder.interval = interval
+    recorder.sampler = callback
+
+
+def stats():
+    """Return a snapshot of the statistics collected so far, as a
+    dict from qualified class names to dicts of operations. Each
+    operation's entry is a dict with its number of 'calls', total
+    'seconds', and number and rate of 'failures' and 'failure_rate'.
+    
+    The operations are 'construct' (instantiation), 'construct_bulk'
+    (per row of _from_rows() and similar), 'replace', 'eq', 'hash',
+    and 'boundargs'. A class's 'fields' entry maps field names to the
+    entry for validating that field's values during construction and
+    _replace(). Operations that weren't used are omitted.
+    """
+    with recorder.lock:
+        items = [(key, tuple(counter))
+                 for key, counter in recorder.counters.items()]
+    result = {}
+    for (name, op, fname), (calls, seconds, failures) in items:
+        if calls == 0:
+            continue
+        entry = result.setdefault(name, {})
+        if fname is not None:
+            entry = entry.setdefault('fields', {})
+            op = fname
+        entry[op] = {
+            'calls': calls,
+            'seconds': seconds,
+            'failures': failures,
+            'failure_rate': failures / calls,
+        }
+    return result
@@ -0,0 +1,345 @@
+"""Schema-driven JSON and msgpack encoding of Structs.
+
+Encoders and decoders are generated once per Struct class from its
+fields. TypedFields whose kind is a Struct class are encoded as nested
+records, and seq fields as arrays. Other values must be encodable by
+the json module (or msgpack) as they are.
+
+In JSON, a record is an object with a member per field. In msgpack, it
+is an array of the field values in order, which is more compact.
+
+Decoding constructs instances as usual, and so validates them, unless
+validate=False is passed for input that is trusted. A JSON member may
+be missing if the field has a default. Members that aren't fields are
+ignored.
+
+The *_stream() functions read and write one record at a time, so
+memory use doesn't depend on the input's size. JSON streams have a
+record per line.
+
+msgpack support requires the msgpack package.
+"""
+
+
+__all__ = [
+    'to_json',
+    'from_json',
+    'dump_json_stream',
+    'iter_json_stream',
+    'to_msgpack',
+    'from_msgpack',
+    'dump_msgpack_stream',
+    'iter_msgpack_stream',
+]
+
+
+import json
+from json.encoder import encode_basestring
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from .struct import Struct, make_function
+from .fields import TypedField
+from .serial import check_type, stores_decoded
+
+
+def float_json(value):
+    """Return the JSON for a float, as the json module writes it."""
+    if value != value or value in (float('inf'), float('-inf')):
+        return json.dumps(value)
+    return float.__repr__(value)
+
+
+def struct_kind(f):
+    """Return the Struct class that is the kind of TypedField f, or
+    None if there isn't one.
+    """
+    if (len(f.kind) == 1 and isinstance(f.kind[0], type) and
+        issubclass(f.kind[0], Struct)):
+        return f.kind[0]
+    return None
+
+
+def codec_name(cls, namespace):
+    """Add the codec for Struct class cls to namespace, and return its
+    name there.
+    """
+    name = '__codec{}'.format(id(cls))
+    namespace[name] = get_codec(cls)
+    return name
+
+
+def json_expr(f, var, namespace):
+    """Return an expression for the JSON text of var, the value of
+    field f. Add any names it needs to namespace.
+    """
+    if not isinstance(f, TypedField):
+        return '__dumps({})'.format(var)
+    
+    def elem_expr(v):
+        kind = f.kind
+        if kind == (str,):
+            return '__str({})'.format(v)
+        elif kind == (bool,):
+            return "('true' if {} else 'false')".format(v)
+        elif kind == (int,):
+            return 'int.__repr__({})'.format(v)
+        elif kind == (float,):
+            return '__float({})'.format(v)
+        elif struct_kind(f) is not None:
+            return '{}.to_json({})'.format(
+                   codec_name(struct_kind(f), namespace), v)
+        return '__dumps({})'.format(v)
+    
+    if f.seq:
+        expr = "'[' + ','.join([{} for __x in {}]) + ']'".format(
+               elem_expr('__x'), var)
+    else:
+        expr = elem_expr(var)
+    if f.or_none:
+        expr = "('null' if {0} is None else {1})".format(var, expr)
+    return expr
+
+
+def decode_expr(f, var, namespace, fmt):
+    """Return an expression for the value of field f given var, its
+    decoded JSON or msgpack value, in format fmt. Add any names it
+    needs to namespace.
+    """
+    if not isinstance(f, TypedField):
+        return var
+    cls = struct_kind(f)
+    
+    def elem_expr(v):
+        if cls is not None:
+            # Leave other values for validation to reject.
+            container = 'dict' if fmt == 'json' else 'list'
+            return ('({0}.from_{1}({2}, validate) if type({2}) is {3} '
+                    'else {2})'.format(codec_name(cls, namespace), fmt, v,
+                                       container))
+        elif f.kind == (float,) and fmt == 'json':
+            # JSON doesn't distinguish 1.0 from 1.
+            return '(float({0}) if type({0}) is int else {0})'.format(v)
+        return v
+    
+    if f.seq:
+        if elem_expr('__x') == '__x':
+            expr = '(tuple({0}) if type({0}) is list else {0})'.format(var)
+        else:
+            expr = ('(tuple([{1} for __x in {0}]) if type({0}) is list '
+                    'else {0})'.format(var, elem_expr('__x')))
+    else:
+        expr = elem_expr(var)
+    if f.or_none and expr != var:
+        expr = '(None if {0} is None else {1})'.format(var, expr)
+    return expr
+
+
+class Codec:
+    
+    """Generated JSON and msgpack encoding functions for a Struct
+    class.
+    """
+    
+    def __init__(self, cls):
+        self.struct_type = cls
+        self.trusted = all(stores_decoded(f) for f in cls._struct)
+        self.to_json = self.make_to_json()
+        self.from_json = self.make_from('json')
+        self.to_msgpack = self.make_to_msgpack()
+        self.from_msgpack = self.make_from('msgpack')
+    
+    def make_to_json(self):
+        """Return a function from an instance to its JSON text."""
+        cls = self.struct_type
+        namespace = {
+            '__cls': cls,
+            '__values': cls._values,
+            '__check_type': check_type,
+            '__str': encode_basestring,
+            '__float': float_json,
+            '__dumps': json.dumps,
+        }
+        names = ['__v{}'.format(i) for i in range(len(cls._struct))]
+        body = ['__check_type(__cls, inst)']
+        if len(names) > 0:
+            body.append('{}, = __values(inst)'.format(', '.join(names)))
+        parts = []
+        for i, (f, v) in enumerate(zip(cls._struct, names)):
+            sep = '{' if i == 0 else ','
+            parts.append(repr(sep + json.dumps(f.name) + ':'))
+            parts.append(json_expr(f, v, namespace))
+        parts.append(repr('}' if len(names) > 0 else '{}'))
+        body.append('return ' + ' + '.join(parts))
+        return make_function('to_json', ['inst'], body, namespace,
+                             'Codec({}).to_json'.format(cls.__qualname__),
+                             cls)
+    
+    def make_to_msgpack(self):
+        """Return a function from an instance to the list that msgpack
+        should pack for it.
+        """
+        cls = self.struct_type
+        namespace = {
+            '__cls': cls,
+            '__values': cls._values,
+            '__check_type': check_type,
+        }
+        names = ['__v{}'.format(i) for i in range(len(cls._struct))]
+        body = ['__check_type(__cls, inst)']
+        if len(names) > 0:
+            body.append('{}, = __values(inst)'.format(', '.join(names)))
+        items = []
+        for f, v in zip(cls._struct, names):
+            kind = struct_kind(f) if isinstance(f, TypedField) else None
+            if kind is None:
+                items.append(v)
+                continue
+            name = codec_name(kind, namespace)
+            if f.seq:
+                expr = '[{}.to_msgpack(__x) for __x in {}]'.format(name, v)
+            else:
+                expr = '{}.to_msgpack({})'.format(name, v)
+            if f.or_none:
+                expr = '(None if {0} is None else {1})'.format(v, expr)
+            items.append(expr)
+        body.append('return [{}]'.format(', '.join(items)))
+        return make_function('to_msgpack', ['inst'], body, namespace,
+                             'Codec({}).to_msgpack'.format(cls.__qualname__),
+                             cls)
+    
+    def make_from(self, fmt):
+        """Return a function taking a decoded JSON object (for fmt
+        'json') or msgpack array (for 'msgpack') and validate flag,
+        and returning an instance.
+        """
+        cls = self.struct_type
+        namespace = {
+            '__cls': cls,
+            '__malformed': malformed,
+        }
+        names = ['__v{}'.format(i) for i in range(len(cls._struct))]
+        if fmt == 'json':
+            body = ['if type(obj) is not dict:',
+                    "    raise __malformed(__cls, 'expected object')"]
+        else:
+            body = ['if type(obj) is not list or len(obj) != {}:'.format(
+                    len(names)),
+                    "    raise __malformed(__cls, 'expected array of {} "
+                    "values')".format(len(names))]
+        for i, (f, v) in enumerate(zip(cls._struct, names)):
+            if fmt == 'msgpack':
+                body.append('{} = obj[{}]'.format(v, i))
+            elif f.has_default:
+                namespace['__default{}'.format(i)] = f.default
+                body.append('{} = obj.get({!r}, __default{})'.format(
+                            v, f.name, i))
+            else:
+                body += ['try:',
+                         '    {} = obj[{!r}]'.format(v, f.name),
+                         'except KeyError:',
+                         "    raise __malformed(__cls, 'missing field "
+                             "{}') from None".format(f.name)]
+            expr = decode_expr(f, v, namespace, fmt)
+            if expr != v:
+                body.append('{} = {}'.format(v, expr))
+        args = ''.join(', ' + v for v in names)
+        if self.trusted:
+            body += ['if not validate:',
+                     '    return __cls._construct_trusted(__cls, None{})'
+                         .format(args)]
+        body.append('return __cls({})'.format(args[2:]))
+        return make_function('from_' + fmt, ['obj', 'validate'], body,
+                             namespace,
+                             'Codec({}).from_{}'.format(cls.__qualname__,
+                                                        fmt), cls)
+
+
+def malformed(cls, detail):
+    return ValueError('Malformed {} record: {}'.format(cls.__name__, detail))
+
+
+# Each Struct class's codec is kept on the class, as for schemas in
+# serial.py, so that it doesn't keep the class alive.
+def get_codec(cls):
+    codec = (cls.__dict__.get('__interchange_codec')
+             if isinstance(cls, type) else None)
+    if codec is None:
+        if not (isinstance(cls, type) and issubclass(cls, Struct)):
+            raise TypeError('Expected Struct instance; got {}'.format(
+                            cls.__name__))
+        codec = Codec(cls)
+        setattr(cls, '__interchange_codec', codec)
+    return codec
+
+
+def to_json(obj):
+    """Return the JSON text for a Struct instance."""
+    return get_codec(type(obj)).to_json(obj)
+
+def from_json(cls, text, *, validate=True):
+    """Return the instance of cls encoded in JSON text."""
+    return get_codec(cls).from_json(json.loads(text), validate)
+
+def dump_json_stream(cls, objs, fp):
+    """Write instances of cls from iterable objs to text file fp, as
+    a line of JSON each. Return the number written.
+    """
+    to_json = get_codec(cls).to_json
+    n = 0
+    for obj in objs:
+        fp.write(to_json(obj))
+        fp.write('\n')
+        n += 1
+    return n
+
+def iter_json_stream(cls, fp, *, validate=True):
+    """Yield the instances of cls in text file fp, which has a line of
+    JSON for each. Blank lines are skipped.
+    """
+    from_json = get_codec(cls).from_json
+    loads = json.loads
+    for line in fp:
+        if line.strip():
+            yield from_json(loads(line), validate)
+
+
+def require_msgpack():
+    if msgpack is None:
+        raise ImportError('The msgpack package is required for msgpack '
+                          'encoding')
+
+def to_msgpack(obj):
+    """Return the msgpack encoding of a Struct instance as bytes."""
+    require_msgpack()
+    return msgpack.packb(get_codec(type(obj)).to_msgpack(obj))
+
+def from_msgpack(cls, data, *, validate=True):
+    """Return the instance of cls encoded in msgpack data."""
+    require_msgpack()
+    return get_codec(cls).from_msgpack(msgpack.unpackb(data), validate)
+
+def dump_msgpack_stream(cls, objs, fp):
+    """Write instances of cls from iterable objs to binary file fp, as
+    consecutive msgpack values. Return the number written.
+    """
+    require_msgpack()
+    to_msgpack = get_codec(cls).to_msgpack
+    packer = msgpack.Packer()
+    n = 0
+    for obj in objs:
+        fp.write(packer.pack(to_msgpack(obj)))
+        n += 1
+    return n
+
+def iter_msgpack_stream(cls, fp, *, validate=True):
+    """Yield the instances of cls in binary file fp, as written by
+    dump_msgpack_stream().
+    """
+    require_msgpack()
+    from_msgpack = get_codec(cls).from_msgpack
+    for obj in msgpack.Unpacker(fp):
+        yield from_msgpack(obj, validate)
@@ -0,0 +1,279 @@
+"""Memory-mapped files of fixed-layout Struct records.
+
+A Struct class has a fixed layout if each of its fields is a TypedField
+(without seq or or_none) whose kind is bool, int, float, or another
+Struct class with a fixed layout. Records of such a class are all the
+same size, so a file of them can be indexed directly. Ints are stored
+in 64 bits.
+
+dump_records() writes records to a file, and RecordFile maps it into
+memory and gives access to the records through views. A view has the
+same fields as the Struct, as well as len(), iteration, indexing, and
+_asdict(), but each field value is only read from the file when it is
+accessed. Nested Struct fields give views as well. _materialize()
+returns a Struct instance with the view's values.
+
+Since opening a file only reads its header, it takes the same time
+whatever its size.
+"""
+
+
+__all__ = [
+    'dump_records',
+    'RecordFile',
+]
+
+
+import mmap
+import struct
+import zlib
+from collections import OrderedDict
+
+from .struct import Struct
+from .fields import TypedField
+from .serial import FIXED_FORMATS, check_type, stores_decoded
+
+
+MAGIC = b'SSM1'
+# Magic string, layout fingerprint, and record size.
+HEADER = struct.Struct('<4sII')
+
+
+class Layout:
+    
+    """The fixed layout of a Struct class's records. Each field is
+    either a primitive value packed at an offset, or a nested record
+    of another layout.
+    """
+    
+    def __init__(self, cls):
+        self.struct_type = cls
+        # (field, offset, struct.Struct or None, Layout or None)
+        self.fields = []
+        fmt = ''
+        descs = []
+        offset = 0
+        for f in cls._struct:
+            if not (isinstance(f, TypedField) and
+                    not f.seq and not f.or_none):
+                raise TypeError('Field {} of Struct {} does not have a fixed '
+                                'layout'.format(f.name, cls.__name__))
+            if f.kind in FIXED_FORMATS:
+                st = struct.Struct('<' + FIXED_FORMATS[f.kind])
+                self.fields.append((f, offset, st, None))
+                fmt += st.format[1:]
+                descs.append('{}:{}'.format(f.name, st.format[1:]))
+                offset += st.size
+            elif f.coerces_tuples:
+                nested = get_layout(f.kind[0])
+                self.fields.append((f, offset, None, nested))
+                fmt += nested.format[1:]
+                descs.append('{}:{}'.format(f.name, nested.description))
+                offset += nested.size
+            else:
+                raise TypeError('Field {} of Struct {} does not have a fixed '
+                                'layout'.format(f.name, cls.__name__))
+        if offset == 0:
+            raise TypeError('Struct {} has no fields to store'.format(
+                            cls.__name__))
+        self.format = '<' + fmt
+        self.packer = struct.Struct(self.format)
+        self.size = self.packer.size
+        self.description = '{}({})'.format(cls.__qualname__,
+                                           ','.join(descs))
+        self.fingerprint = zlib.crc32(self.description.encode('utf-8'))
+        self.trusted = all(stores_decoded(f) for f in cls._struct)
+        self.view_type = make_view_type(self)
+    
+    def flatten(self, inst, out):
+        """Append the primitive values of inst to list out, in the
+        order they are packed.
+        """
+        check_type(self.struct_type, inst)
+        for (f, offset, st, nested), v in zip(self.fields,
+                                              inst._values(inst)):
+            if nested is None:
+                out.append(v)
+            else:
+                nested.flatten(v, out)
+    
+    def pack(self, inst):
+        """Return the record for inst as bytes."""
+        values = []
+        self.flatten(inst, values)
+        return self.packer.pack(*values)
+
+
+# Each Struct class's layout is kept on the class, as for schemas in
+# serial.py, so that it doesn't keep the class alive.
+def get_layout(cls):
+    layout = cls.__dict__.get('__mapped_layout')
+    if layout is None:
+        layout = Layout(cls)
+        setattr(cls, '__mapped_layout', layout)
+    return layout
+
+
+class RecordView:
+    
+    """Base class for views of records in a buffer. Subclasses, made
+    by make_view_type(), add a property per field.
+    """
+    
+    __slots__ = ('_buf', '_offset')
+    
+    _layout = None
+    
+    def __init__(self, buf, offset):
+        self._buf = buf
+        self._offset = offset
+    
+    def __len__(self):
+        return len(self._layout.fields)
+    
+    def __iter__(self):
+        for f, _, _, _ in self._layout.fields:
+            yield getattr(self, f.name)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self)[index]
+        f = self._layout.fields[index][0]
+        return getattr(self, f.name)
+    
+    def _asdict(self):
+        """Return an OrderedDict of the fields. Nested records are
+        given as views.
+        """
+        return OrderedDict((f.name, getattr(self, f.name))
+                           for f, _, _, _ in self._layout.fields)
+    
+    def _materialize(self):
+        """Return an instance of the Struct with this record's values."""
+        layout = self._layout
+        cls = layout.struct_type
+        values = [v._materialize() if isinstance(v, RecordView) else v
+                  for v in self]
+        if layout.trusted:
+            return cls._construct_trusted(cls, None, *values)
+        return cls(*values)
+    
+    def __eq__(self, other):
+        if isinstance(other, RecordView):
+            if other._layout is not self._layout:
+                return NotImplemented
+            return tuple(self) == tuple(other)
+        if isinstance(other, Struct):
+            return self._materialize() == other
+        return NotImplemented
+    
+    __hash__ = None
+    
+    def __repr__(self):
+        return '{}({})'.format(
+            type(self).__name__,
+            ', '.join('{}={!r}'.format(name, value)
+                      for name, value in self._asdict().items()))
+
+
+def make_view_type(layout):
+    """Return a RecordView subclass for records of the given layout."""
+    namespace = {'__slots__': (), '_layout': layout}
+    for f, offset, st, nested in layout.fields:
+        if nested is None:
+            def get(self, unpack=st.unpack_from, offset=offset):
+                return unpack(self._buf, self._offset + offset)[0]
+        else:
+            def get(self, view_type=nested.view_type, offset=offset):
+                return view_type(self._buf, self._offset + offset)
+        namespace[f.name] = property(get)
+    return type(layout.struct_type.__name__ + 'View', (RecordView,),
+                namespace)
+
+
+def dump_records(cls, records, fp):
+    """Write the instances of cls from iterable records to binary file
+    fp, which RecordFile can then open. Return the number written.
+    """
+    layout = get_layout(cls)
+    fp.write(HEADER.pack(MAGIC, layout.fingerprint, layout.size))
+    n = 0
+    chunk = bytearray()
+    for inst in records:
+        try:
+            chunk += layout.pack(inst)
+        except struct.error as exc:
+            raise ValueError('Cannot store {}: {}'.format(
+                             cls.__name__, exc)) from None
+        n += 1
+        if len(chunk) >= 1 << 16:
+            fp.write(chunk)
+            chunk.clear()
+    fp.write(chunk)
+    return n
+
+
+class RecordFile:
+    
+    """A read-only, memory-mapped file of records of Struct class cls,
+    as written by dump_records(). It is a sequence of views of the
+    records. Views must not be used after the file is closed.
+    
+    RecordFile can be used as a context manager, which closes it.
+    """
+    
+    def __init__(self, cls, path):
+        self.struct_type = cls
+        self.layout = get_layout(cls)
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise ValueError('Missing header')
+            magic, fingerprint, size = HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ValueError('Not a Struct record file')
+            if fingerprint != self.layout.fingerprint:
+                raise ValueError('File was not written with the current '
+                                 'layout of {}'.format(cls.__name__))
+            self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data_size = len(self.buf) - HEADER.size
+        if data_size % self.layout.size != 0:
+            self.buf.close()
+            raise ValueError('Truncated record')
+        self.length = data_size // self.layout.size
+    
+    def close(self):
+        self.buf.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def __len__(self):
+        return self.length
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        if not isinstance(index, int):
+            raise TypeError('RecordFile indices must be integers')
+        if not -self.length <= index < self.length:
+            raise IndexError('RecordFile index out of range')
+        if index < 0:
+            index += self.length
+        return self.layout.view_type(
+            self.buf, HEADER.size + index * self.layout.size)
+    
+    def __iter__(self):
+        view_type = self.layout.view_type
+        buf = self.buf
+        size = self.layout.size
+        for offset in range(HEADER.size, HEADER.size + self.length * size,
+                            size):
+            yield view_type(buf, offset)
+    
+    def __repr__(self):
+        return '{}({}, {} records)'.format(
+            self.__class__.__name__, self.struct_type.__name__, self.length)
@@ -0,0 +1,133 @@
+"""Validating large batches of Structs in parallel.
+
+construct_parallel() is like Struct._from_rows(), but splits the
+validation of the rows across worker processes. Each worker validates
+a chunk of rows by constructing them, and sends back only whether it
+succeeded. Once all the chunks pass, this process constructs the
+instances with validate=False, which still normalizes values but
+skips the type checks.
+
+Sending back the constructed instances, whether pickled or in the
+serial module's format, costs more to decode than constructing them
+again without validation. Sending the rows to the workers is costly
+too, so where the fork start method is available, the workers are
+forked with the rows already in memory (one call at a time, if several
+threads call construct_parallel()). Otherwise (or if an executor
+is given) each chunk is pickled, and the Struct class must be defined
+at the top level of a module.
+
+This pays off when validation is expensive, such as for fields with
+custom checks or many sequence elements, and the batch is large
+enough to make up for starting the workers. Smaller batches are
+constructed in the calling process; the cutoff is min_rows. Run
+benchmarks/bench_parallel.py to find the crossover on a given machine.
+"""
+
+
+__all__ = [
+    'construct_parallel',
+]
+
+
+import gc
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+
+from .struct import Struct
+
+
+# Default number of rows below which construction isn't parallelized.
+MIN_PARALLEL_ROWS = 20000
+
+# The Struct class and rows of the construct_parallel() call in
+# progress, for forked workers to read. Calls that fork hold the lock,
+# so that workers never see another thread's batch.
+shared_batch = None
+fork_lock = Lock()
+
+
+def check_chunk(start, stop, validate, chunk=None):
+    """Construct the instances of rows[start:stop], to raise any error
+    validating them. chunk is the Struct class and those rows, or None
+    to read them from shared_batch. This runs in a worker process.
+    """
+    if chunk is None:
+        cls, rows = shared_batch
+        rows = rows[start:stop]
+    else:
+        cls, rows = chunk
+    cls.construct_rows(rows, validate, start)
+
+
+def can_fork():
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def construct_parallel(cls, rows, *, validate=True, workers=None,
+                       chunk_size=None, min_rows=MIN_PARALLEL_ROWS,
+                       executor=None):
+    """Return a list of instances of Struct class cls constructed from
+    a sequence of rows, as by cls._from_rows(rows, validate).
+    
+    workers is the number of processes to use (the CPU count by
+    default). An existing ProcessPoolExecutor may be given instead,
+    to avoid the cost of starting one each time; workers should then
+    be its number of processes, as the executor doesn't expose it
+    publicly. Each worker task
+    handles chunk_size rows; by default, the rows are split into four
+    tasks per worker. If there are fewer than min_rows rows, only one
+    worker, or nothing to validate, the instances are constructed in
+    this process.
+    """
+    global shared_batch
+    
+    if not (isinstance(cls, type) and issubclass(cls, Struct)):
+        raise TypeError('Expected Struct class; got {!r}'.format(cls))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if (len(rows) < min_rows or workers <= 1 or not validate or
+        cls._validation == 'off'):
+        return cls._from_rows(rows, validate)
+    
+    if chunk_size is None:
+        chunk_size = -(-len(rows) // (workers * 4))
+    starts = range(0, len(rows), chunk_size)
+    stops = [start + chunk_size for start in starts]
+    n = len(starts)
+    
+    if executor is not None:
+        chunks = [(cls, rows[start:stop])
+                  for start, stop in zip(starts, stops)]
+        for _ in executor.map(check_chunk, starts, stops, [validate] * n,
+                              chunks):
+            pass
+    elif can_fork():
+        with fork_lock:
+            shared_batch = (cls, rows)
+            # Keep the workers' garbage collection from touching (and
+            # so copying) every object inherited from this process.
+            # If the application has frozen objects itself, leave the
+            # freezing to it, since unfreezing would thaw those too.
+            freeze = gc.get_freeze_count() == 0
+            if freeze:
+                gc.freeze()
+            try:
+                with ProcessPoolExecutor(
+                        workers,
+                        mp_context=multiprocessing.get_context('fork')
+                        ) as executor:
+                    for _ in executor.map(check_chunk, starts, stops,
+                                          [validate] * n):
+                        pass
+            finally:
+                shared_batch = None
+                if freeze:
+                    gc.unfreeze()
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            return construct_parallel(cls, rows, workers=workers,
+                                      chunk_size=chunk_size,
+                                      min_rows=min_rows, executor=executor)
+    return cls._from_rows(rows, validate=False)
@@ -0,0 +1,528 @@
+"""Compact binary serialization of Structs, driven by their fields.
+
+The encoding of a Struct class is derived from its fields (its
+schema). TypedFields of kind bool, int, or float are packed as fixed-
+width values (int as 64 bits), str and bytes fields are length-
+prefixed, fields whose kind is a Struct class are encoded recursively,
+and seq fields are encoded as a count followed by their elements.
+Other fields use a self-describing encoding, falling back to pickle
+for values it doesn't know. Values are decoded as the field's kind,
+so e.g. an IntEnum stored in an int field comes back as an int.
+
+Data written by dumps() and dump_many() starts with a header that
+identifies the schema. Loading it with a class whose schema differs
+raises ValueError, as does malformed data.
+
+By default, loaded instances are constructed as usual, and so are
+validated and passed to any user-defined __init__(). Passing
+validate=False skips the field checks, for input that is trusted
+(unless a field customizes normalization, in which case instances
+are still constructed as usual).
+
+Since unpickling can run arbitrary code, loading data that contains
+pickled values raises ValueError unless trusted=True is passed. Only
+pass it for data from a trusted source.
+"""
+
+
+__all__ = [
+    'dumps',
+    'loads',
+    'dump_many',
+    'iter_load',
+]
+
+
+import pickle
+import struct
+import zlib
+
+from .struct import Field, Struct, make_function
+from .fields import TypedField
+
+
+MAGIC = b'SSB1'
+# Magic string and schema fingerprint.
+HEADER = struct.Struct('<4sI')
+# Size of each record in a stream.
+LENGTH = struct.Struct('<I')
+
+# Formats for kinds of TypedFields that are packed as fixed-width
+# values.
+FIXED_FORMATS = {
+    (bool,): '?',
+    (int,): 'q',
+    (float,): 'd',
+}
+
+FLOAT = struct.Struct('<d')
+
+
+def write_uvarint(out, n):
+    """Append the non-negative int n to bytearray out, 7 bits per
+    byte, least significant first.
+    """
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def read_uvarint(buf, pos):
+    """Read an int written by write_uvarint() from buf at pos, and
+    return it along with the position after it.
+    """
+    n = 0
+    shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+# Codecs for single values are pairs of functions: encode(value, out)
+# appends value's encoding to bytearray out, and decode(buf, pos,
+# validate, trusted) returns the value at pos in buf (bytes or
+# bytearray) along with the position after it.
+
+def encode_str(value, out):
+    data = value.encode('utf-8')
+    write_uvarint(out, len(data))
+    out += data
+
+def decode_str(buf, pos, validate, trusted):
+    n, pos = read_uvarint(buf, pos)
+    return buf[pos:pos + n].decode('utf-8'), pos + n
+
+def encode_bytes(value, out):
+    write_uvarint(out, len(value))
+    out += value
+
+def decode_bytes(buf, pos, validate, trusted):
+    n, pos = read_uvarint(buf, pos)
+    return bytes(buf[pos:pos + n]), pos + n
+
+
+# Tags of the self-describing encoding used by untyped fields.
+(TAG_NONE, TAG_FALSE, TAG_TRUE, TAG_INT, TAG_FLOAT, TAG_STR, TAG_BYTES,
+ TAG_TUPLE, TAG_PICKLE) = range(9)
+
+def encode_any(value, out):
+    # Exact type checks, so that subclasses are pickled and come back
+    # as themselves.
+    t = type(value)
+    if value is None:
+        out.append(TAG_NONE)
+    elif t is bool:
+        out.append(TAG_TRUE if value else TAG_FALSE)
+    elif t is int:
+        out.append(TAG_INT)
+        # Zigzag encoding, so small negative ints stay small.
+        write_uvarint(out, value * 2 if value >= 0 else -value * 2 - 1)
+    elif t is float:
+        out.append(TAG_FLOAT)
+        out += FLOAT.pack(value)
+    elif t is str:
+        out.append(TAG_STR)
+        encode_str(value, out)
+    elif t is bytes:
+        out.append(TAG_BYTES)
+        encode_bytes(value, out)
+    elif t is tuple:
+        out.append(TAG_TUPLE)
+        write_uvarint(out, len(value))
+        for v in value:
+            encode_any(v, out)
+    else:
+        out.append(TAG_PICKLE)
+        encode_bytes(pickle.dumps(value, pickle.HIGHEST_PROTOCOL), out)
+
+def decode_any(buf, pos, validate, trusted):
+    tag = buf[pos]
+    pos += 1
+    if tag == TAG_NONE:
+        return None, pos
+    elif tag == TAG_FALSE:
+        return False, pos
+    elif tag == TAG_TRUE:
+        return True, pos
+    elif tag == TAG_INT:
+        z, pos = read_uvarint(buf, pos)
+        return (z >> 1 if not z & 1 else -((z + 1) >> 1)), pos
+    elif tag == TAG_FLOAT:
+        return FLOAT.unpack_from(buf, pos)[0], pos + FLOAT.size
+    elif tag == TAG_STR:
+        return decode_str(buf, pos, validate, trusted)
+    elif tag == TAG_BYTES:
+        return decode_bytes(buf, pos, validate, trusted)
+    elif tag == TAG_TUPLE:
+        n, pos = read_uvarint(buf, pos)
+        items = []
+        for _ in range(n):
+            v, pos = decode_any(buf, pos, validate, trusted)
+            items.append(v)
+        return tuple(items), pos
+    elif tag == TAG_PICKLE:
+        if not trusted:
+            raise ValueError('Data contains a pickled value, which is '
+                             'only loaded with trusted=True')
+        data, pos = decode_bytes(buf, pos, validate, trusted)
+        return pickle.loads(data), pos
+    raise ValueError('Unknown value tag {}'.format(tag))
+
+
+def fixed_codec(fmt):
+    st = struct.Struct('<' + fmt)
+    def encode(value, out):
+        out += st.pack(value)
+    def decode(buf, pos, validate, trusted):
+        return st.unpack_from(buf, pos)[0], pos + st.size
+    return encode, decode
+
+def struct_codec(cls):
+    # Instances of subclasses of cls are also valid values. They are
+    # marked with a tag byte and use the generic encoding. The schema
+    # is looked up on use, so that a Struct may contain fields of its
+    # own type.
+    def encode(value, out):
+        if type(value) is cls:
+            out.append(0)
+            get_schema(cls).encode(value, out)
+        else:
+            out.append(1)
+            encode_any(value, out)
+    def decode(buf, pos, validate, trusted):
+        if buf[pos] == 0:
+            return get_schema(cls).decode(buf, pos + 1, validate, trusted)
+        return decode_any(buf, pos + 1, validate, trusted)
+    return encode, decode
+
+def seq_codec(codec):
+    encode_elem, decode_elem = codec
+    def encode(value, out):
+        write_uvarint(out, len(value))
+        for v in value:
+            encode_elem(v, out)
+    def decode(buf, pos, validate, trusted):
+        n, pos = read_uvarint(buf, pos)
+        items = []
+        for _ in range(n):
+            v, pos = decode_elem(buf, pos, validate, trusted)
+            items.append(v)
+        return tuple(items), pos
+    return encode, decode
+
+def optional_codec(codec):
+    encode_value, decode_value = codec
+    def encode(value, out):
+        if value is None:
+            out.append(0)
+        else:
+            out.append(1)
+            encode_value(value, out)
+    def decode(buf, pos, validate, trusted):
+        if buf[pos] == 0:
+            return None, pos + 1
+        return decode_value(buf, pos + 1, validate, trusted)
+    return encode, decode
+
+
+def struct_kind(kind):
+    """Return the Struct class that is the (normalized) TypedField
+    kind, or None if it isn't one.
+    """
+    if (len(kind) == 1 and isinstance(kind[0], type) and
+        issubclass(kind[0], Struct)):
+        return kind[0]
+    return None
+
+def kind_codec(kind):
+    """Return a codec and description for single values of the given
+    (normalized) TypedField kind.
+    """
+    if kind in FIXED_FORMATS:
+        fmt = FIXED_FORMATS[kind]
+        return fixed_codec(fmt), fmt
+    elif kind == (str,):
+        return (encode_str, decode_str), 'str'
+    elif kind == (bytes,):
+        return (encode_bytes, decode_bytes), 'bytes'
+    elif struct_kind(kind) is not None:
+        return struct_codec(kind[0]), 'struct:' + kind[0].__qualname__
+    return (encode_any, decode_any), 'any'
+
+def field_codec(f):
+    """Return a codec and description for values of field f."""
+    if not isinstance(f, TypedField):
+        return (encode_any, decode_any), 'any'
+    codec, desc = kind_codec(f.kind)
+    if f.seq:
+        codec = seq_codec(codec)
+        desc = 'seq:' + desc
+    if f.or_none:
+        codec = optional_codec(codec)
+        desc = 'opt:' + desc
+    return codec, desc
+
+def schema_desc(cls, outer=()):
+    """Return a description of the binary layout of Struct class cls,
+    which its fingerprint is taken from. Struct classes that its
+    fields contain are described recursively, except for those in
+    outer, which are already being described.
+    """
+    outer += (cls,)
+    descs = []
+    for f in cls._struct:
+        desc = field_codec(f)[1]
+        kind = struct_kind(f.kind) if isinstance(f, TypedField) else None
+        if kind is not None and kind not in outer:
+            desc += '=' + schema_desc(kind, outer)
+        descs.append('{}:{}'.format(f.name, desc))
+    return '{}({})'.format(cls.__qualname__, ','.join(descs))
+
+
+def stores_decoded(f):
+    """Return whether decoded values of field f are what it would
+    store, so that the trusted constructor may store them directly.
+    This isn't known for fields that customize normalization.
+    """
+    if not f.converts_columns():
+        # The trusted constructor goes through __set__() anyway.
+        return True
+    t = type(f)
+    if isinstance(f, TypedField):
+        return (t.normalize is TypedField.normalize and
+                t.convert_column is TypedField.convert_column)
+    return t.convert_column is Field.convert_column
+
+
+class Schema:
+    
+    """The binary layout of a Struct class. Functions to encode and
+    decode instances are generated from it, with consecutive fixed-
+    width fields packed together by one struct.Struct, and str and
+    bytes fields handled inline. Other fields call their codecs.
+    """
+    
+    def __init__(self, cls):
+        self.struct_type = cls
+        namespace = {
+            '__cls': cls,
+            '__values': cls._values,
+            '__write_uvarint': write_uvarint,
+            '__read_uvarint': read_uvarint,
+        }
+        # Locals named for field positions, which can't collide with
+        # the parameters.
+        names = ['__v{}'.format(i) for i in range(len(cls._struct))]
+        enc = []
+        dec = []
+        if len(names) > 0:
+            enc.append('{}, = __values(inst)'.format(', '.join(names)))
+        group = []
+        
+        def flush():
+            if len(group) > 0:
+                st = struct.Struct('<' + ''.join(fmt for _, fmt in group))
+                stname = '__st{}'.format(group[0][0])
+                namespace[stname] = st
+                vals = ', '.join(names[i] for i, _ in group)
+                enc.append('out += {}.pack({})'.format(stname, vals))
+                dec.append('{}, = {}.unpack_from(buf, pos)'.format(
+                           vals, stname))
+                dec.append('pos += {}'.format(st.size))
+                group.clear()
+        
+        for i, f in enumerate(cls._struct):
+            v = names[i]
+            plain = (isinstance(f, TypedField) and
+                     not f.seq and not f.or_none)
+            if plain and f.kind in FIXED_FORMATS:
+                fmt = FIXED_FORMATS[f.kind]
+                group.append((i, fmt))
+                continue
+            flush()
+            if plain and f.kind in [(str,), (bytes,)]:
+                is_str = f.kind == (str,)
+                if is_str:
+                    enc.append("__d = {}.encode('utf-8')".format(v))
+                else:
+                    enc.append('__d = {}'.format(v))
+                enc += ['__n = len(__d)',
+                        'if __n < 0x80:',
+                        '    out.append(__n)',
+                        'else:',
+                        '    __write_uvarint(out, __n)',
+                        'out += __d']
+                dec += ['__n = buf[pos]',
+                        'if __n < 0x80:',
+                        '    pos += 1',
+                        'else:',
+                        '    __n, pos = __read_uvarint(buf, pos)',
+                        ("{} = buf[pos:pos + __n].decode('utf-8')" if is_str
+                         else '{} = bytes(buf[pos:pos + __n])').format(v),
+                        'pos += __n']
+            else:
+                encode, decode = field_codec(f)[0]
+                namespace['__enc{}'.format(i)] = encode
+                namespace['__dec{}'.format(i)] = decode
+                enc.append('__enc{0}({1}, out)'.format(i, v))
+                dec.append('{1}, pos = __dec{0}(buf, pos, validate, '
+                           'trusted)'.format(i, v))
+        flush()
+        
+        args = ', '.join(names)
+        if all(stores_decoded(f) for f in cls._struct):
+            # The trusted constructor is looked up on each call, since
+            # it changes with the validation mode.
+            dec += ['if not validate:',
+                    '    return __cls._construct_trusted(__cls, None{}), '
+                        'pos'.format(''.join(', ' + n for n in names))]
+        dec.append('return __cls({}), pos'.format(args))
+        enc.append('pass')
+        
+        qualname = 'Schema({})'.format(cls.__qualname__)
+        self.encode = make_function('encode', ['inst', 'out'], enc,
+                                    namespace, qualname + '.encode', cls)
+        self.encode.__doc__ = 'Append the encoding of inst to bytearray out.'
+        self.decode = make_function('decode',
+                                    ['buf', 'pos', 'validate', 'trusted'],
+                                    dec, namespace, qualname + '.decode',
+                                    cls)
+        self.decode.__doc__ = (
+            'Decode an instance from buf at pos, and return it along '
+            'with the position after it.')
+        
+        self.fingerprint = zlib.crc32(schema_desc(cls).encode('utf-8'))
+
+
+# Each Struct class's schema is kept on the class, under a name that
+# can't be a field's. The schema refers back to the class, so keeping
+# it in a table here, even a WeakKeyDictionary, would keep the class
+# alive.
+def get_schema(cls):
+    schema = cls.__dict__.get('__serial_schema')
+    if schema is None:
+        schema = Schema(cls)
+        setattr(cls, '__serial_schema', schema)
+    return schema
+
+
+# What decoding raises when the data is malformed.
+DECODE_ERRORS = (IndexError, struct.error, UnicodeDecodeError)
+
+def check_type(cls, obj):
+    if type(obj) is not cls:
+        raise TypeError('Expected {} instance; got {}'.format(
+                        cls.__name__, type(obj).__name__))
+
+def encode_record(schema, obj):
+    out = bytearray()
+    try:
+        schema.encode(obj, out)
+    except struct.error as exc:
+        raise ValueError('Cannot serialize {}: {}'.format(
+                         type(obj).__name__, exc)) from None
+    return out
+
+def malformed(schema, detail):
+    return ValueError('Malformed {} record: {}'.format(
+                      schema.struct_type.__name__, detail))
+
+def check_end(schema, pos, end):
+    """Check that decoding a record stopped where it should have."""
+    if pos != end:
+        raise malformed(schema, '{} {} bytes'.format(
+                        abs(end - pos), 'extra' if pos < end else 'missing'))
+
+def decode_record(schema, buf, start, end, validate, trusted):
+    """Decode the record that occupies buf[start:end]."""
+    try:
+        obj, pos = schema.decode(buf, start, validate, trusted)
+    except DECODE_ERRORS as exc:
+        raise malformed(schema, exc) from None
+    check_end(schema, pos, end)
+    return obj
+
+def check_header(schema, data):
+    if len(data) < HEADER.size:
+        raise ValueError('Missing header')
+    magic, fingerprint = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('Not serialized Struct data')
+    if fingerprint != schema.fingerprint:
+        raise ValueError('Data was not written with the current schema '
+                         'of {}'.format(schema.struct_type.__name__))
+
+
+def dumps(obj):
+    """Return the serialization of a Struct instance as bytes."""
+    if not isinstance(obj, Struct):
+        raise TypeError('Expected Struct instance; got {}'.format(
+                        type(obj).__name__))
+    schema = get_schema(type(obj))
+    return (HEADER.pack(MAGIC, schema.fingerprint) +
+            encode_record(schema, obj))
+
+def loads(cls, data, *, validate=True, trusted=False):
+    """Return the instance of cls serialized in data by dumps()."""
+    schema = get_schema(cls)
+    check_header(schema, data)
+    if not isinstance(data, (bytes, bytearray)):
+        data = bytes(data)
+    return decode_record(schema, data, HEADER.size, len(data), validate,
+                         trusted)
+
+def dump_many(cls, objs, fp):
+    """Write instances of cls from iterable objs to binary file fp,
+    one at a time. Return the number written.
+    """
+    schema = get_schema(cls)
+    fp.write(HEADER.pack(MAGIC, schema.fingerprint))
+    n = 0
+    for obj in objs:
+        check_type(cls, obj)
+        record = encode_record(schema, obj)
+        fp.write(LENGTH.pack(len(record)))
+        fp.write(record)
+        n += 1
+    return n
+
+def iter_load(cls, fp, *, validate=True, trusted=False,
+              chunk_size=1 << 16):
+    """Yield the instances of cls written to binary file fp by
+    dump_many(). The file is read chunk_size bytes at a time, so
+    memory use doesn't depend on the file's size.
+    """
+    schema = get_schema(cls)
+    check_header(schema, fp.read(HEADER.size))
+    # This loop inlines decode_record().
+    decode = schema.decode
+    unpack_length = LENGTH.unpack_from
+    size = LENGTH.size
+    # Bytes of a partial record left over from the previous chunk.
+    rest = b''
+    while True:
+        chunk = fp.read(chunk_size)
+        if len(chunk) == 0:
+            if len(rest) > 0:
+                raise ValueError('Truncated record')
+            return
+        buf = rest + chunk if len(rest) > 0 else chunk
+        end = len(buf)
+        pos = 0
+        while end - pos >= size:
+            (n,) = unpack_length(buf, pos)
+            stop = pos + size + n
+            if stop > end:
+                break
+            try:
+                obj, end_pos = decode(buf, pos + size, validate, trusted)
+            except DECODE_ERRORS as exc:
+                raise malformed(schema, exc) from None
+            check_end(schema, end_pos, stop)
+            yield obj
+            pos = stop
+        rest = buf[pos:]
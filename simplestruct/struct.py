@@ -5,18 +5,429 @@ __all__ = [
     'Field',
     'MetaStruct',
     'Struct',
+    'fast_pickle',
+    'get_validation',
+    'make_struct',
+    'set_validation',
+    'validation',
 ]
 
 
-from collections import OrderedDict, Counter
-from functools import reduce
-from inspect import Signature, Parameter
+import keyword
+import os
+import sys
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import islice
+from operator import attrgetter
 from reprlib import recursive_repr
+from threading import get_ident, RLock
+from weakref import WeakSet, WeakValueDictionary
+
+from .codecache import compile_cached
+
+
+# Levels of type checking done by fields, from most to least strict.
+# 'full' checks values whenever fields are set. 'construct_only' only
+# checks values while instances are being initialized. 'off' never
+# checks values, though fields still coerce and normalize them.
+VALIDATION_MODES = ['full', 'construct_only', 'off']
+
+def check_validation_mode(mode):
+    if mode not in VALIDATION_MODES:
+        raise ValueError('Unknown validation mode {!r}; expected one of '
+                         '{}'.format(mode, ', '.join(VALIDATION_MODES)))
+
+# The process-wide validation mode. It is combined with each Struct
+# class's _validate mode, and the less strict of the two wins.
+validation_mode = os.environ.get('SIMPLESTRUCT_VALIDATE', 'full')
+check_validation_mode(validation_mode)
+
+def get_validation():
+    """Return the process-wide validation mode."""
+    return validation_mode
+
+def set_validation(mode):
+    """Set the process-wide validation mode. This affects all Struct
+    classes, whether already defined or not, in all threads. Since
+    fields and constructors are rebound for every class, this is
+    meant to be done at startup (or in tests), not while other
+    threads are using Structs.
+    
+    The initial mode is taken from the SIMPLESTRUCT_VALIDATE
+    environment variable, or else is 'full'.
+    """
+    global validation_mode
+    check_validation_mode(mode)
+    validation_mode = mode
+    for cls in list(MetaStruct.all_structs):
+        cls.apply_validation()
+
+# The object collecting statistics while instrumentation is enabled,
+# or None (see the instrument module). Classes only install
+# instrumented constructors and methods while it is set, so that
+# instrumentation costs nothing otherwise.
+recorder = None
+
+def set_recorder(new_recorder):
+    """Replace the recorder, and reinstall the constructors and
+    methods of all Struct classes to match.
+    """
+    global recorder
+    old_recorder = recorder
+    recorder = new_recorder
+    for cls in list(MetaStruct.all_structs):
+        if old_recorder is not None:
+            old_recorder.detach(cls)
+        cls.install_constructors()
+        if new_recorder is not None:
+            new_recorder.attach(cls)
+
+@contextmanager
+def validation(mode):
+    """Context manager that sets the process-wide validation mode
+    for the duration of the block. As with set_validation(), the mode
+    is not scoped to the block's thread or task: it applies to all
+    threads, and entering and leaving the block rebinds every class.
+    Use it in tests or single-threaded scripts, not to skip checks
+    on a hot path of a concurrent program.
+    """
+    old_mode = validation_mode
+    set_validation(mode)
+    try:
+        yield
+    finally:
+        set_validation(old_mode)
+
+
+# Whether all Structs are currently unpickled the trusted way (see
+# fast_pickle()), rather than only those with _fast_pickle set. This
+# is per thread (and per asyncio task), so that a block of trusted
+# unpickling doesn't extend to untrusted data loaded concurrently.
+trusted_unpickling = ContextVar('trusted_unpickling', default=False)
+
+@contextmanager
+def fast_pickle():
+    """Context manager under which Structs unpickled (or copied with
+    the copy module) are restored the trusted way, as for classes
+    with _fast_pickle set. This only affects the current thread or
+    asyncio task.
+    """
+    token = trusted_unpickling.set(True)
+    try:
+        yield
+    finally:
+        trusted_unpickling.reset(token)
+
+def unpickle_struct(cls, *values):
+    """Recreate a pickled instance of cls from its field values."""
+    if cls._fast_pickle or trusted_unpickling.get():
+        return restore_struct(cls, values)
+    return cls(*values)
+
+def restore_struct(cls, values):
+    """Recreate an instance of cls from trusted field values, as
+    trusted unpickling does.
+    """
+    restore = cls.__dict__.get('_construct_restore')
+    if restore is None:
+        restore = cls._construct_restore = cls.make_restorer()
+    return restore(cls, *values)
 
 
 def hash_seq(seq):
-    """Given a sequence of hash values, return a combined xor'd hash."""
-    return reduce(lambda x, y: x ^ y, seq, 0)
+    """Given a sequence of hash values, return a combined hash.
+    The combination is order-sensitive, and unlike xor, doesn't
+    cancel out repeated values.
+    """
+    # Use the tuple hash, which mixes its elements' hashes well.
+    return hash(tuple(seq))
+
+
+def parse_columns(parsers, columns):
+    """Return a list of the given columns with their str values
+    parsed, for Struct._stream(). parsers has a function or None for
+    each column. Return it along with None, or if a value can't be
+    parsed, return None along with a tuple of its row index, column
+    index, and error message. (The result may be sent between
+    processes.)
+    """
+    result = []
+    for j, (parse, col) in enumerate(zip(parsers, columns)):
+        if parse is not None:
+            try:
+                if set(map(type, col)) <= {str}:
+                    col = list(map(parse, col))
+                else:
+                    col = [parse(v) if type(v) is str else v for v in col]
+            except ValueError:
+                # Find the value that failed.
+                for i, v in enumerate(col):
+                    if type(v) is str:
+                        try:
+                            parse(v)
+                        except ValueError as exc:
+                            return None, (i, j, str(exc))
+                raise
+        result.append(col)
+    return result, None
+
+
+def make_function(name, params, body, namespace, qualname=None,
+                  owner=None):
+    """Compile and return a function from generated source code.
+    
+    params is a list of parameter strings and body is a list of
+    lines, without indentation. namespace supplies the function's
+    globals. If qualname is given, it becomes the function's
+    __qualname__, which helps tracebacks point at the right class.
+    If owner is given, it is the Struct class the code is generated
+    for, and the compiled code is kept in the code cache, if there is
+    one (see codecache.py).
+    """
+    src = 'def {}({}):\n{}\n'.format(
+        name, ', '.join(params),
+        '\n'.join('    ' + line for line in body))
+    ns = {}
+    exec(src if owner is None else compile_cached(owner, src),
+         namespace, ns)
+    func = ns[name]
+    if qualname is not None:
+        func.__qualname__ = qualname
+    return func
+
+
+def tuple_getter(names):
+    """Return a function that takes an object and returns a tuple of
+    its attributes with the given names.
+    """
+    if len(names) == 0:
+        return lambda obj: ()
+    if len(names) == 1:
+        # attrgetter() with one name returns the bare value.
+        get = attrgetter(names[0])
+        return lambda obj: (get(obj),)
+    return attrgetter(*names)
+
+
+def base_struct(cls):
+    """Return Struct, or cls if it is Struct and is in the middle of
+    being defined.
+    """
+    try:
+        return Struct
+    except NameError:
+        return cls
+
+
+# Keys (id(self), id(other), thread id) for the equality comparisons
+# between mutable Structs that are currently in progress. A comparison
+# that reaches itself again is due to a cycle, and returns False.
+eq_in_progress = set()
+
+def lazy_eq(cls):
+    """Return a placeholder __eq__() for cls that generates the real
+    one with make_eq() when first called, and installs it in its
+    place (unless it has since been wrapped, as by instrumentation).
+    """
+    eq = None
+    def __eq__(self, other):
+        nonlocal eq
+        if eq is None:
+            eq = cls.make_eq()
+        if cls.__dict__.get('__eq__') is __eq__:
+            cls.__eq__ = eq
+        return eq(self, other)
+    __eq__.__qualname__ = cls.__qualname__ + '.__eq__'
+    __eq__._generated = True
+    return __eq__
+
+
+def construct_error(cls, fname, exc, row=None, error=TypeError):
+    """Return the TypeError to raise when construction of a cls
+    instance fails with exc while initializing field fname (or
+    before any field if fname is None). For bulk construction,
+    row is the index of the failing instance. A different exception
+    type may be given as error.
+    """
+    details = []
+    if row is not None:
+        details.append('row {}'.format(row))
+    if fname is not None:
+        details.append("field '{}'".format(fname))
+    where = cls.__name__
+    if len(details) > 0:
+        where += ' ({})'.format(', '.join(details))
+    return error('Error constructing {}: {}'.format(where, exc))
+
+
+class InternTable:
+    
+    """The canonical instances of a Struct class that has _intern set,
+    keyed by the tuple of their field values. Entries only hold weak
+    references to the instances, so they are evicted once nothing
+    else refers to them. Lookups are serialized by a lock, so that
+    two threads can't both install an instance for the same key.
+    """
+    
+    def __init__(self, cls):
+        self.struct_type = cls
+        self.table = WeakValueDictionary()
+        # Reentrant, in case comparing keys constructs more instances.
+        self.lock = RLock()
+        self.hits = 0
+        self.misses = 0
+    
+    def canonical(self, inst, key):
+        """Return the canonical instance for key, making inst the
+        canonical instance if there isn't one yet.
+        """
+        with self.lock:
+            try:
+                existing = self.table.get(key)
+            except TypeError as exc:
+                raise TypeError('Interned Struct {} requires hashable field '
+                                'values: {}'.format(
+                                self.struct_type.__name__, exc)) from None
+            if existing is not None:
+                self.hits += 1
+                return existing
+            self.misses += 1
+            self.table[key] = inst
+            return inst
+    
+    def stats(self):
+        """Return a dict of lookup counts and the table size."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.table),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups > 0 else 0.0,
+            }
+    
+    def clear(self):
+        """Forget all canonical instances and reset the counts."""
+        with self.lock:
+            self.table.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+def atomic_values(getter):
+    """Return a function like getter that holds the instance's lock
+    while reading, for Structs with _atomic.
+    """
+    def values(inst):
+        with inst._lock:
+            return getter(inst)
+    return values
+
+def atomic_setattr(self, name, value):
+    """__setattr__() for Structs with _atomic. Assignments to fields
+    of initialized instances hold the instance's lock. (Snapshot types
+    inherit this, but aren't atomic.)
+    """
+    if name in self._fieldindex and self._initialized and self._atomic:
+        with self._lock:
+            object.__setattr__(self, name, value)
+    else:
+        object.__setattr__(self, name, value)
+
+def update_fields(inst, changes):
+    """Assign the field values in dict changes to inst, in order. If
+    an assignment fails, restore the values of the fields assigned so
+    far, as they were stored, and re-raise.
+    """
+    old = []
+    try:
+        for name, value in changes.items():
+            f = inst._struct[inst._fieldindex[name]]
+            prev = f.__get__(inst, None)
+            setattr(inst, name, value)
+            # Only fields that were assigned need restoring, so a
+            # failed assignment doesn't fail again on rollback.
+            old.append((f, prev))
+    except BaseException:
+        for f, value in reversed(old):
+            Field.__set__(f, inst, value)
+        raise
+
+
+# Instance attributes that Struct keeps for itself.
+RESERVED_NAMES = frozenset(['_initialized', '_hash', '_lock'])
+
+def check_field_name(clsname, name):
+    """Raise ValueError if name can't be a field name. Besides being
+    an identifier and not a keyword, as a parameter must be, it can't
+    start with a double underscore, like the names that the generated
+    code uses for its own variables, or be one of RESERVED_NAMES.
+    """
+    if (not isinstance(name, str) or not name.isidentifier() or
+        keyword.iskeyword(name) or name.startswith('__') or
+        name in RESERVED_NAMES):
+        raise ValueError('Struct {}: {!r} is not a valid field '
+                         'name'.format(clsname, name))
+
+def unknown_field(name):
+    """Return the TypeError for a keyword argument that is not a
+    field, worded as Signature.bind() would word it.
+    """
+    return TypeError('got an unexpected keyword argument {!r}'.format(name))
+
+
+# Placeholders for a class's _construct, _construct_trusted,
+# _construct_rows, _construct_rows_unchecked, and _construct_replace
+# until they are made; see MetaStruct.install_constructors().
+
+def lazy_construct(cls, *args, **kargs):
+    return cls.build_constructor('_construct')(cls, *args, **kargs)
+
+def lazy_construct_trusted(cls, *args):
+    return cls.build_constructor('_construct_trusted')(cls, *args)
+
+def lazy_construct_rows(cls, *args):
+    return cls.build_constructor('_construct_rows')(cls, *args)
+
+def lazy_construct_rows_unchecked(cls, *args):
+    return cls.build_constructor('_construct_rows_unchecked')(cls, *args)
+
+def lazy_replace(self, kargs):
+    replace = type(self).build_constructor('_construct_replace')
+    if replace is None:
+        return generic_replace(self, kargs)
+    return replace(self, kargs)
+
+LAZY_CONSTRUCTORS = {
+    '_construct': lazy_construct,
+    '_construct_trusted': lazy_construct_trusted,
+    '_construct_rows': lazy_construct_rows,
+    '_construct_rows_unchecked': lazy_construct_rows_unchecked,
+    '_construct_replace': lazy_replace,
+}
+
+def pad_row(cls, index, row):
+    """Return the field values for a row passed to _from_rows() that
+    doesn't have one value per field, with the defaults of omitted
+    trailing fields filled in. Raise the construction error for the
+    row if the values don't fit the signature.
+    """
+    try:
+        bound = cls._signature.bind(*row)
+    except TypeError as exc:
+        raise construct_error(cls, None, exc, index) from exc
+    bound.apply_defaults()
+    return tuple(bound.arguments.values())
+
+def generic_replace(self, kargs):
+    """Implementation of Struct._replace() for classes that have no
+    _construct_replace, which constructs the copy as usual.
+    """
+    fields = dict(zip(self._fieldnames, self._values(self)))
+    fields.update(kargs)
+    return type(self)(**fields)
 
 
 class Field:
@@ -52,6 +463,11 @@ class Field:
         # by MetaStruct.
         self.name = None
         self.default = default
+        # slot is the member descriptor holding the field's value,
+        # if the owning Struct uses __slots__. Otherwise the value
+        # lives in the instance's __dict__ under name. This is also
+        # set by MetaStruct.
+        self.slot = None
     
     def copy(self):
         # This is used by MetaStruct to get a fresh instance
@@ -62,15 +478,59 @@ class Field:
     def has_default(self):
         return self.default is not self.NO_DEFAULT
     
+    def layout(self):
+        """Return a tuple describing this field, as part of the layout
+        of its Struct class that the code cache is keyed by (see
+        codecache.py). Its repr() must be the same in every process.
+        Subclasses should add any options that affect code generated
+        for the field or class.
+        """
+        t = type(self)
+        return (t.__module__, t.__qualname__, self.name,
+                type(self.default).__qualname__ if self.has_default
+                else None)
+    
+    def bind(self, cls):
+        """Called by MetaStruct once the Struct class that declares
+        this field has been created, and name and slot have been set.
+        It is called again whenever the class's validation mode (the
+        _validation attribute) changes. Subclasses may use it to
+        prepare specialized code; they should not be modified
+        afterwards.
+        """
+        pass
+    
+    def get_init_setter(self, validate):
+        """Return a function taking an instance and value, which does
+        what __set__() does while the instance is being initialized,
+        or None if __set__() should be used. If validate is false, the
+        function need not check the value (but must still coerce or
+        normalize it). Generated constructors call this function
+        directly instead of going through the descriptor.
+        """
+        return None
+    
+    def parser(self):
+        """Return a function that parses a str into a value for this
+        field, or None if str values are used as they are. This is
+        used by Struct._stream() to convert text input such as CSV.
+        """
+        return None
+    
     def __get__(self, inst, value):
         if inst is None:
             return self
+        if self.slot is not None:
+            return self.slot.__get__(inst)
         return inst.__dict__[self.name]
     
     def __set__(self, inst, value):
         if inst._immutable and inst._initialized:
             raise AttributeError('Struct is immutable')
-        inst.__dict__[self.name] = value
+        if self.slot is not None:
+            self.slot.__set__(inst, value)
+        else:
+            inst.__dict__[self.name] = value
     
     def eq(self, val1, val2):
         """Compare two values for this field."""
@@ -79,6 +539,29 @@ class Field:
     def hash(self, val):
         """Hash a value for this field."""
         return hash(val)
+    
+    def convert_column(self, values, validate=True):
+        """Given a sequence of values for this field for many new
+        instances, return a list of the values to store, as __set__()
+        would store them. If validate is false, the values may be
+        assumed valid, but should still be normalized.
+        
+        Subclasses that override __set__() to check or coerce values
+        should override this as well. If a value is rejected, raise
+        TypeError with its position as the exception's index attribute.
+        """
+        return list(values)
+    
+    def converts_columns(self):
+        """Return whether convert_column() does everything __set__()
+        does during initialization, so that its results can be stored
+        directly. This is not the case if a subclass overrides __set__()
+        but not convert_column().
+        """
+        mro = type(self).__mro__
+        def owner(name):
+            return next(i for i, c in enumerate(mro) if name in c.__dict__)
+        return owner('convert_column') <= owner('__set__')
 
 
 class MetaStruct(type):
@@ -90,14 +573,42 @@ class MetaStruct(type):
     declaration order. If the class has attribute _inherit_fields
     and it evaluates to true, also include fields of base classes.
     (Names of inherited fields must not collide with other inherited
-    fields or this class's fields.) Set class attribute _signature
-    to be an inspect.Signature object to facilitate instantiation.
+    fields or this class's fields.) Class attribute _signature is
+    an inspect.Signature object for the fields, made on first use.
+    
+    Also set class attributes _fieldnames (the tuple of field names),
+    _fieldindex (a dict from field name to position), _getters (a
+    tuple of an operator.attrgetter per field), and _values (a
+    function from an instance to the tuple of its field values).
+    
+    If the class has attribute _slots (possibly inherited) and it
+    evaluates to true, add a slot for each of this class's own fields
+    to __slots__, and have the fields store their values there.
+    
+    Set class attribute _validation to the effective validation mode,
+    which is the less strict of the class's _validate mode and the
+    process-wide mode (see set_validation()). Whenever it changes,
+    the class's fields are rebound and its constructor is replaced.
+    
+    If the class has attribute _atomic (possibly inherited) and it
+    evaluates to true, give each instance a reentrant lock in its
+    _lock attribute, held while assigning to fields and while reading
+    them through _values. The class must be mutable.
     
     Upon instantiation of a Struct subtype, set the instance's
     _initialized attribute to True after __init__() returns.
-    Preprocess its __new__/__init__() arguments as well.
+    Preprocess its __new__/__init__() arguments as well. This is done
+    by a constructor function generated for each class (see
+    make_constructor()), which is stored as class attribute
+    _construct. Likewise, _construct_replace holds the function used
+    by _replace() (see make_replacer()). These and __eq__() are only
+    generated when first used, so that defining a class is cheap.
     """
     
+    # All Struct classes, so they can be updated when the process-wide
+    # validation mode changes.
+    all_structs = WeakSet()
+    
     # Use OrderedDict to preserve Field declaration order.
     @classmethod
     def __prepare__(cls, name, bases, **kargs):
@@ -106,6 +617,7 @@ class MetaStruct(type):
     # Construct the _struct attribute on the new class.
     def __new__(mcls, clsname, bases, namespace, **kargs):
         fields = []
+        own_fields = []
         # If inheriting, gather fields from base classes.
         if namespace.get('_inherit_fields', False):
             for b in bases:
@@ -123,28 +635,704 @@ class MetaStruct(type):
                 f = f.copy()
                 f.name = fname
                 fields.append(f)
+                own_fields.append(f)
             namespace[fname] = f
         # Ensure no name collisions.
-        fnames = Counter(f.name for f in fields)
-        collided = [k for k in fnames if fnames[k] > 1]
-        if len(collided) > 0:
+        fnames = [f.name for f in fields]
+        for fname in fnames:
+            check_field_name(clsname, fname)
+        if len(set(fnames)) < len(fnames):
+            collided = [k for k in dict.fromkeys(fnames)
+                        if fnames.count(k) > 1]
             raise AttributeError(
                 'Struct {} has colliding field name(s): {}'.format(
                 clsname, ', '.join(collided)))
+        # Checked here since the signature is made lazily.
+        for f1, f2 in zip(fields, fields[1:]):
+            if f1.has_default and not f2.has_default:
+                raise ValueError('Struct {}: non-default field {!r} follows '
+                                 'default field'.format(clsname, f2.name))
+        
+        # Allocate slots for fields declared by this class. Inherited
+        # fields keep using the storage of the class that declared them.
+        if mcls.lookup_attr(namespace, bases, '_slots', False):
+            slots = list(namespace.get('__slots__', ()))
+            # Every Struct has the _initialized flag and a cache for
+            # its hash value (None until computed), which get slots in
+            # the first class that uses them.
+            if not any(hasattr(b, '_initialized') for b in bases):
+                slots += ['_initialized', '_hash']
+            slots += [mcls.slot_name(f.name) for f in own_fields]
+            namespace['__slots__'] = tuple(slots)
+        
+        # Interning keeps weak references to instances.
+        if mcls.lookup_attr(namespace, bases, '_intern', False):
+            if not mcls.lookup_attr(namespace, bases, '_immutable', True):
+                raise TypeError('Struct {} cannot be interned because it is '
+                                'mutable'.format(clsname))
+            custom = [f.name for f in fields
+                      if type(f).eq is not Field.eq or
+                         type(f).hash is not Field.hash]
+            if len(custom) > 0:
+                raise TypeError('Struct {} cannot be interned because '
+                                'field(s) {} customize eq() or '
+                                'hash()'.format(clsname, ', '.join(custom)))
+            if ('__slots__' in namespace and
+                not any(hasattr(b, '__weakref__') for b in bases)):
+                namespace['__slots__'] = (tuple(namespace['__slots__']) +
+                                          ('__weakref__',))
+        
+        # Atomic instances hold a lock.
+        if mcls.lookup_attr(namespace, bases, '_atomic', False):
+            if mcls.lookup_attr(namespace, bases, '_immutable', True):
+                raise TypeError('Struct {} cannot be atomic because it is '
+                                'immutable'.format(clsname))
+            if ('__slots__' in namespace and
+                not any(hasattr(b, '_lock') for b in bases)):
+                namespace['__slots__'] = (tuple(namespace['__slots__']) +
+                                          ('_lock',))
+            if '__setattr__' not in namespace:
+                namespace['__setattr__'] = atomic_setattr
         
         cls = super().__new__(mcls, clsname, bases, dict(namespace), **kargs)
         
+        for f in own_fields:
+            f.slot = cls.__dict__.get(mcls.slot_name(f.name), None)
         cls._struct = tuple(fields)
+        fnames = tuple(f.name for f in fields)
+        cls._fieldnames = fnames
+        cls._fieldindex = {name: i for i, name in enumerate(fnames)}
+        cls._getters = tuple(attrgetter(name) for name in fnames)
+        # Wrapped so that reading it from an instance doesn't make a
+        # bound method.
+        cls._values = staticmethod(tuple_getter(fnames) if not cls._atomic
+                                   else atomic_values(tuple_getter(fnames)))
         
-        params = []
-        for f in cls._struct:
-            default = f.default if f.has_default else Parameter.empty
-            params.append(Parameter(f.name, Parameter.POSITIONAL_OR_KEYWORD,
-                                    default=default))
-        cls._signature = Signature(params)
+        cls._intern_table = InternTable(cls) if cls._intern else None
+        
+        check_validation_mode(cls._validate)
+        # Constructors by name, for each validation mode and with or
+        # without instrumentation, made as needed.
+        cls._constructors = {}
+        cls.apply_validation()
+        mcls.all_structs.add(cls)
+        # Leave user-defined equality semantics alone, including
+        # ones inherited from a base class.
+        if mcls.is_default_method(cls, '__eq__'):
+            cls.__eq__ = lazy_eq(cls)
+        if recorder is not None:
+            recorder.attach(cls)
         
         return cls
     
+    @property
+    def _snapshot_type(cls):
+        """An immutable subclass of this class with the same fields,
+        whose instances Struct._snapshot() returns. It is made on
+        first use.
+        """
+        snapshot_type = cls.__dict__.get('_snapshot_cls')
+        if snapshot_type is None:
+            if cls._immutable:
+                return cls
+            namespace = {
+                '__module__': cls.__module__,
+                '__qualname__': cls.__qualname__ + '._snapshot_type',
+                '__doc__': 'Immutable snapshot of a {}.'.format(
+                           cls.__name__),
+                '_immutable': True,
+                '_atomic': False,
+                '_inherit_fields': True,
+            }
+            if cls._slots:
+                namespace['__slots__'] = ()
+            snapshot_type = type(cls)(cls.__name__, (cls,), namespace)
+            # Another thread may have made one in the meantime.
+            snapshot_type = cls.__dict__.get('_snapshot_cls', snapshot_type)
+            cls._snapshot_cls = snapshot_type
+        return snapshot_type
+    
+    @property
+    def _signature(cls):
+        """An inspect.Signature object for instantiating the class,
+        made on first use.
+        """
+        sig = cls.__dict__.get('_signature_obj')
+        if sig is None:
+            from inspect import Signature, Parameter
+            params = []
+            for f in cls._struct:
+                default = f.default if f.has_default else Parameter.empty
+                params.append(Parameter(f.name,
+                                        Parameter.POSITIONAL_OR_KEYWORD,
+                                        default=default))
+            sig = Signature(params)
+            cls._signature_obj = sig
+        return sig
+    
+    @staticmethod
+    def lookup_attr(namespace, bases, name, default):
+        """Return what attribute name will be on a class that is
+        being defined with the given namespace and bases, or default
+        if it is not defined.
+        """
+        if name in namespace:
+            return namespace[name]
+        for b in bases:
+            if hasattr(b, name):
+                return getattr(b, name)
+        return default
+    
+    @staticmethod
+    def slot_name(fname):
+        """Return the name of the slot that stores the value of field
+        fname, for Structs that use __slots__.
+        """
+        return '_slot_' + fname
+    
+    @staticmethod
+    def storage_expr(f, obj):
+        """Return a source code expression for the place where field f
+        stores its value on the object named obj. Generated code can
+        use this in place of going through the descriptor, if f does
+        not customize __get__() or __set__() (as appropriate).
+        """
+        if f.slot is not None:
+            return '{}.{}'.format(obj, f.slot.__name__)
+        else:
+            return '{}.__dict__[{!r}]'.format(obj, f.name)
+    
+    def is_default_method(cls, name):
+        """Return whether the method name is one that cls gets from
+        Struct or from code generated by MetaStruct, as opposed to
+        one that is user-defined on cls or a base class.
+        """
+        for c in cls.__mro__:
+            if name in c.__dict__:
+                if getattr(c.__dict__[name], '_generated', False):
+                    return True
+                # Struct's own methods count as defaults for its
+                # subclasses, but are never replaced on Struct itself.
+                return c is base_struct(cls) and c is not cls
+        return False
+    
+    def apply_validation(cls):
+        """Recompute the effective validation mode, and if it changed,
+        rebind this class's fields and install constructors for it.
+        """
+        rank = VALIDATION_MODES.index
+        mode = max(cls._validate, validation_mode, key=rank)
+        if cls.__dict__.get('_validation') == mode:
+            return
+        cls._validation = mode
+        for f in cls._struct:
+            # Inherited fields are bound by the class declaring them.
+            if cls.__dict__.get(f.name) is f:
+                f.bind(cls)
+        cls.install_constructors()
+    
+    def install_constructors(cls):
+        """Install the constructors for the class's validation mode,
+        instrumented if there is a recorder. Those that haven't been
+        made yet are replaced by placeholders that make them when
+        first called, so that classes which are never instantiated
+        (or only in some modes) don't pay for generating code.
+        """
+        made = cls._constructors.get((cls._validation, recorder is not None),
+                                     {})
+        for name, placeholder in LAZY_CONSTRUCTORS.items():
+            setattr(cls, name, made.get(name, placeholder))
+    
+    def build_constructor(cls, name):
+        """Make and install the constructor name (one of the keys of
+        LAZY_CONSTRUCTORS) for the class's current validation mode and
+        recorder, and return it.
+        """
+        made = cls._constructors.setdefault(
+            (cls._validation, recorder is not None), {})
+        if name not in made:
+            if name == '_construct_replace':
+                func = cls.make_replacer()
+            elif name.startswith('_construct_rows'):
+                func = cls.make_rows_constructor(
+                    check=(name == '_construct_rows'))
+            else:
+                func = cls.make_constructor(
+                    trusted=(name == '_construct_trusted'))
+            if recorder is not None and func is not None:
+                func = recorder.wrap_constructor(cls, name, func)
+            made.setdefault(name, func)
+        func = made[name]
+        setattr(cls, name, func)
+        return func
+    
+    def make_constructor(cls, trusted=False):
+        """Generate the function that MetaStruct.__call__() uses to
+        instantiate this class. It takes the class followed by the
+        field values, with the field defaults built in, so Python's
+        own argument passing replaces a Signature.bind() per call.
+        
+        For fields that don't customize __set__(), the value is
+        stored directly, since the instance can't be initialized
+        (and hence can't be immutable) yet.
+        
+        If the class (or a base class) overrides __new__(), that is
+        called with the field values as usual, and fields are
+        initialized there (normally by Struct.__new__()).
+        
+        If trusted is True, generate the variant used for bulk
+        construction instead. It takes the class, the row index (for
+        error messages), and then all field values positionally.
+        Values of fields that implement Field.convert_column() are
+        assumed to have been converted by it already, and are stored
+        directly.
+        """
+        # Local names are prefixed with underscores so they can't
+        # collide with field names.
+        base = base_struct(cls)
+        validate = cls._validation != 'off'
+        namespace = {
+            # Whatever Struct.__new__() would delegate to.
+            '__base_new': super(base, cls).__new__,
+            '__construct_error': construct_error,
+        }
+        params = ['__cls', '__row'] if trusted else ['__cls']
+        for f in cls._struct:
+            if f.has_default and not trusted:
+                dname = '__default_' + f.name
+                namespace[dname] = f.default
+                params.append('{}={}'.format(f.name, dname))
+            else:
+                params.append(f.name)
+        
+        body = cls.instance_lines(namespace, validate, trusted,
+                                  '__row' if trusted else None)
+        body += cls.finish_lines(namespace)
+        
+        name = '_construct_trusted' if trusted else '_construct'
+        return make_function('__construct', params, body, namespace,
+                             qualname=cls.__qualname__ + '.' + name,
+                             owner=cls)
+    
+    def make_rows_constructor(cls, check=True):
+        """Generate the function that _from_rows() uses for rows that
+        aren't NumPy arrays. It takes the class, an iterable of rows,
+        and the index of the first row (for error messages), and
+        returns a list of instances. The loop over the rows is part of
+        the generated code, so each row is unpacked straight into the
+        field values, and is checked by the same setters as the usual
+        constructor uses. Rows of the wrong length go through
+        pad_row(). If check is False, values are normalized but not
+        checked.
+        """
+        validate = cls._validation != 'off' and check
+        namespace = {
+            '__base_new': super(base_struct(cls), cls).__new__,
+            '__construct_error': construct_error,
+            '__pad_row': pad_row,
+            '__enumerate': enumerate,
+        }
+        values = '[{}]'.format(', '.join(f.name for f in cls._struct))
+        body = ['__result = []',
+                '__append = __result.append',
+                'for __row, __values in __enumerate(__rows, __offset):',
+                '    try:',
+                '        {} = __values'.format(values),
+                '    except ValueError:',
+                '        {} = __pad_row(__cls, __row, __values)'.format(
+                    values)]
+        inst = cls.instance_lines(namespace, validate, False, '__row')
+        inst += cls.finish_lines(namespace, '__append({})')
+        body += ['    ' + line for line in inst]
+        body.append('return __result')
+        
+        name = '_construct_rows' if check else '_construct_rows_unchecked'
+        return make_function('__construct_rows',
+                             ['__cls', '__rows', '__offset'], body,
+                             namespace, qualname=cls.__qualname__ + '.' + name,
+                             owner=cls)
+    
+    def instance_lines(cls, namespace, validate, trusted, row):
+        """Return the lines of a generated constructor that create an
+        instance __inst from the field values in locals named after
+        the fields, as described for make_constructor(). row is the
+        name of the local holding the row index for error messages, or
+        None for the usual constructor, which alone is instrumented per
+        field. Add any names needed to namespace.
+        """
+        base = base_struct(cls)
+        args = ', '.join(f.name for f in cls._struct)
+        body = []
+        if cls.__new__ is base.__new__:
+            body += ['__inst = __base_new(__cls)']
+            body += cls.init_lines(namespace)
+            body += ['__fname = None',
+                     'try:']
+            for i, f in enumerate(cls._struct):
+                body.append('    __fname = {!r}'.format(f.name))
+                init_setter = f.get_init_setter(validate)
+                if (recorder is not None and row is None and
+                    type(f).__set__ is not Field.__set__):
+                    init_setter = recorder.wrap_setter(
+                        cls, f, init_setter or f.__set__)
+                if (type(f).__set__ is Field.__set__ or
+                    (trusted and f.converts_columns())):
+                    body.append('    {} = {}'.format(
+                                cls.storage_expr(f, '__inst'), f.name))
+                elif init_setter is not None:
+                    namespace['__set{}'.format(i)] = init_setter
+                    body.append('    __set{}(__inst, {})'.format(i, f.name))
+                else:
+                    body.append('    __inst.{0} = {0}'.format(f.name))
+            body += ['    pass',
+                     'except TypeError as __exc:',
+                     '    raise __construct_error(__cls, __fname, __exc{}) '
+                         'from __exc'.format('' if row is None
+                                             else ', ' + row)]
+            if cls.__init__ is not object.__init__:
+                body.append('__inst.__init__({})'.format(args))
+        else:
+            namespace['__isinstance'] = isinstance
+            body += ['__inst = __cls.__new__(__cls, {})'.format(args),
+                     'if __isinstance(__inst, __cls):',
+                     '    __inst.__init__({})'.format(args)]
+        return body
+    
+    def init_lines(cls, namespace):
+        """Return the lines that start a generated function creating
+        an instance __inst, after it is allocated, by initializing
+        the attributes every instance has. Add any names needed to
+        namespace.
+        """
+        lines = ['__inst._initialized = False',
+                 '__inst._hash = None']
+        if cls._atomic:
+            namespace['__RLock'] = RLock
+            lines.append('__inst._lock = __RLock()')
+        return lines
+    
+    def finish_lines(cls, namespace, result='return {}'):
+        """Return the lines that end a generated function creating
+        an instance __inst, by marking it initialized and returning
+        it. If the class is interned, the canonical instance is
+        returned instead. Add any names needed to namespace. result
+        is the format of the line that returns the instance, for code
+        that does something else with it.
+        """
+        lines = ['__inst._initialized = True']
+        if cls._intern_table is None:
+            return lines + [result.format('__inst')]
+        namespace['__canonical'] = cls._intern_table.canonical
+        values = [cls.storage_expr(f, '__inst')
+                  if type(f).__get__ is Field.__get__
+                  else '__inst.' + f.name
+                  for f in cls._struct]
+        key = '({},)'.format(', '.join(values)) if values else '()'
+        return lines + [result.format(
+                        '__canonical(__inst, {})'.format(key))]
+    
+    def make_restorer(cls):
+        """Generate the function that trusted unpickling uses, taking
+        the class followed by all field values positionally. The
+        values are stored as they are, without validation, and the
+        instance's _restored() method is called in place of __init__()
+        if the class defines it. Otherwise __init__() is called as
+        usual.
+        
+        If the class (or a base class) overrides __new__(), construct
+        the instance as usual instead.
+        """
+        base = base_struct(cls)
+        if cls.__new__ is not base.__new__:
+            return lambda cls, *values: cls(*values)
+        namespace = {'__base_new': super(base, cls).__new__}
+        params = ['__cls'] + [f.name for f in cls._struct]
+        body = ['__inst = __base_new(__cls)']
+        body += cls.init_lines(namespace)
+        for f in cls._struct:
+            stored = (type(f).__get__ is Field.__get__ and
+                      (type(f).__set__ is Field.__set__ or
+                       f.get_init_setter(False) is not None))
+            if stored:
+                body.append('{} = {}'.format(cls.storage_expr(f, '__inst'),
+                                             f.name))
+            else:
+                body.append('__inst.{0} = {0}'.format(f.name))
+        if getattr(cls, '_restored', None) is not None:
+            body.append('__inst._restored()')
+        elif cls.__init__ is not object.__init__:
+            body.append('__inst.__init__({})'.format(
+                        ', '.join(f.name for f in cls._struct)))
+        body += cls.finish_lines(namespace)
+        return make_function('__restore', params, body, namespace,
+                             qualname=cls.__qualname__ + '._construct_restore',
+                             owner=cls)
+    
+    def make_replacer(cls):
+        """Generate the function that Struct._replace() uses, taking
+        an instance and a dict of changed field values. Unchanged
+        values are copied from the instance's storage as they are,
+        since they were already checked and normalized. Only the
+        changed values go through their fields' setters. A
+        user-defined __init__() is then called with all the values.
+        
+        Return None if the class (or a base class) overrides __new__(),
+        in which case _replace() constructs the copy as usual.
+        """
+        base = base_struct(cls)
+        if cls.__new__ is not base.__new__:
+            return None
+        validate = cls._validation != 'off'
+        namespace = {
+            '__base_new': super(base, cls).__new__,
+            '__construct_error': construct_error,
+            '__unknown_field': unknown_field,
+        }
+        # Functions taking the new instance and a value, for setting
+        # each field during initialization.
+        setters = {}
+        body = ['__inst = __base_new(__cls)']
+        body += cls.init_lines(namespace)
+        for i, f in enumerate(cls._struct):
+            init_setter = f.get_init_setter(validate)
+            stored = (type(f).__get__ is Field.__get__ and
+                      (type(f).__set__ is Field.__set__ or
+                       init_setter is not None))
+            if stored:
+                body.append('{} = {}'.format(cls.storage_expr(f, '__inst'),
+                                             cls.storage_expr(f, 'self')))
+            else:
+                body.append('__inst.{0} = self.{0}'.format(f.name))
+            if init_setter is not None:
+                setters[f.name] = init_setter
+            elif type(f).__set__ is Field.__set__ and f.slot is not None:
+                setters[f.name] = f.slot.__set__
+            else:
+                setters[f.name] = f.__set__
+            if recorder is not None and type(f).__set__ is not Field.__set__:
+                setters[f.name] = recorder.wrap_setter(cls, f,
+                                                       setters[f.name])
+        namespace['__setters'] = setters
+        body += ['for __fname, __value in __kargs.items():',
+                 '    try:',
+                 '        __setter = __setters[__fname]',
+                 '    except KeyError:',
+                 '        raise __unknown_field(__fname) from None',
+                 '    try:',
+                 '        __setter(__inst, __value)',
+                 '    except TypeError as __exc:',
+                 '        raise __construct_error(__cls, __fname, __exc) '
+                     'from __exc']
+        if cls.__init__ is not object.__init__:
+            body.append('__inst.__init__({})'.format(', '.join(
+                        '__inst.' + f.name for f in cls._struct)))
+        body += cls.finish_lines(namespace)
+        namespace['__cls'] = cls
+        return make_function('__replace', ['self', '__kargs'], body,
+                             namespace,
+                             qualname=cls.__qualname__ + '._construct_replace',
+                             owner=cls)
+    
+    def construct_rows(cls, rows, validate=True, offset=0):
+        """Implementation of Struct._from_rows(). offset is added to
+        row indices in error messages, for rows that are part of a
+        larger input.
+        
+        NumPy arrays are converted a column at a time, so that their
+        dtypes can stand in for checking each value. Other rows are
+        constructed by _construct_rows, which is faster than
+        transposing them into columns and back.
+        """
+        if hasattr(rows, 'dtype'):
+            columns, nrows = cls.row_columns(rows, offset)
+            return cls.construct_columns(columns, nrows, validate, offset)
+        construct = (cls._construct_rows if validate
+                     else cls._construct_rows_unchecked)
+        return construct(cls, rows, offset)
+    
+    def row_columns(cls, rows, offset=0):
+        """Return the columns of rows, as for _from_rows(), along with
+        the number of rows.
+        """
+        fields = cls._struct
+        n = len(fields)
+        
+        if hasattr(rows, 'dtype') and rows.dtype.names is not None:
+            # NumPy structured array; take its columns in order.
+            columns = [rows[name] for name in rows.dtype.names]
+            nrows = len(rows)
+        elif hasattr(rows, 'dtype') and rows.ndim == 2:
+            columns = list(rows.T)
+            nrows = len(rows)
+        else:
+            rows = [tuple(row) for row in rows]
+            nrows = len(rows)
+            # Fill in defaults for short rows. The defaults can only
+            # be omitted for a suffix of the fields.
+            defaults = tuple(f.default for f in fields)
+            min_len = n
+            while min_len > 0 and fields[min_len - 1].has_default:
+                min_len -= 1
+            for i, row in enumerate(rows):
+                k = len(row)
+                if k == n:
+                    continue
+                elif min_len <= k < n:
+                    rows[i] = row + defaults[k:]
+                else:
+                    try:
+                        cls._signature.bind(*row)
+                    except TypeError as exc:
+                        raise construct_error(cls, None, exc,
+                                              offset + i) from exc
+            columns = list(zip(*rows)) if nrows > 0 else [()] * n
+        
+        if len(columns) != n:
+            raise TypeError('Error constructing {}: expected {} columns, '
+                            'got {}'.format(cls.__name__, n, len(columns)))
+        return columns, nrows
+    
+    def named_columns(cls, columns):
+        """Return the columns for _from_columns(), given as a dict
+        from field names to columns, as a list in field order, along
+        with the number of rows.
+        """
+        for name in columns:
+            if name not in cls._fieldindex:
+                raise unknown_field(name)
+        lengths = {len(col) for col in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError('Error constructing {}: columns have '
+                             'different lengths'.format(cls.__name__))
+        nrows = lengths.pop() if len(lengths) > 0 else 0
+        result = []
+        for f in cls._struct:
+            if f.name not in columns:
+                if not f.has_default:
+                    raise TypeError('missing a required argument: '
+                                    '{!r}'.format(f.name))
+                col = [f.default] * nrows
+            else:
+                col = columns[f.name]
+                # Unbox NumPy and array.array columns for fields that
+                # don't convert them. Masked arrays are always unboxed,
+                # so that their masked entries become None (and are
+                # checked as such).
+                if (hasattr(col, 'tolist') and
+                    (not f.converts_columns() or hasattr(col, 'mask'))):
+                    col = col.tolist()
+            result.append(col)
+        return result, nrows
+    
+    def construct_columns(cls, columns, nrows, validate=True, offset=0):
+        """Return a list of nrows instances, given a column of values
+        for each field.
+        """
+        fields = cls._struct
+        validate = validate and cls._validation != 'off'
+        converted = []
+        for f, col in zip(fields, columns):
+            if f.converts_columns():
+                try:
+                    col = f.convert_column(col, validate)
+                except TypeError as exc:
+                    index = getattr(exc, 'index', None)
+                    if index is not None:
+                        index += offset
+                    raise construct_error(cls, f.name, exc, index) from exc
+            converted.append(col)
+        
+        construct = cls._construct_trusted
+        if len(fields) == 0:
+            return [construct(cls, offset + i) for i in range(nrows)]
+        return [construct(cls, i, *vals)
+                for i, vals in enumerate(zip(*converted), offset)]
+    
+    def make_eq(cls):
+        """Generate an __eq__() method specialized to this class's
+        fields. It reads field values directly from their storage,
+        and only calls Field.eq() for fields that override it.
+        
+        If both instances already have cached hash values and they
+        differ, the instances are known to be unequal without looking
+        at the fields. This relies on the hash/equality contract, so
+        it is only done when no field overrides eq() or hash().
+        
+        For mutable Structs, which may be cyclic, a comparison that
+        recursively reaches itself returns False (see eq_in_progress).
+        """
+        namespace = {
+            '__cls': cls,
+            '__struct_eq': base_struct(cls).__eq__,
+            '__in_progress': eq_in_progress,
+            '__get_ident': get_ident,
+        }
+        body = ['if self is other:',
+                '    return True',
+                '__type = type(self)',
+                'if __type is not type(other):',
+                '    return NotImplemented',
+                # Handle subclasses that call this method via super().
+                'if __type is not __cls:',
+                '    return __struct_eq(self, other)']
+        
+        if cls._intern_table is not None:
+            # Equal instances are the same canonical instance.
+            body.append('return False')
+            func = make_function('__eq__', ['self', 'other'], body,
+                                 namespace,
+                                 qualname=cls.__qualname__ + '.__eq__',
+                                 owner=cls)
+            func._generated = True
+            return func
+        
+        if (cls._immutable and
+            all(type(f).eq is Field.eq and type(f).hash is Field.hash
+                for f in cls._struct)):
+            body += ['__h = self._hash',
+                     'if __h is not None:',
+                     '    __h2 = other._hash',
+                     '    if __h2 is not None and __h != __h2:',
+                     '        return False']
+        
+        compare = []
+        for i, f in enumerate(cls._struct):
+            if type(f).__get__ is Field.__get__:
+                v1 = cls.storage_expr(f, 'self')
+                v2 = cls.storage_expr(f, 'other')
+            else:
+                v1 = 'self.' + f.name
+                v2 = 'other.' + f.name
+            if type(f).eq is Field.eq:
+                # Like tuple comparison, skip == for identical values.
+                compare += ['__v1 = ' + v1,
+                            '__v2 = ' + v2,
+                            'if __v1 is not __v2 and not __v1 == __v2:',
+                            '    return False']
+            else:
+                namespace['__f{}'.format(i)] = f
+                compare += ['if not __f{}.eq({}, {}):'.format(i, v1, v2),
+                            '    return False']
+        compare.append('return True')
+        
+        if cls._immutable:
+            body += compare
+        else:
+            body += ['__key = (id(self), id(other), __get_ident())',
+                     'if __key in __in_progress:',
+                     '    return False',
+                     '__in_progress.add(__key)',
+                     'try:']
+            body += ['    ' + line for line in compare]
+            body += ['finally:',
+                     '    __in_progress.discard(__key)']
+        
+        func = make_function('__eq__', ['self', 'other'], body, namespace,
+                             qualname=cls.__qualname__ + '.__eq__',
+                             owner=cls)
+        func._generated = True
+        return func
+    
     def get_boundargs(cls, *args, **kargs):
         """Return an inspect.BoundArguments object for the application
         of this Struct's signature to its arguments. Add missing values
@@ -158,12 +1346,20 @@ class MetaStruct(type):
                 boundargs.arguments[param.name] = param.default
         return boundargs
     
-    # Mark the class as _initialized after construction.
+    # Construct via the generated constructor, which marks the
+    # instance as _initialized after construction.
     def __call__(cls, *args, **kargs):
-        boundargs = cls.get_boundargs(*args, **kargs)
-        inst = super().__call__(*boundargs.args, **boundargs.kwargs)
-        inst._initialized = True
-        return inst
+        try:
+            return cls._construct(cls, *args, **kargs)
+        except TypeError:
+            # If the arguments don't fit the signature, report it
+            # the same way Signature.bind() would. Otherwise the
+            # error came from inside construction; let it through.
+            try:
+                cls._signature.bind(*args, **kargs)
+            except TypeError as exc:
+                raise exc from None
+            raise
 
 
 class Struct(metaclass=MetaStruct):
@@ -181,30 +1377,93 @@ class Struct(metaclass=MetaStruct):
     true, the fields of each base class are prepended to this class's
     list of fields in left-to-right order.
     
+    If class attribute _slots is defined and evaluates to true, field
+    values are stored in __slots__ instead of an instance __dict__.
+    
+    Class attribute _validate controls whether fields such as
+    TypedField check their values always ('full'), only during
+    construction ('construct_only'), or never ('off'). The process-
+    wide mode, set with set_validation() or the validation() context
+    manager, can lower this for all classes.
+    
     A subclass may define __init__() to customize how fields are
     initialized, or to set other non-field attributes. If the class
     attribute _immutable evaluates to true, assigning to fields is
     disallowed once the last subclass's __init__() finishes.
     
+    Mutable Structs may be shared between threads by setting class
+    attribute _atomic. Each instance then has a lock that is held
+    while a field is assigned, while _update() assigns several, and
+    while the fields are read together, as by _snapshot(), iteration,
+    _asdict(), or pickling. Reading a single field doesn't lock.
+    
     Structs may be pickled. Upon unpickling, __init__() will be
-    called.
+    called. If class attribute _fast_pickle evaluates to true, or
+    within a fast_pickle() block, unpickling is trusted instead:
+    field values are restored without validation, and if the class
+    defines a _restored() method, it is called in place of __init__()
+    (for instance, to recompute non-field attributes).
     
     Structs support structural equality. Hashing is allowed only
-    for immutable Structs and after they are initialized.
+    for immutable Structs and after they are initialized. The hash
+    value is computed once and cached on the instance.
     
     The methods _asdict() and _replace() behave as they do for
     collections.namedtuple.
     """
     
+    # No instance layout of its own, so that Structs can be combined
+    # with other bases (such as Exception). Subclasses get a __dict__
+    # as usual unless they set _slots.
+    __slots__ = ()
+    
     _immutable = True
     """Flag for whether to allow reassignment to fields after
     construction. Override with False in subclass to allow.
     """
     
+    _validate = 'full'
+    """How strictly fields check their values, as one of the strings
+    'full', 'construct_only', or 'off' (see VALIDATION_MODES).
+    The process-wide mode (see set_validation()) may lower this.
+    """
+    
+    _slots = False
+    """Flag for whether to store field values in __slots__ rather
+    than in the instance __dict__. Override with True in subclass
+    to save memory. Subclasses of a Struct with _slots also use
+    slots. Non-field attributes can only be assigned if listed in
+    __slots__ as well, as usual.
+    """
+    
+    _fast_pickle = False
+    """Flag for whether to restore unpickled instances without
+    validation. See above.
+    """
+    
+    _intern = False
+    """Flag for whether to hash-cons instances. Override with True in
+    an immutable subclass to have construction return the existing
+    instance equal to the new one, if there is one, so that equal
+    instances share memory and compare by identity. Field values
+    must be hashable, and are compared with == (so for instance, a
+    field value of 1.0 may be replaced by an existing 1). Instances
+    are held weakly. See _intern_stats().
+    """
+    
+    _atomic = False
+    """Flag for whether instances have a lock making multi-field
+    updates and reads atomic. Override with True in a mutable subclass
+    that is shared between threads. See _update() and _snapshot().
+    """
+    
     def __new__(cls, *args, **kargs):
         inst = super().__new__(cls)
         # _initialized is read during field initialization.
         inst._initialized = False
+        inst._hash = None
+        if cls._atomic:
+            inst._lock = RLock()
         
         f = None
         try:
@@ -213,12 +1472,8 @@ class Struct(metaclass=MetaStruct):
                 setattr(inst, f.name, boundargs.arguments[f.name])
             f = None
         except TypeError as exc:
-            if f is not None:
-                where = "{} (field '{}')".format(cls.__name__, f.name)
-            else:
-                where = cls.__name__
-            raise TypeError('Error constructing {}: {}'.format(
-                            where, exc)) from exc
+            raise construct_error(cls, f.name if f is not None else None,
+                                  exc) from exc
         
         return inst
     
@@ -229,8 +1484,9 @@ class Struct(metaclass=MetaStruct):
     def _fmt_helper(self, fmt):
         return '{}({})'.format(
             self.__class__.__name__,
-            ', '.join('{}={}'.format(f.name, fmt(getattr(self, f.name)))
-                      for f in self._struct))
+            ', '.join('{}={}'.format(name, fmt(value))
+                      for name, value in zip(self._fieldnames,
+                                             self._values(self))))
     
     @recursive_repr()
     def __str__(self):
@@ -240,6 +1496,10 @@ class Struct(metaclass=MetaStruct):
     def __repr__(self):
         return self._fmt_helper(repr)
     
+    # MetaStruct replaces this generic version with a specialized one
+    # on each subclass (see MetaStruct.make_eq()). It is still used
+    # for subclasses that reach it through super().
+    
     def __eq__(self, other):
         # Succeed immediately if we're being tested against ourselves
         # (identical object in memory). This avoids an unnecessary
@@ -255,32 +1515,54 @@ class Struct(metaclass=MetaStruct):
             # alternative equality semantics.
             return NotImplemented
         
-        return all(f.eq(getattr(self, f.name), getattr(other, f.name))
-                   for f in self._struct)
+        # Mutable Structs may be cyclic; see eq_in_progress.
+        if self._immutable:
+            return all(f.eq(v1, v2) for f, v1, v2 in
+                       zip(self._struct, self._values(self),
+                           self._values(other)))
+        key = (id(self), id(other), get_ident())
+        if key in eq_in_progress:
+            return False
+        eq_in_progress.add(key)
+        try:
+            return all(f.eq(v1, v2) for f, v1, v2 in
+                       zip(self._struct, self._values(self),
+                           self._values(other)))
+        finally:
+            eq_in_progress.discard(key)
     
     def __hash__(self):
+        # The cache is only ever filled in for immutable, initialized
+        # Structs, so there's no need to check those conditions again.
+        h = self._hash
+        if h is not None:
+            return h
+        
         if not self._immutable:
             raise TypeError('Cannot hash mutable Struct {}'.format(
                             self.__class__.__name__))
         if not self._initialized:
             raise TypeError('Cannot hash uninitialized Struct {}'.format(
                             self.__class__.__name__))
-        return hash_seq(f.hash(getattr(self, f.name))
-                        for f in self._struct)
+        h = hash_seq(f.hash(v) for f, v in
+                     zip(self._struct, self._values(self)))
+        self._hash = h
+        return h
     
     def __len__(self):
         return len(self._struct)
     
     def __iter__(self):
-        return (getattr(self, f.name) for f in self._struct)
+        return iter(self._values(self))
     
     def __getitem__(self, index):
-        # Index may also be a slice.
-        return tuple(getattr(self, f.name) for f in self._struct)[index]
+        if isinstance(index, slice):
+            return self._values(self)[index]
+        return self._getters[index](self)
     
     def __setitem__(self, index, value):
         if isinstance(index, slice):
-            fnames = [f.name for f in self._struct][index]
+            fnames = self._fieldnames[index]
             values = list(value)
             if len(values) < len(fnames):
                 word = 'value' if len(values) == 1 else 'values'
@@ -289,32 +1571,168 @@ class Struct(metaclass=MetaStruct):
             elif len(values) > len(fnames):
                 raise ValueError('too many values to unpack (expected '
                                  '{})'.format(len(fnames)))
-            for fname, v in zip(fnames, values):
-                setattr(self, fname, v)
+            changes = dict(zip(fnames, values))
+            if self._atomic:
+                with self._lock:
+                    update_fields(self, changes)
+            else:
+                update_fields(self, changes)
         else:
-            setattr(self, self._struct[index].name, value)
+            setattr(self, self._fieldnames[index], value)
     
     def __reduce_ex__(self, protocol):
         # We use __reduce_ex__() rather than __getnewargs__() so that
-        # the metaclass's __call__() will still run. This is needed to
-        # trigger the user-defined __init__() and to set _immutable to
-        # False.
-        return (self.__class__, tuple(getattr(self, f.name)
-                                      for f in self._struct))
+        # the instance is constructed as usual, running the user-defined
+        # __init__() and marking it _initialized. unpickle_struct()
+        # does that by calling the class, unless trusted unpickling
+        # applies.
+        return (unpickle_struct, (self.__class__,) + self._values(self))
+    
+    @classmethod
+    def _from_rows(cls, rows, validate=True):
+        """Return a list of new instances, one for each row of field
+        values. Rows may omit trailing fields that have defaults.
+        rows may also be a 2-dimensional or structured NumPy array.
+        
+        This is equivalent to constructing each instance separately,
+        but faster: the loop over the rows is generated for the class,
+        and arguments are not bound for each row. NumPy arrays are
+        converted and validated a column at a time instead (see
+        Field.convert_column()). If validate is false, type checks are
+        skipped, but values
+        are still normalized; this is for data known to be valid.
+        Checks are also skipped if the class's validation mode is
+        'off'. A user-defined __init__() still runs for each instance.
+        """
+        return cls.construct_rows(rows, validate)
+    
+    @classmethod
+    def _from_columns(cls, columns, *, validate=True):
+        """Return a list of new instances from a column of values per
+        field, given as a mapping from field names to columns, such as
+        the dict that simplestruct.columns() returns. Columns may be sequences,
+        array.array objects, or NumPy arrays, and must have the same
+        length. Masked entries of NumPy masked arrays become None.
+        Columns of fields with defaults may be omitted.
+        
+        As with _from_rows(), values are converted and validated a
+        column at a time, and arguments are not bound for each
+        instance. validate is as for _from_rows().
+        """
+        columns, nrows = cls.named_columns(columns)
+        return cls.construct_columns(columns, nrows, validate)
+    
+    @classmethod
+    def _stream(cls, rows, *, coerce=True, validate=True, chunk_size=1000,
+                workers=None):
+        """Generate new instances from an iterable of rows, as for
+        _from_rows(). Rows are consumed chunk_size at a time, so memory
+        use doesn't depend on how many there are.
+        
+        If coerce is true, str values are parsed for fields that have
+        a parser (see Field.parser()); for instance, '5' becomes 5 for
+        a TypedField of kind int. Unparseable values raise ValueError.
+        If workers is given, parsing is done in a pool of that many
+        processes, with a bounded number of chunks in flight. This
+        only pays off when parsing dominates, since rows are sent to
+        the workers and back.
+        """
+        parsers = [f.parser() if coerce else None for f in cls._struct]
+        if all(p is None for p in parsers):
+            parsers = None
+        it = iter(rows)
+        chunks = iter(lambda: list(islice(it, chunk_size)), [])
+        
+        def build(parsed, nrows, offset):
+            columns, error = parsed
+            if error is not None:
+                i, j, msg = error
+                raise construct_error(cls, cls._struct[j].name, msg,
+                                      offset + i, ValueError)
+            return cls.construct_columns(columns, nrows, validate, offset)
+        
+        offset = 0
+        if parsers is None:
+            for chunk in chunks:
+                yield from cls.construct_rows(chunk, validate, offset)
+                offset += len(chunk)
+        elif workers is None:
+            for chunk in chunks:
+                columns, nrows = cls.row_columns(chunk, offset)
+                yield from build(parse_columns(parsers, columns), nrows,
+                                 offset)
+                offset += nrows
+        else:
+            # Parse in other processes, and construct here in order.
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(workers) as executor:
+                pending = deque()
+                for chunk in chunks:
+                    columns, nrows = cls.row_columns(chunk, offset)
+                    future = executor.submit(parse_columns, parsers, columns)
+                    pending.append((future, nrows, offset))
+                    offset += nrows
+                    if len(pending) > 2 * workers:
+                        future, nrows, start = pending.popleft()
+                        yield from build(future.result(), nrows, start)
+                while len(pending) > 0:
+                    future, nrows, start = pending.popleft()
+                    yield from build(future.result(), nrows, start)
+    
+    @classmethod
+    def _intern_stats(cls):
+        """For a class with _intern, return a dict with the number of
+        canonical instances alive ('size'), and the number of times
+        construction found an existing instance ('hits') or not
+        ('misses'), along with the resulting 'hit_rate'.
+        """
+        if cls._intern_table is None:
+            raise TypeError('Struct {} is not interned'.format(cls.__name__))
+        return cls._intern_table.stats()
     
     def _asdict(self):
         """Return an OrderedDict of the fields."""
-        return OrderedDict((f.name, getattr(self, f.name))
-                           for f in self._struct)
+        return OrderedDict(zip(self._fieldnames, self._values(self)))
     
     def _replace(self, **kargs):
         """Return a copy of this Struct with the same fields except
-        with the changes specified by kargs.
+        with the changes specified by kargs. Only the changed values
+        are validated.
+        """
+        replace = type(self)._construct_replace
+        if replace is not None:
+            if self._atomic:
+                with self._lock:
+                    return replace(self, kargs)
+            return replace(self, kargs)
+        return generic_replace(self, kargs)
+    
+    def _update(self, /, **kargs):
+        """Assign to several fields of a mutable Struct at once. If an
+        assignment fails, the fields assigned before it are restored,
+        and the exception propagates. For a class with _atomic, no
+        other thread sees the fields partly updated.
         """
-        fields = {f.name: getattr(self, f.name)
-                  for f in self._struct}
-        fields.update(kargs)
-        return type(self)(**fields)
+        for name in kargs:
+            if name not in self._fieldindex:
+                raise unknown_field(name)
+        if self._atomic:
+            with self._lock:
+                update_fields(self, kargs)
+        else:
+            update_fields(self, kargs)
+    
+    def _snapshot(self):
+        """Return an immutable copy of this Struct, an instance of the
+        subclass _snapshot_type with the same fields. For a class with
+        _atomic, the field values are read consistently. Immutable
+        Structs are returned as they are.
+        """
+        cls = type(self)
+        if cls._immutable:
+            return self
+        snapshot_type = cls._snapshot_type
+        return restore_struct(snapshot_type, self._values(self))
     
     # XXX: We could provide a copy() method as well, analogous to
     # list, dict, and other collections. Unlike the above methods,
@@ -322,3 +1740,53 @@ class Struct(metaclass=MetaStruct):
     # with a user-defined field named "copy". But in this case,
     # the user field should simply take precedence and shadow
     # this feature.
+
+
+def make_struct(name, fields, *, bases=(Struct,), module=None, **attrs):
+    """Return a new Struct class with the given name and fields. This
+    is the same as defining the class with a class statement, but
+    cheaper, for programs that generate many classes (for instance,
+    from database schemas).
+    
+    fields is a mapping or an iterable of (name, field) pairs, where
+    each field is a Field instance or a Field subclass, in declaration
+    order. An item of the iterable may also be just a name, for a
+    plain Field. Other class attributes, such as _immutable or
+    methods, may be given as keyword arguments. The class's __module__
+    is module, or by default the caller's module.
+    """
+    namespace = dict(attrs)
+    if hasattr(fields, 'items'):
+        fields = fields.items()
+    collided = []
+    for item in fields:
+        if isinstance(item, str):
+            fname, f = item, Field()
+        else:
+            fname, f = item
+        check_field_name(name, fname)
+        if not (isinstance(f, Field) or
+                (isinstance(f, type) and issubclass(f, Field))):
+            raise TypeError('Expected Field for {!r}; got {!r}'.format(
+                            fname, f))
+        if fname in namespace:
+            collided.append(fname)
+        namespace[fname] = f
+    if len(collided) > 0:
+        raise AttributeError(
+            'Struct {} has colliding field name(s): {}'.format(
+            name, ', '.join(collided)))
+    
+    if module is None:
+        try:
+            module = sys._getframe(1).f_globals.get('__name__', '__main__')
+        except (AttributeError, ValueError):
+            module = __name__
+    namespace['__module__'] = module
+    namespace['__qualname__'] = name
+    # Use the most derived metaclass of the bases.
+    meta = MetaStruct
+    for b in bases:
+        if issubclass(type(b), meta):
+            meta = type(b)
+    return meta(name, tuple(bases), namespace)
@@ -13,6 +13,17 @@ __all__ = [
 ]
 
 
+# Maps NumPy dtype kind codes to the Python types that the elements
+# of arrays of those dtypes become when converted with tolist().
+DTYPE_KINDS = {
+    'b': bool,
+    'i': int,
+    'u': int,
+    'f': float,
+    'c': complex,
+}
+
+
 class TypeChecker:
     
     """A simple type checker supporting sequences and unions.
@@ -58,6 +69,41 @@ class TypeChecker:
             raise TypeError('Expected {}; got {}'.format(
                             self.str_kind(kind), self.str_valtype(val)))
     
+    def checktype_column(self, vals, kind, **kargs):
+        """Raise TypeError if any element of vals does not satisfy
+        kind, with the element's position as the exception's index
+        attribute. This is faster than calling checktype() for each
+        element when there are many elements of the same few types.
+        
+        vals may also be a NumPy array. If its dtype's elements are
+        known to satisfy kind, the check is done in constant time.
+        
+        If a subclass overrides checktype(), it is called for every
+        element, since it may look at more than the element's type.
+        """
+        by_type = type(self).checktype is TypeChecker.checktype
+        dtype = getattr(vals, 'dtype', None)
+        if dtype is not None:
+            pytype = DTYPE_KINDS.get(dtype.kind)
+            if by_type and pytype is not None and issubclass(pytype, kind):
+                return
+            vals = vals.tolist()
+        
+        # Whether an element satisfies kind depends only on its type,
+        # so remember the types that do.
+        ok = set()
+        for i, val in enumerate(vals):
+            t = type(val)
+            if t in ok:
+                continue
+            try:
+                self.checktype(val, kind, **kargs)
+            except TypeError as exc:
+                exc.index = i
+                raise
+            if by_type:
+                ok.add(t)
+    
     def checktype_seq(self, seq, kind, *, unique=False, **kargs):
         """Raise TypeError if seq is not a sequence of elements satisfying
         kind. Optionally require elements to be unique.
@@ -85,25 +131,46 @@ class TypeChecker:
                             '(strings do not count as character '
                             'sequences)'.format(exp))
         
+        # Check types and uniqueness in a single pass. As in
+        # checktype_column(), types already known to satisfy kind
+        # are not checked again, unless checktype() is overridden.
+        # Elements seen so far are kept in a set, unless an unhashable
+        # element turns up, in which case we fall back on a list.
+        by_type = type(self).checktype is TypeChecker.checktype
+        ok = set()
+        seen = set()
+        seen_list = None
         for i, item in enumerate(iterator):
             # Depend on checktype() to check individual elements,
             # but generate an error message that includes the position
             # of the failure.
-            try:
-                self.checktype(item, kind, **kargs)
-            except TypeError:
-                got = self.str_valtype(item)
-                raise TypeError('Expected sequence of {}; '
-                                'got sequence with {} at position {}'.format(
-                                exp, got, i)) from None
-        
-        if unique:
-            seen = []
-            for i, item in enumerate(seq):
-                if item in seen:
+            t = type(item)
+            if t not in ok:
+                try:
+                    self.checktype(item, kind, **kargs)
+                except TypeError:
+                    got = self.str_valtype(item)
+                    raise TypeError('Expected sequence of {}; got sequence '
+                                    'with {} at position {}'.format(
+                                    exp, got, i)) from None
+                if by_type:
+                    ok.add(t)
+            
+            if unique:
+                if seen_list is None:
+                    try:
+                        dup = item in seen
+                        if not dup:
+                            seen.add(item)
+                    except TypeError:
+                        seen_list = list(seen)
+                if seen_list is not None:
+                    dup = item in seen_list
+                    if not dup:
+                        seen_list.append(item)
+                if dup:
                     raise TypeError('Duplicate element {} at '
                                     'position {}'.format(repr(item), i))
-                seen.append(item)
 
 
 # We export some convenience methods so the caller doesn't have to
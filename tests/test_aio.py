@@ -0,0 +1,108 @@
+"""Unit tests for aio.py."""
+
+
+import unittest
+import asyncio
+import io
+import socket
+
+from simplestruct import Struct, TypedField
+from simplestruct import serial
+from simplestruct.aio import *
+
+
+class Message(Struct):
+    id = TypedField(int)
+    body = TypedField(str)
+    tags = TypedField(str, seq=True)
+
+
+def feed(data):
+    """Return a StreamReader that yields data and then EOF."""
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+async def collect(aiter):
+    return [x async for x in aiter]
+
+
+class AioCase(unittest.IsolatedAsyncioTestCase):
+    
+    async def connect(self):
+        """Return a reader and writer for the ends of a socket pair."""
+        a, b = socket.socketpair()
+        reader, reader_end = await asyncio.open_connection(sock=a)
+        _, writer = await asyncio.open_connection(sock=b)
+        # Unused, but it closes the socket when collected.
+        self.addCleanup(reader_end.close)
+        return reader, writer
+    
+    def setUp(self):
+        self.msgs = [Message(i, 'm' * (i % 7), ['t'] * (i % 3))
+                     for i in range(500)]
+    
+    async def test_socket(self):
+        reader, writer = await self.connect()
+        
+        async def send():
+            async with StructWriter(writer, Message, batch_size=16,
+                                    buffer_size=256) as w:
+                await w.write_many(self.msgs[:250])
+                async def more():
+                    for m in self.msgs[250:]:
+                        yield m
+                await w.write_many(more())
+            return w.written
+        
+        sent, received = await asyncio.gather(
+            send(), collect(iter_structs(reader, Message, chunk_size=100)))
+        self.assertEqual(sent, 500)
+        self.assertEqual(received, self.msgs)
+    
+    async def test_iter_structs(self):
+        buf = io.BytesIO()
+        serial.dump_many(Message, self.msgs, buf)
+        data = buf.getvalue()
+        self.assertEqual(await collect(iter_structs(feed(data), Message,
+                                                    chunk_size=7)),
+                         self.msgs)
+        # Large records are decoded in the executor.
+        buf = io.BytesIO()
+        serial.dump_many(Message, self.msgs[:50], buf)
+        small = buf.getvalue()
+        self.assertEqual(await collect(iter_structs(feed(small),
+                                                    Message, chunk_size=50,
+                                                    offload_size=0)),
+                         self.msgs[:50])
+        self.assertEqual(await collect(iter_structs(feed(b''), Message)), [])
+        
+        with self.assertRaisesRegex(ValueError, 'Truncated record'):
+            await collect(iter_structs(feed(data[:-1]), Message))
+        with self.assertRaisesRegex(ValueError, 'Truncated record'):
+            await collect(iter_structs(feed(small[:-1]), Message,
+                                       offload_size=0))
+        with self.assertRaisesRegex(ValueError, 'Missing header'):
+            await collect(iter_structs(feed(data[:3]), Message))
+        class Other(Struct):
+            id = TypedField(int)
+        with self.assertRaisesRegex(ValueError, 'current schema'):
+            await collect(iter_structs(feed(data), Other))
+    
+    async def test_writer_errors(self):
+        reader, writer = await self.connect()
+        w = StructWriter(writer, Message)
+        with self.assertRaisesRegex(TypeError, 'Expected Message'):
+            await w.write(1)
+        with self.assertRaisesRegex(ValueError, 'Cannot serialize'):
+            await w.write(Message(2 ** 70, '', []))
+        # Failed writes leave nothing behind.
+        await w.write(self.msgs[1])
+        await w.close()
+        self.assertEqual(await collect(iter_structs(reader, Message)),
+                         [self.msgs[1]])
+
+
+if __name__ == '__main__':
+    unittest.main()
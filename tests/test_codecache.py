@@ -0,0 +1,89 @@
+"""Unit tests for codecache.py."""
+
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from simplestruct import (TypedField, make_struct, set_code_cache,
+                          get_code_cache, clear_code_cache)
+from simplestruct import codecache
+from simplestruct.serial import dumps, loads
+
+
+def make_point(**kinds):
+    fields = [('x', TypedField(int)), ('y', TypedField(int, default=0))]
+    fields += [(name, TypedField(kind, or_none=True, default=None))
+               for name, kind in kinds.items()]
+    return make_struct('Point', fields)
+
+def use(cls, *values):
+    p = cls(*values)
+    p == cls(*values)
+    p._replace(x=5)
+    loads(cls, dumps(p))
+
+
+class CodeCacheCase(unittest.TestCase):
+    
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = os.path.join(tmp.name, 'cache')
+        set_code_cache(self.dir)
+        self.addCleanup(set_code_cache, None)
+    
+    def files(self):
+        codecache.save_pending()
+        return sorted(os.listdir(self.dir))
+    
+    def restart(self):
+        # Forget what was loaded, as a new process would.
+        set_code_cache(self.dir)
+    
+    def test_cache(self):
+        self.assertEqual(get_code_cache(), self.dir)
+        use(make_point(), 1, 2)
+        files = self.files()
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].startswith(__name__ + '.Point-'))
+        
+        # The same layout loads its code instead of compiling it.
+        self.restart()
+        with mock.patch.object(codecache, 'compile', create=True,
+                               side_effect=AssertionError) as compile:
+            Point = make_point()
+            use(Point, 1, 2)
+            self.assertEqual(Point(1, 2).y, 2)
+            with self.assertRaises(TypeError):
+                Point('a')
+            compile.assert_not_called()
+        
+        # A changed layout gets its own file.
+        self.restart()
+        use(make_point(z=str), 1, 2)
+        self.assertEqual(len(self.files()), 2)
+        
+        clear_code_cache()
+        self.assertEqual(self.files(), [])
+    
+    def test_unusable(self):
+        use(make_point(), 1, 2)
+        [name] = self.files()
+        with open(os.path.join(self.dir, name), 'wb') as fp:
+            fp.write(b'garbage')
+        self.restart()
+        Point = make_point()
+        use(Point, 1, 2)
+        self.assertEqual(Point(1, 2).y, 2)
+        
+        # Without a cache, nothing is saved.
+        clear_code_cache()
+        set_code_cache(None)
+        use(make_point(), 1, 2)
+        self.assertEqual(self.files(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
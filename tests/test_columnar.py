@@ -0,0 +1,178 @@
+"""Unit tests for columnar.py."""
+
+
+import unittest
+import subprocess
+import sys
+from array import array
+
+from simplestruct.struct import *
+from simplestruct.fields import *
+from simplestruct.columnar import *
+from simplestruct.columnar import import_numpy
+
+
+numpy = import_numpy()
+
+
+class Point(Struct):
+    x = TypedField(float)
+    y = TypedField(float)
+    visible = TypedField(bool, default=True)
+    label = TypedField(str, or_none=True, default=None)
+
+class Sample(Struct):
+    _slots = True
+    count = TypedField(int)
+    weight = TypedField(float, or_none=True, default=None)
+    tags = TypedField(str, seq=True, default=())
+
+
+class ColumnarCase(unittest.TestCase):
+    
+    backend = 'array'
+    
+    def test_construct(self):
+        arr = StructArray(Point, 3, backend=self.backend)
+        self.assertEqual(len(arr), 3)
+        self.assertEqual(arr[0], Point(0.0, 0.0))
+        
+        arr = StructArray.from_iterable(
+            Point, [(1.0, 2.0), Point(3.0, 4.0, False, 'a')],
+            backend=self.backend)
+        self.assertEqual(list(arr), [Point(1.0, 2.0),
+                                     Point(3.0, 4.0, False, 'a')])
+        with self.assertRaises(TypeError):
+            StructArray.from_iterable(Point, [(1, 2)],
+                                      backend=self.backend)
+    
+    def test_indexing(self):
+        arr = StructArray.from_iterable(
+            Point, [(float(i), float(-i)) for i in range(5)],
+            backend=self.backend)
+        self.assertEqual(arr[1], Point(1.0, -1.0))
+        self.assertEqual(arr[-1], Point(4.0, -4.0))
+        self.assertIs(type(arr[0].visible), bool)
+        with self.assertRaises(IndexError):
+            arr[5]
+        with self.assertRaisesRegex(TypeError, 'must be integers'):
+            arr[1.0]
+        if numpy is not None:
+            self.assertEqual(arr[numpy.int64(1)], Point(1.0, -1.0))
+        
+        sub = arr[1:4:2]
+        self.assertIsInstance(sub, StructArray)
+        self.assertEqual(list(sub), [Point(1.0, -1.0), Point(3.0, -3.0)])
+        
+        arr[0] = (9.0, 9.0, False, 'z')
+        self.assertEqual(arr[0], Point(9.0, 9.0, False, 'z'))
+        with self.assertRaises(TypeError):
+            arr[0] = ('a', 9.0)
+        # Slices are copies.
+        self.assertEqual(sub[0], Point(1.0, -1.0))
+        sub[0] = (0.0, 0.0)
+        self.assertEqual(arr[1], Point(1.0, -1.0))
+    
+    def test_columns(self):
+        arr = StructArray.from_iterable(
+            Point, [(1.0, 2.0), (3.0, 4.0, False)],
+            backend=self.backend)
+        xs = arr.column('x')
+        self.assertEqual(list(xs), [1.0, 3.0])
+        self.assertEqual(list(arr.column('label')), [None, None])
+        xs[0] = 5.0
+        self.assertEqual(arr[0].x, 5.0)
+        with self.assertRaises(KeyError):
+            arr.column('z')
+    
+    def test_struct_columns(self):
+        samples = [Sample(i, None if i % 2 else i / 2, ('a',) * i)
+                   for i in range(4)]
+        cols = columns(samples, backend=self.backend)
+        self.assertEqual(list(cols), ['count', 'weight', 'tags'])
+        self.assertEqual(list(cols['count']), [0, 1, 2, 3])
+        self.assertEqual(Sample._from_columns(cols), samples)
+        
+        # Vectorized update.
+        counts = cols['count']
+        cols['count'] = (counts * 2 if self.backend == 'numpy'
+                         else [c * 2 for c in counts])
+        self.assertEqual(Sample._from_columns(cols)[3],
+                         Sample(6, None, ('a', 'a', 'a')))
+        
+        self.assertEqual(len(columns([], Sample,
+                                     backend=self.backend)['count']), 0)
+        with self.assertRaises(ValueError):
+            columns([])
+        with self.assertRaises(TypeError):
+            columns([samples[0], Point(1.0, 2.0)])
+    
+    def test_from_columns(self):
+        self.assertEqual(Sample._from_columns({'count': [1, 2]}),
+                         [Sample(1), Sample(2)])
+        self.assertEqual(Sample._from_columns({'count': array('q', [1]),
+                                               'weight': [None]}),
+                         [Sample(1)])
+        with self.assertRaisesRegex(TypeError, "argument: 'count'"):
+            Sample._from_columns({'weight': [1.0]})
+        with self.assertRaisesRegex(TypeError, "argument 'size'"):
+            Sample._from_columns({'count': [1], 'size': [1]})
+        with self.assertRaisesRegex(ValueError, 'different lengths'):
+            Sample._from_columns({'count': [1], 'weight': [1.0, 2.0]})
+        with self.assertRaisesRegex(TypeError, "row 1, field 'weight'"):
+            Sample._from_columns({'count': [1, 2], 'weight': [1.0, 'a']})
+        with self.assertRaises(TypeError):
+            Sample._from_columns({'count': [1]}, False)
+        
+        # Fields may have the names of keyword-only parameters.
+        Foo = make_struct('Foo', ['validate', 'cls'])
+        self.assertEqual(Foo._from_columns({'validate': [1],
+                                            'cls': [2]}), [Foo(1, 2)])
+    
+    def test_column_types(self):
+        arr = StructArray(Point, 2, backend='array')
+        self.assertIsInstance(arr.column('x'), array)
+        self.assertEqual(arr.column('x').typecode, 'd')
+        self.assertEqual(arr.column('visible').typecode, 'b')
+        self.assertIsInstance(arr.column('label'), list)
+
+
+class ImportCase(unittest.TestCase):
+    
+    def test_lazy_numpy(self):
+        # Importing the package doesn't import NumPy.
+        code = 'import sys, simplestruct; print("numpy" in sys.modules)'
+        out = subprocess.run([sys.executable, '-c', code], check=True,
+                             stdout=subprocess.PIPE,
+                             universal_newlines=True).stdout
+        self.assertEqual(out.strip(), 'False')
+
+
+@unittest.skipIf(numpy is None, 'NumPy is not available')
+class NumpyColumnarCase(ColumnarCase):
+    
+    backend = 'numpy'
+    
+    def test_column_types(self):
+        arr = StructArray(Point, 2, backend='numpy')
+        self.assertEqual(arr.column('x').dtype, numpy.float64)
+        self.assertEqual(arr.column('visible').dtype, numpy.bool_)
+        self.assertEqual(arr.column('label').dtype, object)
+    
+    def test_masks(self):
+        samples = [Sample(1, 0.5), Sample(2)]
+        cols = columns(samples)
+        self.assertEqual(cols['count'].dtype, numpy.int64)
+        weight = cols['weight']
+        self.assertIsInstance(weight, numpy.ma.MaskedArray)
+        self.assertEqual(weight.mask.tolist(), [False, True])
+        self.assertEqual(Sample._from_columns(cols), samples)
+        
+        # Masked values are None, which only or_none fields accept.
+        count = numpy.ma.MaskedArray([1, 2], mask=[False, True])
+        with self.assertRaises(TypeError):
+            Sample._from_columns({'count': count})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+"""Unit tests for csvfile.py."""
+
+
+import unittest
+import io
+
+from simplestruct import Struct, TypedField
+from simplestruct.csvfile import *
+
+
+class Row(Struct):
+    id = TypedField(int)
+    score = TypedField(float, or_none=True)
+    name = TypedField(str, default='')
+
+
+class CsvCase(unittest.TestCase):
+    
+    def test_iter_csv(self):
+        text = 'name,extra,id,score\na,x,1,2.5\nb,y,2,\n'
+        rows = iter_csv(Row, io.StringIO(text))
+        self.assertEqual(next(rows), Row(1, 2.5, 'a'))
+        self.assertEqual(list(rows), [Row(2, None, 'b')])
+        
+        # Missing columns with defaults, other format parameters.
+        text = 'id;score\n1;3\n'
+        self.assertEqual(list(iter_csv(Row, io.StringIO(text),
+                                       delimiter=';')),
+                         [Row(1, 3.0)])
+        self.assertEqual(list(iter_csv(Row, io.StringIO('3,,c\n'),
+                                       header=False)),
+                         [Row(3, None, 'c')])
+        self.assertEqual(list(iter_csv(Row, io.StringIO(''))), [])
+        text = 'id,score,name,extra\n1,2,a,x\n'
+        self.assertEqual(list(iter_csv(Row, io.StringIO(text))),
+                         [Row(1, 2.0, 'a')])
+        
+        with self.assertRaisesRegex(
+                ValueError, 'CSV header is missing field score of Row'):
+            list(iter_csv(Row, io.StringIO('id\n1\n')))
+        with self.assertRaisesRegex(
+                ValueError, "^Error constructing Row \\(row 1, field 'id'\\)"):
+            list(iter_csv(Row, io.StringIO('id,score\n1,2\nx,3\n')))
+        # Short rows, whether or not the columns are reordered.
+        for text in ['id,score\n1,2\n3\n', 'score,id\n1,2\n3\n']:
+            with self.assertRaisesRegex(
+                    TypeError, '^Error constructing Row \\(row 1\\): '
+                               'missing a required argument'):
+                list(iter_csv(Row, io.StringIO(text)))
+        self.assertEqual(list(iter_csv(Row, io.StringIO('score,id,name\n'
+                                                        '1,2\n'))),
+                         [Row(2, 1.0)])
+        with self.assertRaises(TypeError):
+            list(iter_csv(int, io.StringIO('')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,11 +2,32 @@
 
 
 import unittest
+import pickle
+import copy
+import threading
 
 from simplestruct.struct import *
 from simplestruct.fields import *
 
 
+# Pickled types must be defined at module level.
+class PickleFoo(Struct):
+    a = TypedField(int)
+    def __init__(self, a):
+        self.inits = getattr(self, 'inits', 0) + 1
+
+class PickleBar(Struct):
+    _fast_pickle = True
+    _slots = True
+    __slots__ = ('double',)
+    a = TypedField(int)
+    b = TypedField(str, seq=True)
+    def __init__(self, a, b):
+        raise AssertionError('__init__ called')
+    def _restored(self):
+        self.double = self.a * 2
+
+
 class FieldsCase(unittest.TestCase):
     
     def test_TypedField(self):
@@ -39,7 +60,300 @@ class FieldsCase(unittest.TestCase):
             _immutable = False
             bar = TypedField(int, or_none=True)
         f1 = Foo(None)
-
+    
+    def test_assignment(self):
+        class Bar(Struct):
+            a = Field
+        class Foo(Struct):
+            _immutable = False
+            b = TypedField(int, or_none=True)
+            c = TypedField(str, seq=True, unique=True)
+            d = TypedField(Bar)
+        f = Foo(1, [], (1,))
+        f.b = None
+        f.b = 2
+        with self.assertRaisesRegex(TypeError, '^Expected int; got str$'):
+            f.b = 'a'
+        f.c = ['x', 'y']
+        self.assertEqual(f.c, ('x', 'y'))
+        with self.assertRaisesRegex(TypeError, 'Duplicate element'):
+            f.c = ['x', 'x']
+        f.d = (2,)
+        self.assertEqual(f.d, Bar(2))
+        self.assertEqual((f.b, f.c), (2, ('x', 'y')))
+        
+        class Foo(Struct):
+            b = TypedField(int)
+        f = Foo(1)
+        with self.assertRaises(AttributeError):
+            f.b = 2
+        # Type errors take precedence.
+        with self.assertRaises(TypeError):
+            f.b = 'a'
+        
+        # Subclasses that override check() get the generic behavior.
+        class PositiveField(TypedField):
+            def check(self, inst, value):
+                super().check(inst, value)
+                if value <= 0:
+                    raise TypeError('Expected positive int')
+        class Foo(Struct):
+            b = PositiveField(int)
+        self.assertIsNone(Foo.b.setter)
+        Foo(1)
+        with self.assertRaisesRegex(TypeError, 'Expected positive int'):
+            Foo(0)
+    
+    def test_validation_modes(self):
+        class Bar(Struct):
+            a = TypedField(int)
+        class Foo(Struct):
+            _validate = 'off'
+            b = TypedField(int)
+            c = TypedField(int, seq=True)
+            d = TypedField(Bar)
+        # Checks are skipped, but not coercion or normalization.
+        f = Foo('a', ['a'], (1,))
+        self.assertEqual(f, Foo('a', ('a',), Bar(1)))
+        self.assertEqual(f.c, ('a',))
+        self.assertEqual(Foo._from_rows([('a', ['a'], (1,))]), [f])
+        
+        class Foo(Struct):
+            _immutable = False
+            _validate = 'construct_only'
+            b = TypedField(int)
+        with self.assertRaises(TypeError):
+            Foo('a')
+        f = Foo(1)
+        f.b = 'a'
+        self.assertEqual(f.b, 'a')
+        
+        # Inherited fields follow the subclass's mode.
+        class Base(Struct):
+            _immutable = False
+            _validate = 'off'
+            x = TypedField(int)
+        class Sub(Base):
+            _inherit_fields = True
+            _validate = 'full'
+        Base(1).x = 'a'
+        s = Sub(1)
+        with self.assertRaises(TypeError):
+            s.x = 'a'
+        class Base(Struct):
+            _immutable = False
+            x = TypedField(int)
+        class Sub(Base):
+            _inherit_fields = True
+            _validate = 'off'
+        with self.assertRaises(TypeError):
+            Base(1).x = 'a'
+        s = Sub(1)
+        s.x = 'a'
+        self.assertEqual(s.x, 'a')
+        
+        with self.assertRaises(ValueError):
+            class Foo(Struct):
+                _validate = 'sometimes'
+        with self.assertRaises(ValueError):
+            set_validation('sometimes')
+    
+    def test_validation_global(self):
+        class Foo(Struct):
+            _immutable = False
+            b = TypedField(int, seq=True)
+        class Bar(Struct):
+            _validate = 'off'
+            b = TypedField(int)
+        
+        self.assertEqual(get_validation(), 'full')
+        with validation('off'):
+            self.assertEqual(get_validation(), 'off')
+            # Existing classes are affected.
+            f = Foo(['a'])
+            self.assertEqual(f.b, ('a',))
+            f.b = ['b']
+            self.assertEqual(f.b, ('b',))
+            # So are new ones.
+            class Baz(Struct):
+                b = TypedField(int)
+            Baz('a')
+        self.assertEqual(get_validation(), 'full')
+        with self.assertRaises(TypeError):
+            Foo(['a'])
+        with self.assertRaises(TypeError):
+            f.b = ['a']
+        with self.assertRaises(TypeError):
+            Baz('a')
+        
+        # The less strict mode wins.
+        with validation('construct_only'):
+            Bar('a')
+            with self.assertRaises(TypeError):
+                Foo(['a'])
+            f.b = ['a']
+    
+    def test_slots(self):
+        class Foo(Struct):
+            _slots = True
+            bar = TypedField(int, seq=True)
+        f = Foo([1, 2])
+        self.assertFalse(hasattr(f, '__dict__'))
+        self.assertEqual(f.bar, (1, 2))
+        with self.assertRaises(TypeError):
+            Foo([1, 'a'])
+    
+    def test_replace(self):
+        class Point(Struct):
+            x = TypedField(int)
+            y = TypedField(int)
+        class Foo(Struct):
+            a = TypedField(int)
+            b = TypedField(str, seq=True, or_none=True)
+            c = TypedField(Point)
+        f1 = Foo(1, ['x'], (1, 2))
+        f2 = f1._replace(b=['y', 'z'], c=(3, 4))
+        self.assertEqual(f2, Foo(1, ('y', 'z'), Point(3, 4)))
+        self.assertIs(f2.a, f1.a)
+        with self.assertRaisesRegex(
+                TypeError, "^Error constructing Foo \\(field 'a'\\): "
+                           "Expected int; got str$"):
+            f1._replace(a='1')
+        
+        with validation('off'):
+            self.assertEqual(f1._replace(a='1').a, '1')
+    
+    def test_fast_pickle(self):
+        with validation('off'):
+            bad = PickleFoo('x')
+        data = pickle.dumps(bad)
+        with self.assertRaises(TypeError):
+            pickle.loads(data)
+        
+        # Trusted unpickling skips validation, but still runs
+        # __init__() when there's no _restored() hook.
+        with fast_pickle():
+            f = pickle.loads(data)
+            self.assertEqual(f.a, 'x')
+            self.assertEqual(f.inits, 1)
+            self.assertEqual(copy.deepcopy(PickleFoo(1)), PickleFoo(1))
+        with self.assertRaises(AttributeError):
+            f.a = 2
+        
+        # Other threads still validate.
+        errors = []
+        def load():
+            try:
+                pickle.loads(data)
+            except TypeError as exc:
+                errors.append(exc)
+        with fast_pickle():
+            t = threading.Thread(target=load)
+            t.start()
+            t.join()
+        self.assertEqual(len(errors), 1)
+        
+        # _fast_pickle applies without the context manager, and
+        # _restored() is called in place of __init__().
+        # (Bypass __init__() to make the original.)
+        b = PickleBar.__new__(PickleBar, 5, ['x'])
+        b._initialized = True
+        b2 = pickle.loads(pickle.dumps(b))
+        self.assertEqual(b2, b)
+        self.assertEqual(b2.double, 10)
+        self.assertEqual(b2.b, ('x',))
+        self.assertEqual(hash(b2), hash(b))
+    
+    def test_from_rows(self):
+        class Bar(Struct):
+            a = TypedField(int)
+        class Foo(Struct):
+            b = TypedField(int, or_none=True)
+            c = TypedField(str, seq=True, unique=True)
+            d = TypedField(Bar)
+        foos = Foo._from_rows([(1, ['x'], (2,)), (None, ('y', 'z'), Bar(3))])
+        self.assertEqual(foos, [Foo(1, ['x'], (2,)),
+                                Foo(None, ['y', 'z'], (3,))])
+        self.assertEqual(foos[0].c, ('x',))
+        
+        with self.assertRaisesRegex(
+                TypeError, "^Error constructing Foo \\(row 2, field 'b'\\): "
+                           "Expected int; got str$"):
+            Foo._from_rows([(1, [], (2,)), (None, [], (2,)),
+                            ('a', [], (2,))])
+        with self.assertRaisesRegex(
+                TypeError, "^Error constructing Foo \\(row 1, field 'c'\\): "
+                           "Duplicate element 'x' at position 1$"):
+            Foo._from_rows([(1, [], (2,)), (1, ['x', 'x'], (2,))])
+        with self.assertRaisesRegex(
+                TypeError, "^Error constructing Foo \\(row 0, field 'd'\\): "
+                           "Error constructing Bar \\(field 'a'\\): "
+                           "Expected int; got str$"):
+            Foo._from_rows([(1, [], ('a',))])
+        
+        # Skipping validation still normalizes.
+        foos = Foo._from_rows([('a', ['x', 'x'], (2,))], validate=False)
+        self.assertEqual(foos[0].b, 'a')
+        self.assertEqual(foos[0].c, ('x', 'x'))
+        self.assertEqual(foos[0].d, Bar(2))
+        
+        # An overridden checktype() sees every value, not just one of
+        # each type.
+        class Positive(TypedField):
+            def checktype(self, val, kind, **kargs):
+                super().checktype(val, kind, **kargs)
+                if val <= 0:
+                    raise TypeError('Expected positive value')
+        class Baz(Struct):
+            x = Positive(int)
+        with self.assertRaisesRegex(TypeError, "row 1, field 'x'"):
+            Baz._from_rows([(1,), (-3,)])
+        with self.assertRaises(TypeError):
+            Positive(int).checktype_column([1, 2, -3], (int,))
+        class Qux(Struct):
+            xs = Positive(int, seq=True)
+        with self.assertRaisesRegex(TypeError, 'int at position 1'):
+            Qux([1, -5])
+    
+    def test_stream(self):
+        class Foo(Struct):
+            a = TypedField(int)
+            b = TypedField(float, or_none=True)
+            c = TypedField(bool)
+            d = TypedField(str, default='d')
+        self.assertIsNone(Foo.d.parser())
+        rows = [('1', '2.5', 'yes', 'x'), ('2', ' ', 'F'), (3, 4.0, True)]
+        exp = [Foo(1, 2.5, True, 'x'), Foo(2, None, False), Foo(3, 4.0, True)]
+        
+        # The input is consumed lazily, a chunk at a time.
+        consumed = []
+        def gen():
+            for row in rows * 3:
+                consumed.append(row)
+                yield row
+        it = Foo._stream(gen(), chunk_size=2)
+        self.assertEqual(next(it), exp[0])
+        self.assertEqual(len(consumed), 2)
+        self.assertEqual(list(it), (exp * 3)[1:])
+        
+        self.assertEqual(list(Foo._stream(rows, chunk_size=2, workers=2)),
+                         exp)
+        self.assertEqual(list(Foo._stream([])), [])
+        
+        # Without coercion, strs are rejected by validation.
+        with self.assertRaisesRegex(
+                TypeError, "^Error constructing Foo \\(row 0, field 'a'\\): "
+                           "Expected int; got str$"):
+            list(Foo._stream(rows, coerce=False))
+        # Row numbers count from the start of the input.
+        with self.assertRaisesRegex(
+                ValueError, "^Error constructing Foo \\(row 3, field 'c'\\): "
+                            "invalid literal for bool: 'maybe'$"):
+            list(Foo._stream(rows + [('1', '1', 'maybe')], chunk_size=2))
+        with self.assertRaisesRegex(
+                TypeError, "^Error constructing Foo \\(row 3\\): "):
+            list(Foo._stream(rows + [()], chunk_size=2))
+    
     def test_nestedstructs(self):
         class Bar(Struct):
             a = Field
@@ -0,0 +1,129 @@
+"""Unit tests for instrument.py."""
+
+
+import unittest
+import gc
+import weakref
+
+from simplestruct import (Struct, Field, TypedField, validation,
+                          make_struct, enable_stats, disable_stats,
+                          stats_enabled, reset_stats, stats, set_sampler)
+
+
+class Point(Struct):
+    x = TypedField(int)
+    y = TypedField(int, default=0)
+
+class Named(Struct):
+    name = Field()
+    def __new__(cls, *args, **kargs):
+        return super().__new__(cls, *args, **kargs)
+
+
+def entry(cls):
+    return stats().get('{}.{}'.format(cls.__module__, cls.__qualname__), {})
+
+
+class InstrumentCase(unittest.TestCase):
+    
+    def setUp(self):
+        reset_stats()
+        self.addCleanup(disable_stats)
+        self.addCleanup(set_sampler, None)
+    
+    def test_disabled(self):
+        # Make the generated functions.
+        Point(1) == Point(2)
+        construct = Point._construct
+        eq = Point.__dict__['__eq__']
+        enable_stats()
+        self.assertTrue(stats_enabled())
+        self.assertIsNot(Point._construct, construct)
+        disable_stats()
+        self.assertFalse(stats_enabled())
+        # The original functions are back.
+        self.assertIs(Point._construct, construct)
+        self.assertIs(Point.__dict__['__eq__'], eq)
+        self.assertNotIn('__hash__', Point.__dict__)
+        Point(1)
+        self.assertEqual(entry(Point), {})
+    
+    def test_stats(self):
+        enable_stats()
+        for i in range(10):
+            p = Point(i)
+            hash(p)
+            p == Point(i + 1)
+        with self.assertRaises(TypeError):
+            Point('a')
+        Point(1)._replace(y=2)
+        Point._from_rows([(1,), (2,)])
+        Named('a')
+        
+        e = entry(Point)
+        self.assertEqual(e['construct']['calls'], 22)
+        self.assertEqual(e['construct']['failures'], 1)
+        self.assertEqual(e['construct']['failure_rate'], 1 / 22)
+        self.assertGreater(e['construct']['seconds'], 0)
+        self.assertEqual(e['hash']['calls'], 10)
+        self.assertEqual(e['eq']['calls'], 10)
+        self.assertEqual(e['replace']['calls'], 1)
+        self.assertEqual(e['construct_bulk']['calls'], 2)
+        self.assertEqual(e['fields']['x']['calls'], 22)
+        self.assertEqual(e['fields']['x']['failures'], 1)
+        self.assertEqual(e['fields']['y']['calls'], 22)
+        self.assertEqual(entry(Named)['boundargs']['calls'], 1)
+        
+        reset_stats()
+        self.assertEqual(entry(Point), {})
+        
+        # Classes defined or revalidated while enabled are instrumented.
+        class Foo(Point):
+            _inherit_fields = True
+            z = Field(default=None)
+        Foo(1, 2, 3) == Foo(1, 2, 3)
+        self.assertEqual(entry(Foo)['construct']['calls'], 2)
+        self.assertEqual(entry(Foo)['eq']['calls'], 1)
+        with validation('off'):
+            Point('a')
+        self.assertEqual(entry(Point)['construct']['calls'], 1)
+        self.assertEqual(entry(Point)['construct']['failures'], 0)
+        
+        # Stats survive disabling.
+        disable_stats()
+        self.assertEqual(entry(Foo)['construct']['calls'], 2)
+    
+    def test_lifetime(self):
+        # Statistics don't keep classes alive.
+        enable_stats()
+        refs = []
+        for i in range(10):
+            cls = make_struct('Temp', [('x', TypedField(int))])
+            cls(i) == cls(i)
+            cls._from_rows([(i,)])
+            refs.append(weakref.ref(cls))
+        del cls
+        disable_stats()
+        gc.collect()
+        self.assertEqual([r() for r in refs], [None] * 10)
+        e = stats()[__name__ + '.Temp']
+        self.assertEqual(e['construct']['calls'], 20)
+        self.assertEqual(e['construct_bulk']['calls'], 10)
+    
+    def test_sampler(self):
+        samples = []
+        set_sampler(lambda *args: samples.append(args), interval=3)
+        enable_stats()
+        for i in range(3):
+            Point(i, i)
+        # 3 constructions, each validating 2 fields.
+        self.assertEqual(len(samples), 3)
+        name, op, fname, seconds = samples[0]
+        self.assertEqual(name, __name__ + '.Point')
+        self.assertIn(op, ['construct', 'validate'])
+        with self.assertRaises(ValueError):
+            set_sampler(print, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+"""Unit tests for interchange.py."""
+
+
+import unittest
+import io
+import json
+import gc
+import weakref
+
+from simplestruct import Struct, Field, TypedField
+from simplestruct.interchange import *
+from simplestruct import interchange
+
+
+class Point(Struct):
+    x = TypedField(int)
+    y = TypedField(float)
+
+class Shape(Struct):
+    name = TypedField(str)
+    points = TypedField(Point, seq=True)
+    center = TypedField(Point, or_none=True)
+    tags = TypedField(str, seq=True, unique=True)
+    visible = TypedField(bool, default=True)
+    extra = Field(default=None)
+
+
+class InterchangeCase(unittest.TestCase):
+    
+    def setUp(self):
+        self.shape = Shape('tri "1"', [Point(0, 0.5), Point(-1, 2.0)],
+                           None, ['a', 'é'], False, {'k': [1, 2]})
+    
+    def test_json(self):
+        p = Point(1, 2.5)
+        self.assertEqual(to_json(p), '{"x":1,"y":2.5}')
+        self.assertEqual(from_json(Point, to_json(p)), p)
+        
+        text = to_json(self.shape)
+        # Same as the json module would write.
+        self.assertEqual(json.loads(text), json.loads(json.dumps({
+            'name': 'tri "1"', 'points': [{'x': 0, 'y': 0.5},
+                                          {'x': -1, 'y': 2.0}],
+            'center': None, 'tags': ['a', 'é'], 'visible': False,
+            'extra': {'k': [1, 2]}})))
+        self.assertEqual(from_json(Shape, text), self.shape)
+        s = self.shape._replace(center=(3, float('inf')))
+        self.assertEqual(from_json(Shape, to_json(s)), s)
+        
+        # Defaults, extra members, and ints for floats.
+        self.assertEqual(
+            from_json(Shape, '{"name": "x", "points": [{"x": 1, "y": 2}], '
+                             '"center": null, "tags": [], "other": 1}'),
+            Shape('x', [Point(1, 2.0)], None, []))
+    
+    def test_json_errors(self):
+        with self.assertRaisesRegex(ValueError, 'missing field x'):
+            from_json(Point, '{"y": 1.0}')
+        with self.assertRaisesRegex(ValueError, 'expected object'):
+            from_json(Point, '[1, 1.0]')
+        with self.assertRaisesRegex(TypeError, 'Expected float'):
+            from_json(Point, '{"x": 1, "y": "a"}')
+        self.assertEqual(from_json(Point, '{"x": 1, "y": "a"}',
+                                   validate=False).y, 'a')
+        with self.assertRaises(TypeError):
+            to_json((1, 2))
+    
+    def test_json_stream(self):
+        points = [Point(i, i / 2) for i in range(100)]
+        buf = io.StringIO()
+        self.assertEqual(dump_json_stream(Point, iter(points), buf), 100)
+        self.assertEqual(len(buf.getvalue().splitlines()), 100)
+        buf = io.StringIO(buf.getvalue() + '\n')
+        it = iter_json_stream(Point, buf)
+        self.assertEqual(next(it), points[0])
+        self.assertEqual(list(it), points[1:])
+    
+    def test_lifetime(self):
+        # Codecs don't keep their classes alive.
+        class Inner(Struct):
+            a = TypedField(int)
+        class Outer(Struct):
+            inner = TypedField(Inner)
+        o = Outer(Inner(1))
+        self.assertEqual(from_json(Outer, to_json(o)), o)
+        refs = [weakref.ref(Inner), weakref.ref(Outer)]
+        del Inner, Outer, o
+        gc.collect()
+        self.assertEqual([r() for r in refs], [None, None])
+    
+    @unittest.skipIf(interchange.msgpack is None, 'msgpack not installed')
+    def test_msgpack(self):
+        self.assertEqual(from_msgpack(Shape, to_msgpack(self.shape)),
+                         self.shape)
+        with self.assertRaisesRegex(ValueError, 'expected array'):
+            from_msgpack(Point, to_msgpack(self.shape))
+        
+        points = [Point(i, i / 2) for i in range(100)]
+        buf = io.BytesIO()
+        dump_msgpack_stream(Point, points, buf)
+        buf.seek(0)
+        self.assertEqual(list(iter_msgpack_stream(Point, buf)), points)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""Unit tests for mapped.py."""
+
+
+import unittest
+import os
+import tempfile
+import gc
+import weakref
+
+from simplestruct import Struct, Field, TypedField
+from simplestruct.mapped import *
+
+
+class Point(Struct):
+    x = TypedField(int)
+    y = TypedField(float)
+
+class Segment(Struct):
+    start = TypedField(Point)
+    end = TypedField(Point)
+    visible = TypedField(bool)
+
+
+class MappedCase(unittest.TestCase):
+    
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+    
+    def tearDown(self):
+        os.remove(self.path)
+    
+    def dump(self, cls, records):
+        with open(self.path, 'wb') as f:
+            return dump_records(cls, records, f)
+    
+    def test_views(self):
+        segs = [Segment((i, i / 2), (-i, 1.5), i % 2 == 0)
+                for i in range(10)]
+        self.assertEqual(self.dump(Segment, iter(segs)), 10)
+        # Header, then two ints, two floats, and a bool per record.
+        self.assertEqual(os.path.getsize(self.path), 12 + 10 * 33)
+        
+        with RecordFile(Segment, self.path) as rf:
+            self.assertEqual(len(rf), 10)
+            v = rf[3]
+            self.assertEqual(v.start.x, 3)
+            self.assertEqual(v.start.y, 1.5)
+            self.assertIs(v.visible, False)
+            self.assertEqual(v, rf[3])
+            self.assertNotEqual(v, rf[5])
+            self.assertEqual(v.start, Point(3, 1.5))
+            self.assertEqual(v[2], False)
+            self.assertEqual(v[-1], False)
+            self.assertEqual(len(v), 3)
+            self.assertEqual(list(v._asdict()), ['start', 'end', 'visible'])
+            self.assertEqual(v._materialize(), segs[3])
+            self.assertEqual(rf[-1]._materialize(), segs[-1])
+            self.assertEqual([s._materialize() for s in rf], segs)
+            self.assertEqual([s.start.x for s in rf[2:8:2]], [2, 4, 6])
+            self.assertEqual(repr(v.start), 'PointView(x=3, y=1.5)')
+            with self.assertRaises(IndexError):
+                rf[10]
+            with self.assertRaises(AttributeError):
+                v.visible = True
+    
+    def test_errors(self):
+        class Foo(Struct):
+            a = TypedField(str)
+        with self.assertRaisesRegex(TypeError, 'fixed layout'):
+            self.dump(Foo, [])
+        class Foo(Struct):
+            a = Field()
+        with self.assertRaisesRegex(TypeError, 'fixed layout'):
+            self.dump(Foo, [])
+        with self.assertRaisesRegex(ValueError, 'Cannot store'):
+            self.dump(Point, [Point(2 ** 70, 1.0)])
+        
+        self.dump(Point, [Point(1, 1.0)])
+        with self.assertRaisesRegex(ValueError, 'current layout'):
+            RecordFile(Segment, self.path)
+        with open(self.path, 'ab') as f:
+            f.write(b'\x00')
+        with self.assertRaisesRegex(ValueError, 'Truncated'):
+            RecordFile(Point, self.path)
+    
+    def test_lifetime(self):
+        # Layouts don't keep their classes alive.
+        class Inner(Struct):
+            a = TypedField(int)
+        class Outer(Struct):
+            inner = TypedField(Inner)
+        self.dump(Outer, [Outer(Inner(1))])
+        with RecordFile(Outer, self.path) as rf:
+            self.assertEqual(rf[0]._materialize(), Outer(Inner(1)))
+        refs = [weakref.ref(Inner), weakref.ref(Outer)]
+        del Inner, Outer, rf
+        gc.collect()
+        self.assertEqual([r() for r in refs], [None, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""Unit tests for parallel.py."""
+
+
+import unittest
+import gc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from simplestruct import Struct, TypedField
+from simplestruct.parallel import *
+from simplestruct.parallel import can_fork
+
+
+class Item(Struct):
+    name = TypedField(str)
+    tags = TypedField(str, seq=True, unique=True)
+
+
+class ParallelCase(unittest.TestCase):
+    
+    def setUp(self):
+        self.rows = [('i{}'.format(i), ['a', str(i)]) for i in range(50)]
+        self.exp = Item._from_rows(self.rows)
+    
+    def test_construct_parallel(self):
+        items = construct_parallel(Item, self.rows, workers=2, min_rows=0)
+        self.assertEqual(items, self.exp)
+        self.assertEqual(items[0].tags, ('a', '0'))
+        
+        # Small inputs are constructed here.
+        self.assertEqual(construct_parallel(Item, self.rows, workers=2),
+                         self.exp)
+        self.assertEqual(construct_parallel(Item, [], min_rows=0), [])
+        
+        with ProcessPoolExecutor(2) as executor:
+            items = construct_parallel(Item, self.rows, workers=2,
+                                       min_rows=0, chunk_size=7,
+                                       executor=executor)
+        self.assertEqual(items, self.exp)
+        
+        with self.assertRaises(TypeError):
+            construct_parallel(int, self.rows)
+    
+    @unittest.skipUnless(can_fork(), 'needs the fork start method')
+    def test_fork(self):
+        # Objects frozen by the application stay frozen.
+        gc.freeze()
+        try:
+            count = gc.get_freeze_count()
+            construct_parallel(Item, self.rows, workers=2, min_rows=0)
+            self.assertEqual(gc.get_freeze_count(), count)
+        finally:
+            gc.unfreeze()
+        
+        # Concurrent calls each validate their own rows.
+        bad = self.rows + [('x', ['a', 'a'])]
+        def run(rows):
+            try:
+                construct_parallel(Item, rows, workers=2, min_rows=0)
+            except TypeError:
+                return 'error'
+            return 'ok'
+        with ThreadPoolExecutor(4) as threads:
+            results = list(threads.map(run, [self.rows, bad] * 4))
+        self.assertEqual(results, ['ok', 'error'] * 4)
+    
+    def test_errors(self):
+        rows = self.rows + [('x', ['a', 'a'])]
+        with self.assertRaisesRegex(
+                TypeError, "^Error constructing Item \\(row 50, field "
+                           "'tags'\\): Duplicate element 'a'"):
+            construct_parallel(Item, rows, workers=2, min_rows=0,
+                               chunk_size=10)
+        with ProcessPoolExecutor(2) as executor:
+            with self.assertRaisesRegex(TypeError, '\\(row 50, '):
+                construct_parallel(Item, rows, workers=2, min_rows=0,
+                                   chunk_size=10, executor=executor)
+        
+        # Without validation, nothing is done in parallel.
+        items = construct_parallel(Item, rows, validate=False, workers=2,
+                                   min_rows=0)
+        self.assertEqual(items[-1].tags, ('a', 'a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
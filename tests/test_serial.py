@@ -0,0 +1,161 @@
+"""Unit tests for serial.py."""
+
+
+import unittest
+import io
+import gc
+import weakref
+
+from simplestruct import Struct, Field, TypedField
+from simplestruct.serial import *
+
+
+class Point(Struct):
+    x = TypedField(int)
+    y = TypedField(float)
+    visible = TypedField(bool)
+
+class SubPoint(Point):
+    _inherit_fields = True
+
+class Shape(Struct):
+    name = TypedField(str)
+    points = TypedField(Point, seq=True)
+    center = TypedField(Point, or_none=True)
+    tags = TypedField(str, seq=True, unique=True)
+    data = TypedField(bytes)
+    extra = Field(default=None)
+
+class Tree(Struct):
+    value = TypedField(int)
+    children = TypedField(Struct, seq=True)
+
+
+class SerialCase(unittest.TestCase):
+    
+    def test_roundtrip(self):
+        p = Point(-5, 1.5, True)
+        self.assertEqual(loads(Point, dumps(p)), p)
+        # Fixed-width fields: header, 8 + 8 + 1 bytes.
+        self.assertEqual(len(dumps(p)), 8 + 17)
+        
+        s = Shape('tri', [Point(0, 0.0, True), Point(1, 2.0, False)], None,
+                  ['a', 'b'], b'\x00\xff',
+                  (1, -2 ** 70, 3.5, 'x', b'y', True, None, [1, 2]))
+        # The list in extra is pickled.
+        s2 = loads(Shape, dumps(s), trusted=True)
+        self.assertEqual(s2, s)
+        self.assertEqual(s2.extra[-1], [1, 2])
+        with self.assertRaisesRegex(ValueError, 'trusted=True'):
+            loads(Shape, dumps(s))
+        s = s._replace(center=(1, 1.0, True), name='é', extra=(1, 'x'))
+        self.assertEqual(loads(Shape, dumps(s)), s)
+        
+        # Untyped kinds fall back to the generic encoding, and Struct
+        # values there are pickled.
+        t = Tree(1, [Point(1, 1.0, True)])
+        self.assertEqual(loads(Tree, dumps(t), trusted=True), t)
+        
+        # Nested values of a subclass of the field's kind.
+        s = s._replace(center=SubPoint(1, 1.0, True))
+        self.assertIs(type(loads(Shape, dumps(s), trusted=True).center),
+                      SubPoint)
+        with self.assertRaisesRegex(ValueError, 'trusted=True'):
+            loads(Shape, dumps(s))
+    
+    def test_validation(self):
+        class Foo(Struct):
+            a = TypedField(str, seq=True, unique=True)
+        data = dumps(Foo.__new__(Foo, ['a', 'b']))
+        # Tamper with the second element so that it repeats the first.
+        data = data[:-1] + b'a'
+        with self.assertRaisesRegex(TypeError, 'Duplicate'):
+            loads(Foo, data)
+        self.assertEqual(loads(Foo, data, validate=False).a, ('a', 'a'))
+        
+        # __init__() runs either way.
+        class Bar(Struct):
+            a = TypedField(int)
+            def __init__(self, a):
+                self.b = a + 1
+        self.assertEqual(loads(Bar, dumps(Bar(1)), validate=False).b, 2)
+    
+    def test_errors(self):
+        p = Point(1, 1.0, True)
+        data = dumps(p)
+        with self.assertRaisesRegex(ValueError, 'current schema'):
+            loads(Shape, data)
+        with self.assertRaisesRegex(ValueError, 'Not serialized'):
+            loads(Point, b'x' * 30)
+        with self.assertRaisesRegex(ValueError, 'Malformed'):
+            loads(Point, data[:-1])
+        with self.assertRaisesRegex(ValueError, 'extra bytes'):
+            loads(Point, data + b'\x00')
+        with self.assertRaisesRegex(ValueError, 'Cannot serialize'):
+            dumps(Point(2 ** 64, 1.0, True))
+        with self.assertRaises(TypeError):
+            dumps((1, 2))
+        
+        # The schema includes that of nested Structs.
+        def make_outer(*kinds):
+            class Inner(Struct):
+                a = TypedField(kinds[0])
+                b = TypedField(kinds[1])
+            class Outer(Struct):
+                inner = TypedField(Inner)
+                parent = TypedField(Inner, or_none=True)
+            return Outer, Inner
+        Outer, Inner = make_outer(int, float)
+        data = dumps(Outer(Inner(1, 2.0), None))
+        Outer, Inner = make_outer(int, int)
+        with self.assertRaisesRegex(ValueError, 'current schema'):
+            loads(Outer, data)
+        Outer, Inner = make_outer(int, float)
+        self.assertEqual(loads(Outer, data), Outer(Inner(1, 2.0), None))
+    
+    def test_stream(self):
+        points = [Point(i, i / 2, i % 2 == 0) for i in range(100)]
+        buf = io.BytesIO()
+        self.assertEqual(dump_many(Point, iter(points), buf), 100)
+        
+        buf.seek(0)
+        it = iter_load(Point, buf)
+        self.assertEqual(next(it), points[0])
+        self.assertEqual(list(it), points[1:])
+        buf.seek(0)
+        self.assertEqual(list(iter_load(Point, buf, validate=False)), points)
+        
+        # Header, then length and fields of each record.
+        self.assertEqual(len(buf.getvalue()), 8 + 100 * (4 + 17))
+        
+        buf = io.BytesIO(buf.getvalue()[:-3])
+        with self.assertRaisesRegex(ValueError, 'Truncated'):
+            list(iter_load(Point, buf))
+        with self.assertRaises(TypeError):
+            dump_many(Point, [Shape], io.BytesIO())
+        
+        trees = [Tree(1, [Point(1, 1.0, True)])]
+        buf = io.BytesIO()
+        dump_many(Tree, trees, buf)
+        buf.seek(0)
+        with self.assertRaisesRegex(ValueError, 'trusted=True'):
+            list(iter_load(Tree, buf))
+        buf.seek(0)
+        self.assertEqual(list(iter_load(Tree, buf, trusted=True)), trees)
+    
+    def test_lifetime(self):
+        # Schemas don't keep their classes alive.
+        class Inner(Struct):
+            a = TypedField(int)
+        class Outer(Struct):
+            inner = TypedField(Inner)
+        o = Outer(Inner(1))
+        self.assertEqual(loads(Outer, dumps(o)), o)
+        refs = [weakref.ref(Inner), weakref.ref(Outer)]
+        del Inner, Outer, o
+        gc.collect()
+        self.assertEqual([r() for r in refs], [None, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,6 +13,23 @@ from simplestruct.struct import *
 class PickleFoo(Struct):
     a = Field()
 
+class PickleSlotFoo(Struct):
+    _slots = True
+    a = Field()
+
+class PickleSlotBar(PickleSlotFoo):
+    _inherit_fields = True
+    b = Field()
+
+class PickleInternFoo(Struct):
+    _intern = True
+    a = Field()
+
+class PickleAtomicFoo(Struct):
+    _immutable = False
+    _atomic = True
+    a = Field()
+
 
 class StructCase(unittest.TestCase):
     
@@ -67,6 +84,26 @@ class StructCase(unittest.TestCase):
         self.assertEqual(hash(f1), hash(f2))
         # hash(f1) == hash(f3) is unlikely but valid.
         
+        # Hashes are order-sensitive and don't cancel out
+        # repeated values.
+        class Foo(Struct):
+            a = Field()
+            b = Field()
+        self.assertNotEqual(hash(Foo(1, 1)), hash(Foo(2, 2)))
+        self.assertNotEqual(hash(Foo(1, 2)), hash(Foo(2, 1)))
+        
+        # Hashes are computed once.
+        class CountingField(Field):
+            count = 0
+            def hash(self, val):
+                CountingField.count += 1
+                return super().hash(val)
+        class Foo(Struct):
+            a = CountingField()
+        f = Foo(1)
+        self.assertEqual(hash(f), hash(f))
+        self.assertEqual(CountingField.count, 1)
+        
         # No hashing for mutable structs.
         class Foo(Struct):
             _immutable = False
@@ -96,10 +133,31 @@ class StructCase(unittest.TestCase):
         self.assertEqual(f[0:2:2], (5,))
         self.assertEqual(f[1:-1], ())
         self.assertEqual(f[-1:10], (6,))
+        self.assertEqual(f[-1], 6)
         with self.assertRaises(IndexError):
             f[2]
+        with self.assertRaises(IndexError):
+            f[-3]
+        with self.assertRaises(TypeError):
+            f['a']
         with self.assertRaises(AttributeError):
             f[0] = 4
+        # The first assignment fails, with nothing to roll back.
+        with self.assertRaisesRegex(AttributeError, 'immutable') as cm:
+            f[:] = (3, 4)
+        self.assertIsNone(cm.exception.__context__)
+        self.assertEqual(f, Bar(5, 6))
+        
+        # Per-class metadata used by the above.
+        self.assertEqual(Bar._fieldnames, ('a', 'b'))
+        self.assertEqual(Bar._fieldindex, {'a': 0, 'b': 1})
+        self.assertEqual(Bar._values(f), (5, 6))
+        class Baz(Struct):
+            a = Field()
+        class Empty(Struct):
+            pass
+        self.assertEqual(Baz._values(Baz(1)), (1,))
+        self.assertEqual(tuple(Empty()), ())
         
         class Bar(Struct):
             _immutable = False
@@ -141,6 +199,55 @@ class StructCase(unittest.TestCase):
         f = Foo(1)
         self.assertEqual((f.a, f.b, f.c), (1, 'b', 'b'))
         
+        # Errors in argument passing are reported like
+        # Signature.bind() reports them.
+        class Foo(Struct):
+            a = Field()
+            b = Field(default='b')
+        with self.assertRaisesRegex(
+                TypeError, "^missing a required argument: 'a'$"):
+            Foo()
+        with self.assertRaisesRegex(
+                TypeError, '^too many positional arguments$'):
+            Foo(1, 2, 3)
+        with self.assertRaisesRegex(
+                TypeError, "^multiple values for argument 'a'$"):
+            Foo(1, a=2)
+        with self.assertRaisesRegex(
+                TypeError, "^got an unexpected keyword argument 'c'$"):
+            Foo(1, c=2)
+        
+        # Errors while initializing fields name the field.
+        class BadField(Field):
+            def __set__(self, inst, value):
+                raise TypeError('bad')
+        class Foo(Struct):
+            a = Field()
+            b = BadField()
+        with self.assertRaisesRegex(
+                TypeError, "^Error constructing Foo \\(field 'b'\\): bad$"):
+            Foo(1, 2)
+        
+        # User-defined __new__() gets the field values too.
+        class Foo(Struct):
+            a = Field()
+            b = Field(default='b')
+            def __new__(cls, *args):
+                inst = super().__new__(cls, *args)
+                inst.c = args
+                return inst
+        f = Foo(1)
+        self.assertEqual((f.a, f.b, f.c), (1, 'b', (1, 'b')))
+        
+        # Fields may be named like the builtins that the generated
+        # constructor calls.
+        class Foo(Struct):
+            isinstance = Field()
+            def __new__(cls, *args):
+                return super().__new__(cls, *args)
+        self.assertEqual(Foo(1).isinstance, 1)
+        self.assertEqual(Foo._from_rows([(2,)])[0].isinstance, 2)
+        
         # Parentheses-less shorthand.
         class Foo(Struct):
             bar = Field
@@ -206,9 +313,118 @@ class StructCase(unittest.TestCase):
         fb2 = FooB(6)
         
         self.assertNotEqual(fa1, fa2)
-        self.assertEqual(hash(fa1), hash(5))
+        self.assertEqual(hash(fa1), hash((5,)))
         self.assertEqual(fb1, fb2)
-        self.assertEqual(hash(fb1), 10)
+        self.assertEqual(hash(fb1), hash((10,)))
+    
+    def test_eq(self):
+        class Foo(Struct):
+            a = Field()
+            b = Field()
+        self.assertEqual(Foo(1, 2), Foo(1, 2))
+        self.assertNotEqual(Foo(1, 2), Foo(1, 3))
+        self.assertFalse(Foo(1, 2) == (1, 2))
+        
+        # Differing cached hashes short-circuit the comparison.
+        class Val:
+            eq_calls = 0
+            def __init__(self, h):
+                self.h = h
+            def __hash__(self):
+                return self.h
+            def __eq__(self, other):
+                Val.eq_calls += 1
+                return False
+        f1 = Foo(1, Val(1))
+        f2 = Foo(1, Val(2))
+        self.assertNotEqual(f1, f2)
+        self.assertEqual(Val.eq_calls, 1)
+        hash(f1)
+        hash(f2)
+        self.assertNotEqual(f1, f2)
+        self.assertEqual(Val.eq_calls, 1)
+        
+        # Subclasses that define __eq__() in terms of super() compare
+        # all their fields.
+        class Bar(Foo):
+            _inherit_fields = True
+            c = Field()
+            def __eq__(self, other):
+                return super().__eq__(other)
+            __hash__ = Foo.__hash__
+        class Baz(Bar):
+            pass
+        self.assertIs(Baz.__eq__, Bar.__eq__)
+        self.assertEqual(Bar(1, 2, 3), Bar(1, 2, 3))
+        self.assertNotEqual(Bar(1, 2, 3), Bar(1, 2, 4))
+    
+    def test_eq_cycles(self):
+        # Comparisons that recursively reach themselves are False.
+        class A(Struct):
+            _immutable = False
+            x = Field()
+        a1 = A(None)
+        a2 = A(None)
+        a1.x = a2
+        a2.x = a1
+        self.assertFalse(a1 == a2)
+        self.assertTrue(a1 == a1)
+        a3 = A(None)
+        a3.x = a3
+        self.assertFalse(a3 == a1)
+        
+        # The same goes for the generic version.
+        class B(A):
+            _inherit_fields = True
+            def __eq__(self, other):
+                return Struct.__eq__(self, other)
+        b1 = B(None)
+        b2 = B(b1)
+        b1.x = b2
+        self.assertFalse(b1 == b2)
+    
+    def test_from_rows(self):
+        class Foo(Struct):
+            a = Field()
+            b = Field(default='b')
+            def __init__(self, a, b):
+                self.c = (a, b)
+        foos = Foo._from_rows([(1, 2), [3]])
+        self.assertEqual(foos, [Foo(1, 2), Foo(3)])
+        self.assertEqual(foos[1].c, (3, 'b'))
+        self.assertEqual(Foo._from_rows([]), [])
+        with self.assertRaisesRegex(
+                TypeError, "^Error constructing Foo \\(row 1\\): "
+                           "too many positional arguments$"):
+            Foo._from_rows([(1, 2), (1, 2, 3)])
+        with self.assertRaisesRegex(
+                TypeError, "^Error constructing Foo \\(row 0\\): "
+                           "missing a required argument: 'a'$"):
+            Foo._from_rows([()])
+        
+        # Rows are unpacked by generated code, whose own names can't
+        # clash with fields.
+        Bar = make_struct('Bar', ['enumerate', ('append', Field(default=0))])
+        self.assertEqual(Bar._from_rows(iter([[1], (2, 3)])),
+                         [Bar(1), Bar(2, 3)])
+        Empty = make_struct('Empty', [])
+        self.assertEqual(Empty._from_rows([(), ()]), [Empty(), Empty()])
+        
+        # Fields that override __set__() but not convert_column()
+        # are still set one instance at a time.
+        class BadField(Field):
+            def __set__(self, inst, value):
+                if value < 0:
+                    raise TypeError('negative')
+                super().__set__(inst, value)
+        class Foo(Struct):
+            a = BadField()
+        self.assertFalse(Foo.a.converts_columns())
+        Foo._from_rows([(1,)], validate=False)
+        with self.assertRaisesRegex(
+                TypeError, "^Error constructing Foo \\(row 1, field 'a'\\): "
+                           "negative$"):
+            Foo._from_rows([(1,), (-1,)], validate=False)
     
     def test_asdict(self):
         class Foo(Struct):
@@ -229,6 +445,42 @@ class StructCase(unittest.TestCase):
         f2 = f1._replace(b=4)
         f3 = Foo(1, 4, 3)
         self.assertEqual(f2, f3)
+        self.assertEqual(hash(f2), hash(f3))
+        self.assertEqual(f1._replace(), f1)
+        with self.assertRaisesRegex(
+                TypeError, "unexpected keyword argument 'd'"):
+            f1._replace(d=5)
+        
+        # Slots, and a user-defined __init__() that sees all values.
+        class Bar(Struct):
+            a = Field()
+            b = Field()
+            def __init__(self, a, b):
+                self.seen = (a, b)
+        class SlotBar(Struct):
+            _slots = True
+            __slots__ = ('seen',)
+            a = Field()
+            b = Field()
+            def __init__(self, a, b):
+                self.seen = (a, b)
+        for cls in [Bar, SlotBar]:
+            b1 = cls(1, 2)
+            b2 = b1._replace(a=5)
+            self.assertEqual(b2, cls(5, 2))
+            self.assertEqual(b2.seen, (5, 2))
+            self.assertEqual(b1.seen, (1, 2))
+        
+        # User-defined __new__() falls back to normal construction.
+        calls = []
+        class Baz(Struct):
+            a = Field()
+            b = Field()
+            def __new__(cls, a, b):
+                calls.append((a, b))
+                return super().__new__(cls, a, b)
+        Baz(1, 2)._replace(b=3)
+        self.assertEqual(calls, [(1, 2), (1, 3)])
     
     def test_pickleability(self):
         # Pickle dump/load.
@@ -266,6 +518,283 @@ class StructCase(unittest.TestCase):
         bar = Bar(1)
         self.assertNotEqual(foo, bar)
     
+    def test_slots(self):
+        class Foo(Struct):
+            _slots = True
+            a = Field()
+        class Bar(Foo):
+            _inherit_fields = True
+            _immutable = False
+            b = Field()
+        f = Foo(1)
+        self.assertFalse(hasattr(f, '__dict__'))
+        self.assertEqual(f.a, 1)
+        with self.assertRaises(AttributeError):
+            f.a = 2
+        
+        # Inherited fields reuse the base class's slots.
+        self.assertEqual(Bar.__slots__, ('_slot_b',))
+        b = Bar(1, 2)
+        self.assertFalse(hasattr(b, '__dict__'))
+        b.a = 3
+        b[1] = 4
+        self.assertEqual(tuple(b), (3, 4))
+        self.assertEqual(b._asdict(), OrderedDict([('a', 3), ('b', 4)]))
+        
+        # Non-field attributes need their own slots.
+        class Foo(Struct):
+            _slots = True
+            __slots__ = ('c',)
+            a = Field()
+            def __init__(self, a):
+                self.c = a + 1
+        self.assertEqual(Foo(1).c, 2)
+        class Foo(Struct):
+            _slots = True
+            a = Field()
+            def __init__(self, a):
+                self.c = a + 1
+        with self.assertRaises(AttributeError):
+            Foo(1)
+        
+        # Struct itself adds no instance layout, so it combines with
+        # bases that have one.
+        class Error(Struct, Exception):
+            a = Field()
+        with self.assertRaises(Error) as cm:
+            raise Error(1)
+        self.assertEqual(cm.exception.a, 1)
+        self.assertEqual(Struct.__slots__, ())
+        
+        # Pickling.
+        f1 = PickleSlotBar(1, 2)
+        f2 = pickle.loads(pickle.dumps(f1))
+        self.assertEqual(f2, f1)
+        self.assertEqual(hash(f2), hash(f1))
+        self.assertEqual(copy.deepcopy(f1), f1)
+    
+    def test_intern(self):
+        class Node(Struct):
+            _intern = True
+            _slots = True
+            op = Field()
+            args = Field(default=())
+        a = Node('x')
+        b = Node('x')
+        self.assertIs(a, b)
+        self.assertIs(Node('f', (a,)), Node('f', (Node('x'),)))
+        self.assertIsNot(a, Node('y'))
+        self.assertNotEqual(a, Node('y'))
+        
+        # All ways of creating instances are interned.
+        self.assertIs(Node('y')._replace(op='x'), a)
+        self.assertIs(Node._from_rows([('x',)])[0], a)
+        self.assertIs(copy.deepcopy(a), a)
+        p = PickleInternFoo(1)
+        self.assertIs(pickle.loads(pickle.dumps(p)), p)
+        
+        # Entries are dropped along with their instances.
+        Node._intern_table.clear()
+        a = Node('x')
+        Node('x')
+        Node('z')
+        stats = Node._intern_stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['hit_rate'], 1 / 3)
+        self.assertEqual(stats['size'], 1)
+        del a
+        self.assertEqual(Node._intern_stats()['size'], 0)
+        
+        # Threads constructing the same values get the same instance.
+        from threading import Thread
+        results = []
+        def work():
+            results.extend(Node('t', (i,)) for i in range(100))
+        threads = [Thread(target=work) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(set(map(id, results))), 100)
+        
+        with self.assertRaisesRegex(TypeError, 'requires hashable'):
+            Node('x', [1])
+        with self.assertRaisesRegex(TypeError, 'mutable'):
+            class Bad(Struct):
+                _intern = True
+                _immutable = False
+                a = Field()
+        class Foo(Struct):
+            a = Field()
+        with self.assertRaisesRegex(TypeError, 'not interned'):
+            Foo._intern_stats()
+    
+    def test_update_snapshot(self):
+        class PosField(Field):
+            def __set__(self, inst, value):
+                if value < 0:
+                    raise TypeError('negative')
+                super().__set__(inst, value)
+        class Foo(Struct):
+            _immutable = False
+            a = PosField()
+            b = Field()
+            c = PosField()
+        f = Foo(1, 2, 3)
+        f._update(c=4, a=5)
+        self.assertEqual(f, Foo(5, 2, 4))
+        
+        # A failed update is rolled back.
+        with self.assertRaisesRegex(TypeError, 'negative'):
+            f._update(a=6, b=7, c=-1)
+        self.assertEqual(f, Foo(5, 2, 4))
+        with self.assertRaisesRegex(TypeError, 'negative'):
+            f[:] = (6, 7, -1)
+        self.assertEqual(f, Foo(5, 2, 4))
+        with self.assertRaisesRegex(
+                TypeError, "unexpected keyword argument 'd'"):
+            f._update(a=6, d=1)
+        self.assertEqual(f.a, 5)
+        
+        # Fields may be named like the method's own parameter.
+        Bar = make_struct('Bar', ['self', 'b'], _immutable=False)
+        b = Bar(1, 2)
+        b[:] = (3, 4)
+        b._update(self=5)
+        self.assertEqual(b, Bar(5, 4))
+        
+        s = f._snapshot()
+        self.assertIsInstance(s, Foo)
+        self.assertIs(type(s), Foo._snapshot_type)
+        self.assertEqual(tuple(s), (5, 2, 4))
+        self.assertEqual(hash(s), hash(f._snapshot()))
+        f.a = 8
+        self.assertEqual(s.a, 5)
+        with self.assertRaisesRegex(AttributeError, 'immutable'):
+            s.a = 1
+        with self.assertRaisesRegex(AttributeError, 'immutable'):
+            s._update(a=1)
+        self.assertIs(s._snapshot(), s)
+        
+        p = PickleAtomicFoo(1)._snapshot()
+        self.assertEqual(pickle.loads(pickle.dumps(p)), p)
+    
+    def test_atomic(self):
+        class Foo(Struct):
+            _immutable = False
+            _atomic = True
+            a = Field()
+            b = Field()
+        class SlotFoo(Foo):
+            _slots = True
+            _inherit_fields = True
+            c = Field(default=0)
+        for cls in [Foo, SlotFoo]:
+            f = cls(1, -1)
+            self.assertIsNot(f._lock, cls(1, -1)._lock)
+            self.assertIsNot(f._replace(a=2)._lock, f._lock)
+            self.assertIsNot(copy.copy(f)._lock, f._lock)
+            self.assertIs(type(cls._from_rows([(1, 2)])[0]._lock),
+                          type(f._lock))
+        p = pickle.loads(pickle.dumps(PickleAtomicFoo(1)))
+        self.assertEqual(p.a, 1)
+        p.a = 2
+        
+        with self.assertRaisesRegex(TypeError, 'immutable'):
+            class Bad(Struct):
+                _atomic = True
+                a = Field()
+        
+        # Readers never see a partial update from another thread.
+        import sys
+        from threading import Thread
+        f = SlotFoo(0, 0)
+        errors = []
+        def write(k):
+            for i in range(2000):
+                if i % 2 == 0:
+                    f._update(a=i * k, b=-i * k)
+                else:
+                    f[:2] = (i * k, -i * k)
+        def read():
+            for _ in range(2000):
+                s = f._snapshot()
+                a, b, c = f
+                d = f._asdict()
+                if (s.a + s.b != 0 or a + b != 0 or d['a'] + d['b'] != 0):
+                    errors.append((s, a, b, d))
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = ([Thread(target=write, args=(k,)) for k in range(1, 5)] +
+                       [Thread(target=read) for _ in range(4)])
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            sys.setswitchinterval(interval)
+        self.assertEqual(errors, [])
+    
+    def test_make_struct(self):
+        Foo = make_struct('Foo', [('a', Field), 'b',
+                                  ('c', Field(default=3))],
+                          _immutable=False)
+        self.assertEqual(Foo.__name__, 'Foo')
+        self.assertEqual(Foo.__module__, __name__)
+        self.assertEqual(Foo._fieldnames, ('a', 'b', 'c'))
+        f = Foo(1, 2)
+        self.assertEqual(repr(f), 'Foo(a=1, b=2, c=3)')
+        f.a = 5
+        self.assertEqual(f, Foo(5, 2, 3))
+        
+        # Mapping of fields, bases, and methods.
+        Bar = make_struct('Bar', OrderedDict([('d', Field(default=4))]),
+                          bases=(Foo,), _inherit_fields=True,
+                          total=lambda self: self.a + self.d)
+        self.assertEqual(Bar(1, 2, 3, 4).total(), 5)
+        with self.assertRaises(ValueError):
+            make_struct('Baz', ['e'], bases=(Bar,), _inherit_fields=True)
+        
+        with self.assertRaises(AttributeError):
+            make_struct('Foo', ['a', 'a'])
+        with self.assertRaises(TypeError):
+            make_struct('Foo', [('a', int)])
+        # Names that can't be parameters of the generated code.
+        for names in [['class'], ['a b'], ['__inst', 'a'], ['__cls'],
+                      ['__module__']]:
+            with self.assertRaisesRegex(ValueError, 'not a valid field'):
+                make_struct('Foo', names)
+        with self.assertRaisesRegex(ValueError, 'not a valid field'):
+            MetaStruct('Foo', (Struct,), {'None': Field()})
+        # Names of the attributes that Struct keeps on instances.
+        for name in ['_hash', '_lock', '_initialized']:
+            with self.assertRaisesRegex(ValueError, 'not a valid field'):
+                MetaStruct('Foo', (Struct,), {name: Field(),
+                                              '_immutable': False,
+                                              '_atomic': True})
+    
+    def test_lazy_generation(self):
+        # Constructors, __eq__(), and the signature are made when
+        # first used, which works the same through any of them.
+        class Foo(Struct):
+            _immutable = False
+            a = Field()
+            b = Field(default=2)
+        class Bar(Foo):
+            _inherit_fields = True
+            def __eq__(self, other):
+                return super().__eq__(other)
+        self.assertNotIn('_signature_obj', Foo.__dict__)
+        
+        self.assertEqual(Bar(1), Bar(1))
+        self.assertEqual(Foo(1)._replace(b=3), Foo(1, 3))
+        self.assertEqual(Foo._from_rows([(1,)]), [Foo(1, 2)])
+        self.assertEqual(str(Foo._signature), '(a, b=2)')
+        with self.assertRaisesRegex(TypeError, "missing a required"):
+            Foo()
+    
     def test_recur(self):
         # __repr__ for recursive objects.
         class Foo(Struct):
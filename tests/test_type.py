@@ -17,7 +17,7 @@ class ChecktypeCase(unittest.TestCase):
         self.assertEqual(c.str_kind((int, str)), 'int or str')
         self.assertEqual(c.str_kind((int, str, bool)),
                          'one of {int, str, bool}')
-        
+    
     def test_normalize(self):
         c = TypeChecker()
         self.assertEqual(c.normalize_kind((int,)), (int,))
@@ -61,6 +61,35 @@ class ChecktypeCase(unittest.TestCase):
         with self.assertRaisesRegex(
                 TypeError, 'Duplicate element 5 at position 2'):
             checktype_seq([5, 3, 5, 8], int, unique=True)
+        
+        # Unhashable elements.
+        checktype_seq([[1], [2], 3], (list, int), unique=True)
+        with self.assertRaisesRegex(
+                TypeError, r'Duplicate element \[1\] at position 3'):
+            checktype_seq([[1], 1, [2], [1]], (list, int), unique=True)
+        with self.assertRaisesRegex(
+                TypeError, 'Duplicate element 1 at position 3'):
+            checktype_seq([1, [2], 2, 1], (list, int), unique=True)
+        
+        # An overridden checktype() is called for every element.
+        class PositiveChecker(TypeChecker):
+            def checktype(self, val, kind, **kargs):
+                super().checktype(val, kind, **kargs)
+                if val <= 0:
+                    raise TypeError('Expected positive value')
+        with self.assertRaisesRegex(
+                TypeError, 'Expected sequence of int; got sequence with '
+                           'int at position 1'):
+            PositiveChecker().checktype_seq([1, -5], (int,))
+    
+    def test_checktype_column(self):
+        c = TypeChecker()
+        c.checktype_column([1, 2, True], (int,))
+        c.checktype_column([], (int,))
+        with self.assertRaisesRegex(
+                TypeError, 'Expected int; got str') as cm:
+            c.checktype_column([1, 2, 'a', 3], (int,))
+        self.assertEqual(cm.exception.index, 2)
 
 
 if __name__ == '__main__':